@@ -0,0 +1,179 @@
+import asyncio
+import difflib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Optional
+
+# Вес, для которого API Ninjas отдаёт calories_per_hour (160 фунтов)
+NINJAS_REFERENCE_WEIGHT_KG = 160 / 2.2
+
+# MET (метаболический эквивалент) по Compendium of Physical Activities.
+# Расход: MET * вес (кг) * время (ч) ккал.
+# Ключ - основное название, значение - (MET, псевдонимы)
+ACTIVITIES = {
+    "walking": (3.5, ("walk", "walking moderate", "прогулка", "ходьба")),
+    "brisk walking": (4.3, ("fast walking", "power walking", "быстрая ходьба")),
+    "hiking": (6.0, ("hike", "trekking", "поход")),
+    "running": (9.8, ("run", "jogging fast", "бег")),
+    "jogging": (7.0, ("jog", "пробежка")),
+    "sprinting": (14.5, ("sprint", "спринт")),
+    "treadmill": (9.0, ("treadmill running", "беговая дорожка")),
+    "cycling": (7.5, ("bike", "biking", "bicycling", "велосипед")),
+    "stationary bike": (6.8, ("exercise bike", "spinning", "велотренажёр", "велотренажер")),
+    "swimming": (7.0, ("swim", "плавание")),
+    "water aerobics": (5.5, ("aqua aerobics", "аквааэробика")),
+    "rowing": (7.0, ("rowing machine", "гребля")),
+    "elliptical": (5.0, ("elliptical trainer", "cross trainer", "эллипс")),
+    "stair climbing": (8.8, ("stairs", "stair stepper", "stairmaster", "лестница")),
+    "jumping rope": (11.8, ("jump rope", "skipping", "скакалка")),
+    "aerobics": (7.3, ("aerobic", "аэробика")),
+    "dancing": (5.0, ("dance", "танцы")),
+    "zumba": (6.5, ("зумба",)),
+    "yoga": (2.5, ("hatha yoga", "йога")),
+    "power yoga": (4.0, ("vinyasa", "ashtanga")),
+    "pilates": (3.0, ("пилатес",)),
+    "stretching": (2.3, ("растяжка",)),
+    "weight lifting": (5.0, ("weightlifting", "weights", "strength training", "gym", "силовая")),
+    "bodyweight training": (3.8, ("calisthenics", "push ups", "pull ups", "воркаут")),
+    "circuit training": (8.0, ("crossfit", "hiit", "кроссфит")),
+    "boxing": (7.8, ("kickboxing", "бокс")),
+    "martial arts": (10.3, ("karate", "judo", "taekwondo", "единоборства")),
+    "wrestling": (6.0, ("борьба",)),
+    "football": (7.0, ("soccer", "футбол")),
+    "basketball": (6.5, ("баскетбол",)),
+    "volleyball": (4.0, ("волейбол",)),
+    "beach volleyball": (8.0, ()),
+    "tennis": (7.3, ("теннис",)),
+    "table tennis": (4.0, ("ping pong", "настольный теннис")),
+    "badminton": (5.5, ("бадминтон",)),
+    "squash": (7.3, ("сквош",)),
+    "hockey": (8.0, ("ice hockey", "хоккей")),
+    "ice skating": (7.0, ("skating", "коньки")),
+    "roller skating": (7.0, ("rollerblading", "ролики")),
+    "skiing": (7.0, ("downhill skiing", "лыжи")),
+    "cross country skiing": (9.0, ("беговые лыжи",)),
+    "snowboarding": (5.3, ("сноуборд",)),
+    "golf": (4.8, ("гольф",)),
+    "climbing": (8.0, ("rock climbing", "bouldering", "скалолазание")),
+    "horseback riding": (5.5, ("horse riding", "верховая езда")),
+    "surfing": (3.0, ("серфинг",)),
+    "canoeing": (5.8, ("kayaking", "байдарка")),
+    "gardening": (3.8, ("садоводство",)),
+    "housework": (3.3, ("cleaning", "уборка")),
+}
+
+
+def normalize_activity(name: str) -> str:
+    """
+    Приводит название активности к ключу таблицы: регистр, пробелы, "ё", дефисы.
+    """
+    return " ".join(name.replace("-", " ").replace("_", " ").split()).casefold().replace("ё", "е")
+
+
+class ActivityTable:
+    """
+    Таблица MET-значений активностей с псевдонимами, нечётким поиском
+    и дообучением на ответах API Ninjas, сохраняемым на диск.
+
+    Args:
+        learned_path (str): JSON-файл с выученными MET-значениями.
+        fuzzy_cutoff (float): Порог схожести для нечёткого поиска (0..1).
+        fuzzy_cache_size (int): Сколько последних результатов нечёткого поиска помнить.
+    """
+
+    def __init__(self, learned_path: str, fuzzy_cutoff: float = 0.8, fuzzy_cache_size: int = 1024):
+        self.learned_path = learned_path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.fuzzy_cache_size = fuzzy_cache_size
+        self._met: dict[str, float] = {}
+        self._learned: dict[str, float] = {}
+        # Название -> ближайший ключ таблицы (None - похожих нет), LRU
+        self._fuzzy_cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        # Сохранения по очереди: файл не заменяется более старой таблицей
+        self._save_lock = asyncio.Lock()
+
+        for name, (met, aliases) in ACTIVITIES.items():
+            self._met[normalize_activity(name)] = met
+            for alias in aliases:
+                self._met[normalize_activity(alias)] = met
+        self._load_learned()
+
+    def use_learned_path(self, path: str) -> None:
+        """
+        Переключает таблицу на другой файл (свой у каждого воркера) и
+        догружает из него выученное: уже загруженное остаётся как основа.
+        """
+        self.learned_path = path
+        self._load_learned()
+
+    def _load_learned(self) -> None:
+        try:
+            with open(self.learned_path, "r", encoding="utf-8") as f:
+                learned = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for name, met in learned.items():
+            self._learned[name] = float(met)
+            self._met.setdefault(name, float(met))
+
+    def _save_learned(self, learned: dict[str, float]) -> None:
+        # Запись через временный файл, чтобы не повредить таблицу при падении.
+        # Выполняется в отдельном потоке
+        directory = os.path.dirname(self.learned_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".activities-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(learned, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.learned_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def get_met(self, activity: str) -> Optional[float]:
+        """
+        Возвращает MET для активности: точное совпадение или ближайшее по написанию.
+        """
+        key = normalize_activity(activity)
+        met = self._met.get(key)
+        if met is not None:
+            return met
+
+        if key in self._fuzzy_cache:
+            self._fuzzy_cache.move_to_end(key)
+            match = self._fuzzy_cache[key]
+        else:
+            matches = difflib.get_close_matches(key, self._met.keys(), n=1, cutoff=self.fuzzy_cutoff)
+            match = matches[0] if matches else None
+            self._fuzzy_cache[key] = match
+            if len(self._fuzzy_cache) > self.fuzzy_cache_size:
+                self._fuzzy_cache.popitem(last=False)
+        return self._met[match] if match is not None else None
+
+    def calories_burned(self, activity: str, user_time_min: int, user_weight_kg: float) -> Optional[float]:
+        """
+        Расход калорий по MET-таблице.
+
+        Returns:
+            float: Сожжённые калории или None, если активность неизвестна.
+        """
+        met = self.get_met(activity)
+        if met is None:
+            return None
+        return met * user_weight_kg * (user_time_min / 60.0)
+
+    async def learn(self, activity: str, calories_per_hour: float) -> None:
+        """
+        Запоминает активность по ответу API Ninjas (calories_per_hour для 160 фунтов).
+        Таблица сразу обновляется в памяти, файл пишется в отдельном потоке.
+        """
+        key = normalize_activity(activity)
+        met = calories_per_hour / NINJAS_REFERENCE_WEIGHT_KG
+        self._met[key] = met
+        self._learned[key] = met
+        self._fuzzy_cache.clear()
+        async with self._save_lock:
+            # Копия берётся под блокировкой - последнее сохранение самое полное
+            await asyncio.to_thread(self._save_learned, dict(self._learned))
@@ -0,0 +1,97 @@
+"""
+Пересчёт норм: цикл по calc_daily_water/calc_daily_calories против
+векторного compute_goals из goals.py. Заодно проверяет, что результаты совпадают.
+
+Нормы заранее посчитаны по "вчерашней" погоде, так что обратно пишется
+только часть пользователей - как при реальном обновлении погоды.
+
+    python benchmarks/bench_goals.py --users 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from goals import compute_goals, profile_columns  # noqa: E402
+from utils import calc_daily_water, calc_daily_calories, normalize_city  # noqa: E402
+
+CITIES = ["Москва", "Санкт-Петербург", "Сочи", "Новосибирск", "Казань", "Dubai", "Cairo", "London"]
+LEVELS = ["light", "middle", "high"]
+GENDERS = ["male", "female"]
+
+
+def make_profiles(count: int, seed: int) -> list[tuple]:
+    rnd = random.Random(seed)
+    return [
+        (
+            user_id,
+            rnd.choice(CITIES),
+            round(rnd.uniform(40, 140), 1),
+            round(rnd.uniform(140, 210), 1),
+            rnd.randint(14, 90),
+            rnd.randint(0, 180),
+            rnd.choice(LEVELS),
+            rnd.choice(GENDERS),
+            0,
+            0
+        )
+        for user_id in range(count)
+    ]
+
+
+def scalar(profiles: list[tuple], temperatures: dict[str, float]) -> list[tuple[int, int, int]]:
+    updates = []
+    for user_id, city, weight, height, age, minutes, level, gender, base_water_goal, calorie_goal in profiles:
+        temperature = temperatures.get(normalize_city(city))
+        if temperature is None:
+            continue
+        water = int(calc_daily_water(weight, minutes, temperature))
+        calories = int(calc_daily_calories(weight, height, age, minutes, level, gender))
+        if water != base_water_goal or calories != calorie_goal:
+            updates.append((user_id, water, calories))
+    return updates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    profiles = make_profiles(args.users, args.seed)
+    rnd = random.Random(args.seed)
+    # Температуры с дробной частью по всем веткам формулы (<=25, 25..30, >30)
+    yesterday = {normalize_city(city): round(rnd.uniform(15, 35), 2) for city in CITIES}
+    today = dict(yesterday)
+    for city in rnd.sample(sorted(today), len(today) // 2):
+        today[city] = round(rnd.uniform(15, 35), 2)
+    goals = {user_id: (water, calories) for user_id, water, calories in scalar(profiles, yesterday)}
+    profiles = [row[:8] + goals[row[0]] for row in profiles]
+
+    start = time.perf_counter()
+    expected = scalar(profiles, today)
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = profile_columns(profiles)
+    columns_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = compute_goals(columns, today)
+    vector_time = time.perf_counter() - start
+
+    assert actual == expected, "векторный пересчёт расходится со скалярным"
+    print(f"Пользователей: {args.users:,}, изменились нормы у {len(actual):,}")
+    print(f"Цикл по скалярным функциям: {scalar_time:.3f} с")
+    print(f"Строки -> колонки NumPy: {columns_time:.3f} с")
+    print(f"Векторный пересчёт: {vector_time:.3f} с (x{scalar_time / vector_time:.0f})")
+    print(f"Всего с разбором строк: {columns_time + vector_time:.3f} с "
+          f"(x{scalar_time / (columns_time + vector_time):.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Напоминания о воде на N пользователей: один планировщик с кучей сроков
+(reminders.py) против задачи asyncio.sleep на каждого пользователя.
+
+Меряет загрузку расписаний из SQLite, память, и скорость разбора
+наступивших напоминаний (отправка - постановка в очередь outbox,
+без сети). Половина пользователей уже выпила норму и пропускается.
+
+    python benchmarks/bench_reminders.py --users 500000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+
+from aiogram import Bot  # noqa: E402
+
+from models import UserProfile, local_day  # noqa: E402
+from outbox import outbox  # noqa: E402
+from reminders import ReminderScheduler, reminders_total  # noqa: E402
+from storage import MemoryUserRepository  # noqa: E402
+
+
+OFFSETS = (0, 3600, 10800, 18000)
+
+
+def rss() -> int:
+    """
+    Текущая резидентная память процесса, в байтах (Linux).
+    """
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def make_db(path: str, count: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    scheduler = ReminderScheduler(path, None)
+    scheduler._connect()
+    with scheduler._conn:
+        scheduler._conn.executemany(
+            "INSERT INTO reminders (user_id, interval, start, end, utc_offset) VALUES (?, ?, ?, ?, ?)",
+            (
+                (user_id, rnd.choice((60, 90, 120, 180)), rnd.choice((7, 8, 9)) * 60,
+                 rnd.choice((20, 21, 22)) * 60, OFFSETS[user_id % len(OFFSETS)])
+                for user_id in range(count)
+            )
+        )
+    scheduler._conn.close()
+
+
+def make_users(count: int) -> MemoryUserRepository:
+    repository = MemoryUserRepository()
+    now = time.time()
+    for user_id in range(count):
+        utc_offset = OFFSETS[user_id % len(OFFSETS)]
+        # Чётные уже выпили норму - им напоминание не нужно
+        repository.put(user_id, UserProfile(
+            utc_offset=utc_offset, water_goal=2000, logged_water=2000 if user_id % 2 == 0 else 500,
+            profile_ready=True, day=local_day(now, utc_offset)
+        ))
+    return repository
+
+
+async def bench_scheduler(path: str, repository: MemoryUserRepository) -> None:
+    scheduler = ReminderScheduler(path, repository, rate=1e9, batch_size=1 << 30, max_pending=1 << 30)
+    gc.collect()
+    before = rss()
+    started = time.perf_counter()
+    await scheduler.start(Bot("123:bench"))
+    load_time = time.perf_counter() - started
+    memory = rss() - before
+    await scheduler.stop()
+
+    # Срок, к которому наступили первые напоминания всех пользователей
+    now = max(due for due, _ in scheduler._heap)
+    started = time.perf_counter()
+    processed = await scheduler.run_due(now)
+    run_time = time.perf_counter() - started
+
+    sent = reminders_total.labels("sent").value
+    skipped = reminders_total.labels("goal_met").value
+    print(f"Планировщик: загрузка {len(scheduler):,} расписаний {load_time:.2f} с, "
+          f"прирост памяти {memory / 2 ** 20:.0f} МБ")
+    print(f"Разбор наступивших: {processed:,} за {run_time:.2f} с "
+          f"({processed / run_time:,.0f}/с), отправлено {sent:,.0f}, пропущено {skipped:,.0f}, "
+          f"в очереди outbox {len(outbox):,}")
+
+
+async def bench_tasks(count: int) -> None:
+    async def remind(delay: float) -> None:
+        await asyncio.sleep(delay)
+
+    gc.collect()
+    before = rss()
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(remind(3600 + i % 7200)) for i in range(count)]
+    # Задачи начинают sleep только после первого шага цикла
+    await asyncio.sleep(0)
+    create_time = time.perf_counter() - started
+    memory = rss() - before
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    print(f"Задача на пользователя: создание {count:,} задач {create_time:.2f} с, "
+          f"память {memory / 2 ** 20:.0f} МБ")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "reminders.sqlite3")
+        make_db(path, args.users, args.seed)
+        repository = make_users(args.users)
+        await bench_scheduler(path, repository)
+    gc.collect()
+    await bench_tasks(args.users)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Память на одного пользователя: словарь (как раньше) против UserProfile со __slots__.
+
+    python benchmarks/bench_user_memory.py --users 1000000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models import UserProfile  # noqa: E402
+
+
+def make_dict(i: int) -> dict:
+    return {
+        "weight": 60.0 + i % 40,
+        "height": 160.0 + i % 30,
+        "age": 18 + i % 50,
+        "gender": "male" if i % 2 else "female",
+        "activity_minutes": 30 + i % 60,
+        "activity_level": "middle",
+        "city": "Москва",
+        "logged_water": 250 * (i % 8),
+        "logged_calories": 150.5 * (i % 10),
+        "burned_calories": 90.25 * (i % 5),
+        "water_goal": 2500 + i % 1000,
+        "calorie_goal": 2000 + i % 800
+    }
+
+
+def make_profile(i: int) -> UserProfile:
+    return UserProfile(**make_dict(i), profile_ready=True)
+
+
+def measure(factory, count: int) -> float:
+    """
+    Байт на пользователя, включая запись в словаре users.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    users = {i: factory(i) for i in range(count)}
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del users
+    gc.collect()
+    return (after - before) / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    dict_bytes = measure(make_dict, args.users)
+    slots_bytes = measure(make_profile, args.users)
+
+    print(f"Пользователей: {args.users}")
+    print(f"dict:        {dict_bytes:8.1f} байт/польз., {dict_bytes * args.users / 2**20:8.1f} МБ всего")
+    print(f"UserProfile: {slots_bytes:8.1f} байт/польз., {slots_bytes * args.users / 2**20:8.1f} МБ всего")
+    print(f"Экономия:    {1 - slots_bytes / dict_bytes:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
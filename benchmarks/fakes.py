@@ -0,0 +1,197 @@
+"""
+Локальные заглушки Bot API, OpenWeatherMap, OpenFoodFacts и API Ninjas
+для нагрузочного теста (см. loadtest.py). Задержка и доля ошибок настраиваются.
+
+    python benchmarks/fakes.py --port 18080 --latency-ms 20 --error-rate 0.01
+
+Адреса для бота:
+    WEATHER_API_URL=http://127.0.0.1:18080/data/2.5/weather
+    FOOD_API_URL=http://127.0.0.1:18080/cgi/search.pl
+    NINJAS_API_URL=http://127.0.0.1:18080/v1/caloriesburned
+    TELEGRAM_API_URL=http://127.0.0.1:18080
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import zlib
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+# Города, для которых заглушка погоды отвечает 404
+UNKNOWN_CITY_PREFIX = "nowhere"
+
+
+class FakeOptions:
+    """
+    Задержка (мс) и доля ошибок для внешних API и для Bot API.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 20.0,
+        error_rate: float = 0.0,
+        telegram_latency_ms: float = 5.0,
+        telegram_error_rate: float = 0.0,
+        seed: int = 1
+    ):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.telegram_latency_ms = telegram_latency_ms
+        self.telegram_error_rate = telegram_error_rate
+        self.seed = seed
+
+
+def urls(port: int, host: str = "127.0.0.1") -> dict[str, str]:
+    """
+    Переменные окружения бота, указывающие на заглушки.
+    """
+    base = f"http://{host}:{port}"
+    return {
+        "WEATHER_API_URL": f"{base}/data/2.5/weather",
+        "FOOD_API_URL": f"{base}/cgi/search.pl",
+        "NINJAS_API_URL": f"{base}/v1/caloriesburned",
+        "TELEGRAM_API_URL": base
+    }
+
+
+def _stable(value: str, low: int, high: int) -> int:
+    # Одинаковый ответ на одинаковый запрос от запуска к запуску
+    return low + zlib.crc32(value.encode()) % (high - low)
+
+
+def create_app(options: FakeOptions) -> web.Application:
+    rnd = random.Random(options.seed)
+    calls: Counter = Counter()
+    message_ids = iter(range(1, 1 << 62))
+
+    async def delay(latency_ms: float) -> None:
+        if latency_ms > 0:
+            # Разброс +-50% вокруг заданной задержки
+            await asyncio.sleep(latency_ms * rnd.uniform(0.5, 1.5) / 1000)
+
+    def failed(rate: float) -> bool:
+        return rate > 0 and rnd.random() < rate
+
+    async def weather(request: web.Request) -> web.Response:
+        calls["openweathermap"] += 1
+        await delay(options.latency_ms)
+        if failed(options.error_rate):
+            calls["openweathermap_errors"] += 1
+            return web.json_response({"cod": 500, "message": "fake error"}, status=500)
+        city = request.query.get("q", "")
+        if city.casefold().startswith(UNKNOWN_CITY_PREFIX):
+            return web.json_response({"cod": "404", "message": "city not found"}, status=404)
+        return web.json_response({
+            "main": {"temp": _stable(city, 150, 350) / 10},
+            "timezone": 10800
+        })
+
+    async def food(request: web.Request) -> web.Response:
+        calls["openfoodfacts"] += 1
+        await delay(options.latency_ms)
+        if failed(options.error_rate):
+            calls["openfoodfacts_errors"] += 1
+            return web.Response(status=503)
+        term = request.query.get("search_terms", "")
+        return web.json_response({"products": [{
+            "product_name": term,
+            "nutriments": {"energy-kcal_100g": _stable(term, 20, 600)}
+        }]})
+
+    async def ninjas(request: web.Request) -> web.Response:
+        calls["api_ninjas"] += 1
+        await delay(options.latency_ms)
+        if failed(options.error_rate):
+            calls["api_ninjas_errors"] += 1
+            return web.json_response({"error": "fake error"}, status=500)
+        activity = request.query.get("activity", "")
+        return web.json_response([{
+            "name": activity,
+            "calories_per_hour": _stable(activity, 200, 900)
+        }])
+
+    async def telegram(request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        calls[f"telegram.{method}"] += 1
+        params = dict(await request.post()) if request.can_read_body else {}
+        await delay(options.telegram_latency_ms)
+        if failed(options.telegram_error_rate):
+            # Половина ошибок - 429 с retry_after, половина - 500
+            if rnd.random() < 0.5:
+                calls["telegram_429"] += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1}
+                }, status=429)
+            calls["telegram_500"] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500
+            )
+        chat_id = params.get("chat_id")
+        if chat_id is None:
+            return web.json_response({"ok": True, "result": True})
+        result = {
+            "message_id": next(message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"}
+        }
+        if "text" in params:
+            result["text"] = params["text"]
+        return web.json_response({"ok": True, "result": result})
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(dict(calls))
+
+    app = web.Application()
+    app.router.add_get("/data/2.5/weather", weather)
+    app.router.add_get("/cgi/search.pl", food)
+    app.router.add_get("/v1/caloriesburned", ninjas)
+    app.router.add_post("/bot{token}/{method}", telegram)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+async def _serve(port: int, options: FakeOptions, ready=None) -> None:
+    runner = web.AppRunner(create_app(options), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    if ready is not None:
+        ready.set()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def serve(port: int, options: FakeOptions, ready=None) -> None:
+    """
+    Точка входа процесса с заглушками (ready - multiprocessing.Event).
+    """
+    try:
+        asyncio.run(_serve(port, options, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-latency-ms", type=float, default=5.0)
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    print(json.dumps(urls(args.port), indent=2))
+    serve(args.port, FakeOptions(
+        args.latency_ms, args.error_rate, args.telegram_latency_ms, args.telegram_error_rate
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Нагрузочный тест: синтетические обновления прогоняются через настоящий
+Dispatcher (create_dispatcher -> setup_handlers), а Bot API и внешние API
+заменены локальными заглушками (fakes.py) в отдельном процессе.
+
+Сценарий пользователя: полный /set_profile, затем в случайном порядке
+серии /log_water, /log_food + граммы, /log_workout и /check_progress.
+Обновления одного пользователя идут последовательно, разных - параллельно.
+
+Печатает обновления/с, p50/p99 времени обработки (всего и по командам),
+пиковый RSS процесса бота и сравнивает с сохранённым базовым результатом.
+
+    python benchmarks/loadtest.py --users 500
+    python benchmarks/loadtest.py --users 500 --save-baseline
+    python benchmarks/loadtest.py --latency-ms 50 --error-rate 0.05
+
+Код выхода 1, если результат хуже базового больше чем на --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_loadtest.json")
+
+CITIES = ["Москва", "Санкт-Петербург", "Сочи", "Казань", "London", "Dubai", "Nowhere-1"]
+FOODS = ["банан", "яблоко", "гречка", "овсянка", "творог", "курица", "рис", "хлеб", "сыр", "кефир"]
+ACTIVITIES = ["running", "walking", "бег", "плавание", "yoga", "cycling"]
+
+
+class Script:
+    """
+    Генератор обновлений Telegram в виде сырых словарей (как их присылает Bot API).
+    """
+
+    def __init__(self, seed: int):
+        self.rnd = random.Random(seed)
+        self.update_id = 0
+
+    def _next_id(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    def message(self, user_id: int, text: str) -> dict:
+        update_id = self._next_id()
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+            "text": text
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": update_id, "message": message}
+
+    def callback(self, user_id: int, data: str) -> dict:
+        update_id = self._next_id()
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "?"
+            }
+        }}
+
+    def user(self, user_id: int, rounds: int) -> list[tuple[str, dict]]:
+        """
+        Обновления одного пользователя: (команда для отчёта, обновление).
+        """
+        rnd = self.rnd
+        steps = [
+            ("set_profile", self.message(user_id, "/set_profile")),
+            ("set_profile", self.message(user_id, str(rnd.randint(45, 120)))),
+            ("set_profile", self.message(user_id, str(rnd.randint(150, 200)))),
+            ("set_profile", self.message(user_id, str(rnd.randint(16, 70)))),
+            ("set_profile", self.callback(user_id, rnd.choice(["gender_male", "gender_female"]))),
+            ("set_profile", self.message(user_id, str(rnd.randint(0, 120)))),
+            ("set_profile", self.callback(user_id, rnd.choice(["activity_light", "activity_middle", "activity_high"]))),
+            ("set_profile", self.message(user_id, rnd.choice(CITIES)))
+        ]
+        for _ in range(rounds):
+            kind = rnd.choices(["log_water", "log_food", "log_workout", "check_progress"], [4, 3, 2, 1])[0]
+            if kind == "log_water":
+                for _ in range(rnd.randint(1, 5)):
+                    steps.append((kind, self.message(user_id, f"/log_water {rnd.choice([150, 200, 250, 500])}")))
+            elif kind == "log_food":
+                steps.append((kind, self.message(user_id, f"/log_food {rnd.choice(FOODS)}")))
+                steps.append((kind, self.message(user_id, str(rnd.randint(50, 400)))))
+            elif kind == "log_workout":
+                # Изредка - неизвестная активность (запрос в API Ninjas)
+                activity = rnd.choice(ACTIVITIES) if rnd.random() > 0.05 else f"sport{rnd.randint(1, 50)}"
+                steps.append((kind, self.message(user_id, f"/log_workout {activity} {rnd.randint(10, 90)}")))
+            else:
+                steps.append((kind, self.message(user_id, "/check_progress")))
+        return steps
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss - в килобайтах на Linux и в байтах на macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def _fetch_stats(port: int) -> dict:
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{port}/stats") as response:
+            return await response.json()
+
+
+async def run(args: argparse.Namespace, port: int) -> dict:
+    import bot as app
+
+    bot = app.create_bot()
+    dp = app.create_dispatcher()
+    await app.startup(bot)
+
+    script = Script(args.seed)
+    users = [script.user(1_000_000 + i, args.rounds) for i in range(args.users)]
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def replay(steps: list[tuple[str, dict]]) -> None:
+        async with semaphore:
+            for kind, update in steps:
+                started = time.perf_counter()
+                try:
+                    await dp.feed_raw_update(bot, update)
+                except Exception:
+                    errors[kind] += 1
+                latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(replay(steps) for steps in users))
+        elapsed = time.perf_counter() - started
+        # Хендлеры только ставят ответы в очередь - ждём их доставки
+        await app.outbox.join()
+        delivered = time.perf_counter() - started
+        upstream_calls = await _fetch_stats(port)
+    finally:
+        await app.shutdown(bot)
+
+    total = [value for values in latencies.values() for value in values]
+    return {
+        "updates": len(total),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_sec": round(len(total) / elapsed, 1),
+        "delivered_s": round(delivered, 3),
+        "p50_ms": round(_percentile(total, 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(total, 0.99) * 1000, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "errors": sum(errors.values()),
+        "by_command": {
+            kind: {
+                "updates": len(values),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+                "errors": errors.get(kind, 0)
+            }
+            for kind, values in sorted(latencies.items())
+        },
+        "upstream_calls": upstream_calls
+    }
+
+
+def _params(args: argparse.Namespace) -> dict:
+    return {
+        "users": args.users,
+        "rounds": args.rounds,
+        "concurrency": args.concurrency,
+        "storage": args.storage,
+        "latency_ms": args.latency_ms,
+        "error_rate": args.error_rate,
+        "telegram_latency_ms": args.telegram_latency_ms,
+        "telegram_error_rate": args.telegram_error_rate,
+        "chat_rate": args.chat_rate,
+        "seed": args.seed
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Регрессии относительно базового результата (пустой список - всё в порядке).
+    """
+    base = baseline["results"]
+    regressions = []
+    if results["updates_per_sec"] < base["updates_per_sec"] * (1 - tolerance):
+        regressions.append(f"updates/s: {results['updates_per_sec']} < {base['updates_per_sec']}")
+    for key in ("p50_ms", "p99_ms", "peak_rss_mb"):
+        if results[key] > base[key] * (1 + tolerance):
+            regressions.append(f"{key}: {results[key]} > {base[key]}")
+    return regressions
+
+
+def report(results: dict) -> None:
+    print(f"Обновлений: {results['updates']:,} за {results['elapsed_s']} с, ошибок: {results['errors']}")
+    print(f"Все ответы доставлены через {results['delivered_s']} с")
+    print(f"Пропускная способность: {results['updates_per_sec']} обновл./с")
+    print(f"Время обработки: p50 {results['p50_ms']} мс, p99 {results['p99_ms']} мс")
+    print(f"Пиковый RSS: {results['peak_rss_mb']} МБ")
+    print(f"{'команда':<16}{'обновл.':>9}{'p50, мс':>10}{'p99, мс':>10}{'ошибок':>8}")
+    for kind, row in results["by_command"].items():
+        print(f"{kind:<16}{row['updates']:>9}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['errors']:>8}")
+    print("Запросы к заглушкам:", json.dumps(results["upstream_calls"], ensure_ascii=False, sort_keys=True))
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=10, help="действий на пользователя после /set_profile")
+    parser.add_argument("--concurrency", type=int, default=100, help="пользователей одновременно")
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="sqlite")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="задержка внешних API")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ошибок внешних API")
+    parser.add_argument("--telegram-latency-ms", type=float, default=5.0)
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--chat-rate", type=float, default=1000.0,
+                        help="лимит исходящих сообщений в чат и всего, в секунду (заглушка Bot API не ограничивает)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение (доля)")
+    parser.add_argument("--json", help="сохранить результат в файл")
+    args = parser.parse_args(argv)
+
+    port = _free_port()
+    options = fakes.FakeOptions(
+        args.latency_ms, args.error_rate, args.telegram_latency_ms, args.telegram_error_rate, args.seed
+    )
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    server = context.Process(target=fakes.serve, args=(port, options, ready), daemon=True)
+    server.start()
+    if not ready.wait(30):
+        raise RuntimeError("Заглушки не запустились")
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.update(fakes.urls(port))
+    os.environ.update({
+        "BOT_TOKEN": "123456:LOADTEST",
+        "STORAGE_BACKEND": args.storage,
+        "USERS_DB_PATH": os.path.join(workdir, "users.sqlite3"),
+        "FSM_DB_PATH": os.path.join(workdir, "fsm.sqlite3"),
+        "EVENTS_DIR": os.path.join(workdir, "events"),
+        "FOOD_INDEX_PATH": os.path.join(workdir, "food_index.sqlite3"),
+        "ACTIVITIES_LEARNED_PATH": os.path.join(workdir, "activities_learned.json"),
+        "METRICS_PORT": "0",
+        "OUTBOX_CHAT_RATE": str(args.chat_rate),
+        "OUTBOX_GLOBAL_RATE": str(args.chat_rate)
+    })
+    try:
+        results = asyncio.run(run(args, port))
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(results)
+    document = {
+        "params": _params(args),
+        "results": results,
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Базовый результат сохранён в {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["params"] != document["params"]:
+        print("Параметры отличаются от базового прогона, сравнение пропущено")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("Регрессия относительно базового результата:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("Не хуже базового результата")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
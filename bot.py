@@ -1,22 +1,138 @@
 import asyncio
+import logging
 from aiogram import Bot, Dispatcher
-from config import TOKEN
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from config import TOKEN, TELEGRAM_API_URL, THROTTLE_LIMITS, LATENCY_BUDGETS, BOT_MODE, WORKERS, FSM_DB_PATH, FSM_TTL, FSM_MAX_ENTRIES, FSM_SWEEP_INTERVAL
+from fsm_storage import PersistentFSMStorage
 from handlers import setup_handlers
-from middlewares import LoggingMiddleware
+from logs import setup_logging, stop_logging
+from metrics import TelegramRequestMetrics, metrics_server
+from middlewares import (
+    DeadlineMiddleware,
+    LoggingMiddleware,
+    MetricsMiddleware,
+    ThrottlingMiddleware,
+    parse_budgets,
+    parse_limits
+)
+from http_client import open_session, close_session
+from events import event_log
+from exports import exporter
+from goals import goal_refresher
+from outbox import outbox
+from reminders import reminder_scheduler
+from reports import report_renderer
+from rollover import rollover_scheduler
+from storage import users
+from utils import food_index, lookup_cache, translator
+from webhook import run_webhook
 
-# Инициализируем бота и диспетчер
-bot = Bot(token=TOKEN)
-dp = Dispatcher()
+logger = logging.getLogger(__name__)
 
-# Подключаем middleware и хендлеры
-dp.message.middleware(LoggingMiddleware())  # Логирование событий
-setup_handlers(dp)
+fsm_storage = PersistentFSMStorage(
+    FSM_DB_PATH,
+    ttl=FSM_TTL,
+    max_entries=FSM_MAX_ENTRIES,
+    sweep_interval=FSM_SWEEP_INTERVAL
+)
+
+
+def create_dispatcher() -> Dispatcher:
+    """
+    Создаёт диспетчер с middleware и хендлерами.
+    Вызывается один раз на процесс (роутер хендлеров - один на процесс).
+    """
+    dp = Dispatcher(storage=fsm_storage)
+
+    # Подключаем middleware и хендлеры
+    # Ограничение частоты - до фильтров, чтобы отклонённое не доходило до хендлеров
+    dp.message.outer_middleware(ThrottlingMiddleware(parse_limits(THROTTLE_LIMITS)))
+    # Бюджет времени на обработку - для таймаутов запросов к внешним API
+    dp.message.outer_middleware(DeadlineMiddleware(parse_budgets(LATENCY_BUDGETS)))
+    # Логирование событий и метрики хендлеров
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(LoggingMiddleware())
+        observer.middleware(MetricsMiddleware())
+    setup_handlers(dp)
+    return dp
+
+
+def create_bot() -> Bot:
+    """
+    Создаёт бота с замером запросов к Bot API.
+    """
+    session = None
+    if TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    bot = Bot(token=TOKEN, session=session)
+    bot.session.middleware(TelegramRequestMetrics())
+    return bot
+
+
+async def startup(bot: Bot):
+    # Общая HTTP-сессия для внешних API живёт столько же, сколько бот
+    await open_session()
+    # Ответы внешних API из снимка прошлого запуска
+    await lookup_cache.start()
+    await users.open()
+    await fsm_storage.open()
+    await event_log.open()
+    await rollover_scheduler.start()
+    await reminder_scheduler.start(bot)
+    await goal_refresher.start()
+    await metrics_server.start()
+    await report_renderer.start()
+    await outbox.start()
+
+
+async def shutdown(bot: Bot):
+    # Незавершённые выгрузки прерываются до остановки очереди исходящих
+    await exporter.stop()
+    # Дожидаемся отправки накопленных сообщений
+    await outbox.stop()
+    await metrics_server.stop()
+    await report_renderer.stop()
+    await goal_refresher.stop()
+    await rollover_scheduler.stop()
+    await reminder_scheduler.stop()
+    await close_session()
+    await translator.close()
+    await lookup_cache.stop()
+    food_index.close()
+    # Сбрасываем накопленные изменения пользователей на диск
+    await users.close()
+    await fsm_storage.close()
+    await event_log.close()
+    await bot.session.close()
 
 
 async def main():
-    print("Бот запущен!")
-    # Запускаем бота в режиме Polling
-    await dp.start_polling(bot)
+    # Инициализируем бота и диспетчер
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    if WORKERS > 1:
+        # Обновления распределяются по процессам-воркерам (см. sharding.py)
+        from sharding import run_supervisor
+        await run_supervisor(bot, dp, WORKERS)
+        return
+
+    await startup(bot)
+    try:
+        logger.info("Бот запущен!")
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            # Запускаем бота в режиме Polling
+            await dp.start_polling(bot)
+    finally:
+        await shutdown(bot)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Логи пишет фоновый поток, цикл событий только кладёт записи в очередь
+    setup_logging()
+    try:
+        asyncio.run(main())
+    finally:
+        stop_logging()
@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterator, Optional
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру кэш с TTL, LRU-вытеснением и
+    объединением одновременных запросов (single-flight) по ключу.
+
+    Args:
+        maxsize (int): Максимальное количество записей.
+        ttl (float): Время жизни записи по умолчанию, в секундах.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+        # Счётчики для подбора размера кэша
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Возвращает значение из кэша или default, если записи нет или она устарела.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Как get(), но не меняет порядок вытеснения и счётчики.
+        """
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Сохраняет значение, вытесняя самые давно использованные записи при переполнении.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        # Идущая загрузка по ключу устарела и не перезапишет это значение
+        self._inflight.pop(key, None)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def items(self) -> Iterator[tuple[Hashable, float, Any]]:
+        """
+        Живые записи (ключ, оставшийся TTL, значение) от давно использованных к недавним.
+        """
+        now = time.monotonic()
+        for key, (expires_at, value) in list(self._data.items()):
+            if expires_at > now:
+                yield key, expires_at - now, value
+
+    def delete(self, key: Hashable) -> None:
+        self._inflight.pop(key, None)
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_for: Optional[Callable[[Any], Optional[float]]] = None
+    ) -> Any:
+        """
+        Возвращает значение из кэша, а при промахе вызывает loader.
+        Одновременные промахи по одному ключу ждут один и тот же вызов loader.
+        Загрузка идёт в отдельной задаче: отмена одного из ожидающих
+        (в том числе первого) не отменяет её для остальных. Если во время
+        загрузки ключ записали через set(), загруженное значение не кэшируется,
+        а ожидающие получают записанное.
+
+        Args:
+            key: Ключ кэша.
+            loader: Корутина-функция, загружающая значение.
+            ttl_for: Функция, возвращающая TTL для результата;
+                     None означает "не кэшировать" (например, временная ошибка).
+
+        Returns:
+            Значение из кэша или результат loader.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._load(key, loader, ttl_for))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._loaded(key, done))
+        return await asyncio.shield(task)
+
+    async def _load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_for: Optional[Callable[[Any], Optional[float]]]
+    ) -> Any:
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+        except BaseException:
+            # Следующий промах после ошибки загружает заново
+            self._forget(key, task)
+            raise
+        if self._inflight.get(key) is not task:
+            # Загрузку опередили set() или delete(): загруженное значение старее
+            return self.peek(key, value)
+        self._forget(key, task)
+        ttl = ttl_for(value) if ttl_for is not None else self.ttl
+        if ttl is not None and ttl > 0:
+            self.set(key, value, ttl)
+        return value
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def _loaded(self, key: Hashable, task: asyncio.Future) -> None:
+        # Задачу, отменённую до запуска, убирает этот колбэк
+        self._forget(key, task)
+        # Исключение забирается здесь: ожидающих могло не остаться, а "never retrieved" не нужен
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Текущие счётчики кэша.
+        """
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced
+        }
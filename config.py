@@ -9,5 +9,164 @@ TOKEN = os.getenv("BOT_TOKEN")
 API_KEY_WEATHER = os.getenv("API_WEATHER")
 API_KEY_TRAIN = os.getenv("API_NINJAS_KEY")
 
+# Параметры общего HTTP-клиента для внешних API
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "10"))
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# Кэш погоды: TTL для найденных городов и для неизвестных (404)
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1000"))
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_NEGATIVE_TTL = float(os.getenv("WEATHER_NEGATIVE_TTL", "3600"))
+
+# Кэш ответов OpenFoodFacts и API Ninjas: размер, TTL найденного и ненайденного
+FOOD_CACHE_SIZE = int(os.getenv("FOOD_CACHE_SIZE", "10000"))
+FOOD_CACHE_TTL = float(os.getenv("FOOD_CACHE_TTL", str(7 * 24 * 3600)))
+FOOD_NEGATIVE_TTL = float(os.getenv("FOOD_NEGATIVE_TTL", str(24 * 3600)))
+ACTIVITY_CACHE_SIZE = int(os.getenv("ACTIVITY_CACHE_SIZE", "1000"))
+ACTIVITY_CACHE_TTL = float(os.getenv("ACTIVITY_CACHE_TTL", str(7 * 24 * 3600)))
+ACTIVITY_NEGATIVE_TTL = float(os.getenv("ACTIVITY_NEGATIVE_TTL", str(24 * 3600)))
+
+# Перевод названий продуктов и активностей на английский (см. translate.py):
+# кэш переводов, удалённый перевод (googletrans) при неудаче словаря и его лимит, запросов/с
+TRANSLATE_CACHE_SIZE = int(os.getenv("TRANSLATE_CACHE_SIZE", "10000"))
+TRANSLATE_CACHE_TTL = float(os.getenv("TRANSLATE_CACHE_TTL", str(30 * 24 * 3600)))
+TRANSLATE_REMOTE = os.getenv("TRANSLATE_REMOTE", "0").lower() not in ("0", "false", "no")
+TRANSLATE_REMOTE_RATE = float(os.getenv("TRANSLATE_REMOTE_RATE", "1"))
+
+# Снимок кэшей внешних API для быстрого старта (см. lookup_cache.py) и период его записи, в секундах
+LOOKUP_CACHE_PATH = os.getenv("LOOKUP_CACHE_PATH", "data/lookup_cache.bin")
+LOOKUP_SNAPSHOT_INTERVAL = float(os.getenv("LOOKUP_SNAPSHOT_INTERVAL", "300"))
+
+# Локальный индекс продуктов OpenFoodFacts (см. food_index.py)
+FOOD_INDEX_PATH = os.getenv("FOOD_INDEX_PATH", "data/food_index.sqlite3")
+# /log_food со списком продуктов: максимум позиций и одновременных поисков
+FOOD_MAX_ITEMS = int(os.getenv("FOOD_MAX_ITEMS", "20"))
+FOOD_LOOKUP_CONCURRENCY = int(os.getenv("FOOD_LOOKUP_CONCURRENCY", "5"))
+
+# Выученные по ответам API Ninjas MET-значения активностей (см. activities.py)
+ACTIVITIES_LEARNED_PATH = os.getenv("ACTIVITIES_LEARNED_PATH", "data/activities_learned.json")
+
+# Хранилище пользователей: "sqlite" (по умолчанию) или "memory"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+USERS_DB_PATH = os.getenv("USERS_DB_PATH", "data/users.sqlite3")
+USERS_CACHE_SIZE = int(os.getenv("USERS_CACHE_SIZE", "10000"))
+USERS_FLUSH_INTERVAL = float(os.getenv("USERS_FLUSH_INTERVAL", "2"))
+
+# FSM-хранилище диалогов (см. fsm_storage.py)
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", "data/fsm.sqlite3")
+FSM_TTL = float(os.getenv("FSM_TTL", "86400"))
+FSM_MAX_ENTRIES = int(os.getenv("FSM_MAX_ENTRIES", "100000"))
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "60"))
+
+# Режим работы: "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публичный адрес для регистрации вебхука в Telegram (пусто - не регистрировать)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Число процессов-воркеров; при WORKERS > 1 обновления шардируются по user_id
+WORKERS = int(os.getenv("WORKERS", "1"))
+WORKER_STATS_INTERVAL = float(os.getenv("WORKER_STATS_INTERVAL", "60"))
+
+# Журнал событий (см. events.py)
+EVENTS_DIR = os.getenv("EVENTS_DIR", "data/events")
+EVENTS_SEGMENT_RECORDS = int(os.getenv("EVENTS_SEGMENT_RECORDS", "100000"))
+# Сколько сегментов одного уровня размера сливаются в один
+EVENTS_MAX_SEGMENTS = int(os.getenv("EVENTS_MAX_SEGMENTS", "8"))
+
+# Часовой пояс по умолчанию (если OpenWeatherMap не вернул пояс города), в секундах от UTC
+DEFAULT_UTC_OFFSET = int(os.getenv("DEFAULT_UTC_OFFSET", "10800"))
+ROLLOVER_TICK_INTERVAL = float(os.getenv("ROLLOVER_TICK_INTERVAL", "30"))
+
+# Фоновый пересчёт норм по свежей погоде (см. goals.py)
+GOALS_REFRESH_INTERVAL = float(os.getenv("GOALS_REFRESH_INTERVAL", "10800"))
+GOALS_REFRESH_CONCURRENCY = int(os.getenv("GOALS_REFRESH_CONCURRENCY", "10"))
+
+# Логирование (см. logs.py): доля записываемых рядовых обновлений,
+# порог "медленного" обновления (пишется всегда) и скрытие текста сообщений
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_SLOW_UPDATE_MS = float(os.getenv("LOG_SLOW_UPDATE_MS", "1000"))
+LOG_REDACT_TEXT = os.getenv("LOG_REDACT_TEXT", "1").lower() not in ("0", "false", "no")
+
+# Эндпоинт /metrics для Prometheus (0 - выключен); воркеры слушают METRICS_PORT + 1 + номер
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Адреса внешних API (для нагрузочного теста подменяются локальными заглушками)
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "http://api.openweathermap.org/data/2.5/weather")
+FOOD_API_URL = os.getenv("FOOD_API_URL", "https://world.openfoodfacts.org/cgi/search.pl")
+NINJAS_API_URL = os.getenv("NINJAS_API_URL", "https://api.api-ninjas.com/v1/caloriesburned")
+# Сервер Bot API (пусто - api.telegram.org)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Очередь исходящих сообщений (см. outbox.py); лимиты Telegram: ~30 сообщений/с всего,
+# ~1 сообщение/с в личный чат и 20 сообщений/мин в группу
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "16"))
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_GROUP_RATE = float(os.getenv("OUTBOX_GROUP_RATE", str(20 / 60)))
+OUTBOX_CHAT_BURST = float(os.getenv("OUTBOX_CHAT_BURST", "3"))
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "5"))
+
+# Ограничение частоты запросов пользователя (см. ThrottlingMiddleware):
+# "команда или состояние FSM=запросов/секунд:запас", "*" - для остальных сообщений.
+# Команды с запросами во внешние API ограничены сильнее локальных
+THROTTLE_LIMITS = os.getenv(
+    "THROTTLE_LIMITS",
+    "log_food=10/60:3,log_workout=10/60:3,ProfileStates:city=5/60:2,*=60/60:20"
+)
+
+# Устойчивость к сбоям внешних API (см. resilience.py).
+# Бюджет времени на обработку сообщения, в секундах, по команде или состоянию FSM
+# (формат как у THROTTLE_LIMITS): запросы к API не выходят за остаток бюджета
+LATENCY_BUDGETS = os.getenv(
+    "LATENCY_BUDGETS",
+    "log_food=3,log_workout=3,ProfileStates:city=3,*=5"
+)
+# Предельное время одного обращения к API вне бюджета (фоновые задачи)
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "5"))
+# Автомат отключения: сколько ошибок подряд открывают его и через сколько секунд пробный запрос
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+# API, к которым после p95 задержки отправляется дублирующий запрос (через запятую)
+HEDGE_UPSTREAMS = os.getenv("HEDGE_UPSTREAMS", "openfoodfacts")
+# Минимальная задержка дублирующего запроса, в секундах
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+
+# Графики /report: число процессов рисования и сколько готовых графиков держать в кэше
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "1"))
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+
+# Напоминания о воде (см. reminders.py): база расписаний, период тика (с),
+# лимит напоминаний в секунду и за тик, предел очереди исходящих, выше которого рассылка ждёт
+REMINDERS_DB_PATH = os.getenv("REMINDERS_DB_PATH", "data/reminders.sqlite3")
+REMINDER_TICK_INTERVAL = float(os.getenv("REMINDER_TICK_INTERVAL", "1"))
+REMINDER_RATE = float(os.getenv("REMINDER_RATE", "20"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+REMINDER_MAX_PENDING = int(os.getenv("REMINDER_MAX_PENDING", "1000"))
+
+# Администраторы бота (user_id через запятую): /export_all, /stats
+ADMIN_IDS = frozenset(int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip())
+
+# Выгрузка записей (см. exports.py): каталог файлов, одновременных выгрузок,
+# буфер записи в файл (байт), период обновления прогресса (с), предел файла для отправки в Telegram (байт)
+EXPORT_DIR = os.getenv("EXPORT_DIR", "data/exports")
+EXPORT_MAX_JOBS = int(os.getenv("EXPORT_MAX_JOBS", "2"))
+EXPORT_BUFFER_SIZE = int(os.getenv("EXPORT_BUFFER_SIZE", str(64 * 1024)))
+EXPORT_PROGRESS_INTERVAL = float(os.getenv("EXPORT_PROGRESS_INTERVAL", "3"))
+EXPORT_MAX_UPLOAD = int(os.getenv("EXPORT_MAX_UPLOAD", str(50 * 1024 * 1024)))
+
+# Статистика /stats: счётчиков частых продуктов и активностей и сколько из них показывать
+STATS_TOP_CAPACITY = int(os.getenv("STATS_TOP_CAPACITY", "100"))
+STATS_TOP_SHOWN = int(os.getenv("STATS_TOP_SHOWN", "10"))
+
 if not TOKEN:
     raise ValueError("Переменная окружения BOT_TOKEN не установлена!")
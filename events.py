@@ -0,0 +1,529 @@
+import asyncio
+import glob
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import time
+from collections import defaultdict
+from typing import Iterator, NamedTuple, Optional
+
+from config import EVENTS_DIR, EVENTS_SEGMENT_RECORDS, EVENTS_MAX_SEGMENTS
+
+# Типы событий
+WATER = 1
+FOOD = 2
+WORKOUT = 3
+
+# Запись: user_id, время (unix, с), тип, количество (мл или ккал) - 25 байт
+RECORD = struct.Struct("<qdBd")
+# Индекс сегмента: user_id, номер первой записи, число записей - 20 байт
+INDEX_ENTRY = struct.Struct("<qQI")
+
+# Манифест: живые сегменты и последний запечатанный лог
+MANIFEST = "MANIFEST"
+MANIFEST_VERSION = 1
+
+_LOG_RE = re.compile(r"active-(\d+)\.log$")
+
+
+class Event(NamedTuple):
+    ts: float
+    kind: int
+    amount: float
+
+
+class _Segment:
+    """
+    Закрытый сегмент: записи отсортированы по (user_id, ts), рядом лежит
+    индекс смещений по user_id. Оба файла читаются через mmap.
+    """
+
+    def __init__(self, number: int, data_path: str, index_path: str):
+        self.number = number
+        self.data_path = data_path
+        self.index_path = index_path
+        self._data_file = open(data_path, "rb")
+        self._index_file = open(index_path, "rb")
+        self._data = _mmap(self._data_file)
+        self._index = _mmap(self._index_file)
+        self.records = len(self._data) // RECORD.size if self._data else 0
+        self._users = len(self._index) // INDEX_ENTRY.size if self._index else 0
+
+    def close(self) -> None:
+        for m in (self._data, self._index):
+            if m:
+                m.close()
+        self._data_file.close()
+        self._index_file.close()
+
+    def _find_user(self, user_id: int) -> Optional[tuple[int, int]]:
+        lo, hi = 0, self._users
+        while lo < hi:
+            mid = (lo + hi) // 2
+            uid, start, count = INDEX_ENTRY.unpack_from(self._index, mid * INDEX_ENTRY.size)
+            if uid < user_id:
+                lo = mid + 1
+            elif uid > user_id:
+                hi = mid
+            else:
+                return start, count
+        return None
+
+    def count(self, user_id: Optional[int] = None) -> int:
+        """
+        Число записей пользователя (None - всех) без чтения самих записей.
+        """
+        if user_id is None:
+            return self.records
+        found = self._find_user(user_id)
+        return found[1] if found else 0
+
+    def _ts_at(self, position: int) -> float:
+        return RECORD.unpack_from(self._data, position * RECORD.size)[1]
+
+    def query(self, user_id: int, since: float, until: float) -> Iterator[Event]:
+        """
+        События пользователя в интервале [since, until) - только его записи.
+        """
+        found = self._find_user(user_id)
+        if found is None:
+            return
+        start, count = found
+        # Записи пользователя отсортированы по времени - ищем начало интервала
+        lo, hi = start, start + count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ts_at(mid) < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        for position in range(lo, start + count):
+            _, ts, kind, amount = RECORD.unpack_from(self._data, position * RECORD.size)
+            if ts >= until:
+                break
+            yield Event(ts, kind, amount)
+
+    def iter_records(self) -> Iterator[tuple]:
+        """
+        Все записи сегмента в порядке (user_id, ts).
+        """
+        for position in range(self.records):
+            yield RECORD.unpack_from(self._data, position * RECORD.size)
+
+
+class EventSnapshot:
+    """
+    Неизменяемый срез журнала для долгого чтения (выгрузок) в отдельном потоке.
+
+    Сегменты открыты заново - со своими mmap, так что слияние и удаление
+    файлов журналом срез не затрагивают; незапечатанные события скопированы.
+    Записи читаются лениво, в памяти - не больше одной записи на сегмент.
+    После чтения срез нужно закрыть (close).
+    """
+
+    def __init__(self, segments: list[_Segment], pending: dict[int, list[Event]]):
+        self._segments = segments
+        self._pending = pending
+
+    def count(self, user_id: Optional[int] = None) -> int:
+        """
+        Число записей пользователя (None - всех).
+        """
+        if user_id is None:
+            pending = sum(len(events) for events in self._pending.values())
+        else:
+            pending = len(self._pending.get(user_id, ()))
+        return pending + sum(segment.count(user_id) for segment in self._segments)
+
+    def iter_user(self, user_id: int, since: float = 0.0, until: float = float("inf")) -> Iterator[Event]:
+        """
+        События пользователя в интервале [since, until), по возрастанию времени.
+        """
+        pending = sorted(e for e in self._pending.get(user_id, ()) if since <= e.ts < until)
+        return heapq.merge(
+            *(segment.query(user_id, since, until) for segment in self._segments),
+            pending,
+            key=lambda event: event.ts
+        )
+
+    def iter_all(self) -> Iterator[tuple]:
+        """
+        Все записи (user_id, ts, kind, amount) в порядке (user_id, ts).
+        """
+        pending = (
+            (user_id, event.ts, event.kind, event.amount)
+            for user_id in sorted(self._pending)
+            for event in sorted(self._pending[user_id])
+        )
+        return heapq.merge(
+            *(segment.iter_records() for segment in self._segments),
+            pending,
+            key=lambda r: (r[0], r[1])
+        )
+
+    def close(self) -> None:
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+
+
+def open_snapshot(directory: str, attempts: int = 5) -> EventSnapshot:
+    """
+    Срез журнала другого процесса (воркера) прямо с диска: живые сегменты
+    по манифесту и незапечатанные логи. Если журнал за время открытия
+    сменил манифест или логи, попытка повторяется.
+    """
+    for _ in range(attempts):
+        state = _disk_state(directory)
+        segments: list[_Segment] = []
+        pending: dict[int, list[Event]] = defaultdict(list)
+        try:
+            manifest, logs = state
+            for number in manifest["segments"]:
+                segments.append(_Segment(
+                    number,
+                    os.path.join(directory, f"seg-{number:08d}.dat"),
+                    os.path.join(directory, f"seg-{number:08d}.idx")
+                ))
+            for path in logs:
+                for user_id, events in _read_log(path).items():
+                    pending[user_id].extend(events)
+        except FileNotFoundError:
+            state = None
+        if state is not None and state == _disk_state(directory):
+            return EventSnapshot(segments, dict(pending))
+        for segment in segments:
+            segment.close()
+    raise RuntimeError(f"Журнал {directory} меняется слишком часто для среза")
+
+
+def _disk_state(directory: str) -> tuple[dict, list[str]]:
+    # Манифест и логи, ещё не вошедшие в сегменты
+    manifest = _read_manifest(directory) or {"segments": [], "sealed_log": 0}
+    logs = [
+        path for path in sorted(glob.glob(os.path.join(directory, "active-*.log")))
+        if int(_LOG_RE.search(path).group(1)) > manifest["sealed_log"]
+    ]
+    return manifest, logs
+
+
+def _read_manifest(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(directory: str, segments: list[int], sealed_log: int) -> None:
+    """
+    Фиксирует набор живых сегментов: атомарная замена файла с fsync.
+    Сегменты и логи, не попавшие в манифест, при открытии удаляются.
+    """
+    path = os.path.join(directory, MANIFEST)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "segments": sorted(segments), "sealed_log": sealed_log}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _mmap(f) -> Optional[mmap.mmap]:
+    if os.fstat(f.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _write_segment(data_path: str, index_path: str, records: Iterator[tuple]) -> None:
+    """
+    Пишет отсортированные по (user_id, ts) записи и индекс по user_id.
+    Файлы появляются атомарно (через временные).
+    """
+    tmp_data, tmp_index = f"{data_path}.tmp", f"{index_path}.tmp"
+    with open(tmp_data, "wb") as data_f, open(tmp_index, "wb") as index_f:
+        position = 0
+        current_user, user_start = None, 0
+        for record in records:
+            user_id = record[0]
+            if user_id != current_user:
+                if current_user is not None:
+                    index_f.write(INDEX_ENTRY.pack(current_user, user_start, position - user_start))
+                current_user, user_start = user_id, position
+            data_f.write(RECORD.pack(*record))
+            position += 1
+        if current_user is not None:
+            index_f.write(INDEX_ENTRY.pack(current_user, user_start, position - user_start))
+        data_f.flush()
+        os.fsync(data_f.fileno())
+        index_f.flush()
+        os.fsync(index_f.fileno())
+    os.replace(tmp_index, index_path)
+    os.replace(tmp_data, data_path)
+
+
+class EventLog:
+    """
+    Журнал событий (вода, еда, тренировки) только на дозапись.
+
+    Новые события пишутся в активный лог и держатся в памяти по пользователям.
+    Заполненный активный лог запечатывается в сегмент, отсортированный по
+    (user_id, ts), с индексом смещений по user_id. Сегменты сливаются
+    по уровням размера: max_segments сегментов одного уровня - в один
+    сегмент следующего, так что каждая запись переписывается O(log N) раз.
+    История пользователя читает только его записи.
+
+    Набор живых сегментов фиксирует манифест: новый сегмент или результат
+    слияния становится видимым только после записи манифеста, а файлы,
+    которых в нём нет (недописанные или уже слитые), при открытии удаляются.
+    Поэтому сбой между записью сегмента и удалением источников не даёт
+    повторов событий.
+
+    Args:
+        directory (str): Каталог журнала.
+        segment_records (int): Размер активного лога до запечатывания, в записях.
+        max_segments (int): Сколько сегментов одного уровня сливаются в один.
+        flush_interval (float): Период сброса активного лога на диск, в секундах.
+    """
+
+    def __init__(self, directory: str, segment_records: int, max_segments: int, flush_interval: float = 1.0):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+
+        self._segments: list[_Segment] = []
+        # Запечатываемые логи: (путь, события по пользователям)
+        self._frozen: list[tuple[str, dict[int, list[Event]]]] = []
+        self._active: dict[int, list[Event]] = defaultdict(list)
+        self._active_count = 0
+        self._active_path: Optional[str] = None
+        self._active_file = None
+        self._next_number = 1
+        # Номер последнего лога, уже вошедшего в сегмент (из манифеста)
+        self._sealed_log = 0
+        self._maintenance: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    async def open(self) -> None:
+        """
+        Открывает живые сегменты и восстанавливает незапечатанные логи после перезапуска.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = _read_manifest(self.directory)
+        if manifest is None:
+            # Новый журнал
+            manifest = {"segments": [], "sealed_log": 0}
+            _write_manifest(self.directory, [], 0)
+        live = set(manifest["segments"])
+        self._sealed_log = manifest["sealed_log"]
+        numbers = [self._sealed_log, *live]
+
+        for path in glob.glob(self._path("seg-*")):
+            match = re.search(r"seg-(\d+)\.", path)
+            if match is None:
+                continue
+            number = int(match.group(1))
+            numbers.append(number)
+            # Недописанные сегменты и источники уже зафиксированных слияний
+            if number not in live or path.endswith(".tmp"):
+                os.remove(path)
+        for number in sorted(live):
+            self._segments.append(_Segment(
+                number, self._path(f"seg-{number:08d}.dat"), self._path(f"seg-{number:08d}.idx")
+            ))
+
+        for path in sorted(glob.glob(self._path("active-*.log"))):
+            number = int(_LOG_RE.search(path).group(1))
+            numbers.append(number)
+            events = _read_log(path) if number > self._sealed_log else None
+            if events:
+                self._frozen.append((path, events))
+            else:
+                os.remove(path)
+        self._next_number = max(numbers) + 1
+
+        self._open_active()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        if self._frozen:
+            self._schedule_maintenance()
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._maintenance is not None:
+            await self._maintenance
+        if self._active_file is not None:
+            self._active_file.close()
+            self._active_file = None
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+
+    def _open_active(self) -> None:
+        self._active_path = self._path(f"active-{self._next_number:08d}.log")
+        self._next_number += 1
+        self._active_file = open(self._active_path, "ab")
+        self._active = defaultdict(list)
+        self._active_count = 0
+
+    def append(self, user_id: int, kind: int, amount: float, ts: Optional[float] = None) -> None:
+        """
+        Добавляет событие. Запись на диск - буферизованная, без ожидания fsync.
+        """
+        ts = time.time() if ts is None else ts
+        self._active_file.write(RECORD.pack(user_id, ts, kind, amount))
+        self._active[user_id].append(Event(ts, kind, amount))
+        self._active_count += 1
+        if self._active_count >= self.segment_records:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        """
+        Замораживает активный лог и открывает новый; запечатывание - в фоне.
+        """
+        self._active_file.close()
+        self._frozen.append((self._active_path, self._active))
+        self._open_active()
+        self._schedule_maintenance()
+
+    def _schedule_maintenance(self) -> None:
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.create_task(self._maintain())
+
+    async def _maintain(self) -> None:
+        """
+        Запечатывает замороженные логи и сливает сегменты (в отдельном потоке).
+        Старые файлы удаляются только после записи манифеста.
+        """
+        while self._frozen:
+            log_path, events = self._frozen[0]
+            log_number = int(_LOG_RE.search(log_path).group(1))
+            number = self._next_number
+            self._next_number += 1
+            live = [segment.number for segment in self._segments] + [number]
+            segment = await asyncio.to_thread(self._seal, number, events, live, log_number)
+            self._segments.append(segment)
+            self._sealed_log = log_number
+            self._frozen.pop(0)
+            os.remove(log_path)
+
+        while True:
+            group = self._merge_group()
+            if group is None:
+                break
+            number = self._next_number
+            self._next_number += 1
+            live = [segment.number for segment in self._segments if segment not in group] + [number]
+            merged = await asyncio.to_thread(self._merge, number, group, live)
+            self._segments = [segment for segment in self._segments if segment not in group] + [merged]
+            for segment in group:
+                segment.close()
+                os.remove(segment.data_path)
+                os.remove(segment.index_path)
+
+    def _tier(self, records: int) -> int:
+        # Уровень k - от segment_records * max_segments ** k записей
+        tier, bound = 0, self.segment_records * self.max_segments
+        while records >= bound:
+            tier += 1
+            bound *= self.max_segments
+        return tier
+
+    def _merge_group(self) -> Optional[list[_Segment]]:
+        """
+        Самые старые max_segments сегментов младшего переполненного уровня.
+        """
+        tiers: dict[int, list[_Segment]] = defaultdict(list)
+        for segment in self._segments:
+            tiers[self._tier(segment.records)].append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.max_segments:
+                return tiers[tier][:self.max_segments]
+        return None
+
+    def _seal(self, number: int, events: dict[int, list[Event]], live: list[int], log_number: int) -> _Segment:
+        data_path = self._path(f"seg-{number:08d}.dat")
+        index_path = self._path(f"seg-{number:08d}.idx")
+        records = (
+            (user_id, event.ts, event.kind, event.amount)
+            for user_id in sorted(events)
+            for event in sorted(events[user_id])
+        )
+        _write_segment(data_path, index_path, records)
+        _write_manifest(self.directory, live, log_number)
+        return _Segment(number, data_path, index_path)
+
+    def _merge(self, number: int, segments: list[_Segment], live: list[int]) -> _Segment:
+        data_path = self._path(f"seg-{number:08d}.dat")
+        index_path = self._path(f"seg-{number:08d}.idx")
+        merged = heapq.merge(*(segment.iter_records() for segment in segments), key=lambda r: (r[0], r[1]))
+        _write_segment(data_path, index_path, merged)
+        _write_manifest(self.directory, live, self._sealed_log)
+        return _Segment(number, data_path, index_path)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> None:
+        if self._active_file is not None:
+            self._active_file.flush()
+
+    def snapshot(self, user_id: Optional[int] = None) -> EventSnapshot:
+        """
+        Срез журнала для выгрузки (см. EventSnapshot): все пользователи
+        или только user_id. Вызывается из цикла событий.
+        """
+        self.flush()
+        segments = [_Segment(s.number, s.data_path, s.index_path) for s in self._segments]
+        pending: dict[int, list[Event]] = defaultdict(list)
+        for events in [events for _, events in self._frozen] + [self._active]:
+            if user_id is None:
+                for uid, user_events in events.items():
+                    pending[uid].extend(user_events)
+            elif user_id in events:
+                pending[user_id].extend(events[user_id])
+        return EventSnapshot(segments, dict(pending))
+
+    def query(self, user_id: int, since: float = 0.0, until: float = float("inf")) -> list[Event]:
+        """
+        События пользователя в интервале [since, until), по возрастанию времени.
+        """
+        result = []
+        for segment in self._segments:
+            result.extend(segment.query(user_id, since, until))
+        for _, events in self._frozen:
+            result.extend(e for e in events.get(user_id, ()) if since <= e.ts < until)
+        result.extend(e for e in self._active.get(user_id, ()) if since <= e.ts < until)
+        result.sort()
+        return result
+
+
+def _read_log(path: str) -> dict[int, list[Event]]:
+    """
+    Читает лог, отбрасывая недописанную последнюю запись.
+    """
+    events: dict[int, list[Event]] = defaultdict(list)
+    with open(path, "rb") as f:
+        data = f.read()
+    usable = len(data) - len(data) % RECORD.size
+    for user_id, ts, kind, amount in RECORD.iter_unpack(data[:usable]):
+        events[user_id].append(Event(ts, kind, amount))
+    return events
+
+
+event_log = EventLog(EVENTS_DIR, EVENTS_SEGMENT_RECORDS, EVENTS_MAX_SEGMENTS)
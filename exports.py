@@ -0,0 +1,344 @@
+"""
+Выгрузка записей журнала событий в CSV или JSONL.
+
+/export - записи пользователя файлом в чат, /export_all (администраторы) -
+записи всех пользователей в файл в EXPORT_DIR. Записи читаются из среза
+журнала (events.EventSnapshot) по одной и пишутся в отдельном потоке через
+буфер фиксированного размера: весь набор в памяти не собирается, а цикл
+событий продолжает обслуживать другие чаты. Если выгрузка идёт дольше
+EXPORT_PROGRESS_INTERVAL, пользователь видит сообщение с прогрессом.
+"""
+import asyncio
+import csv
+import heapq
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Hashable, Iterator, Optional
+
+from aiogram.types import FSInputFile, Message
+
+from config import (
+    EXPORT_DIR,
+    EXPORT_MAX_JOBS,
+    EXPORT_BUFFER_SIZE,
+    EXPORT_PROGRESS_INTERVAL,
+    EXPORT_MAX_UPLOAD
+)
+from events import FOOD, WATER, WORKOUT, EventSnapshot, event_log, open_snapshot
+from metrics import Counter
+from outbox import BULK, send
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+# Через сколько записей поток выгрузки сообщает прогресс и проверяет отмену
+PROGRESS_STEP = 10000
+
+# Тип события -> название и единица в выгрузке
+KINDS = {WATER: ("water", "ml"), FOOD: ("food", "kcal"), WORKOUT: ("workout", "kcal")}
+USER_COLUMNS = ("time", "kind", "amount", "unit")
+ALL_COLUMNS = ("user_id", "time", "kind", "amount", "unit")
+
+exports_total = Counter(
+    "bot_exports_total", "Выгрузки записей по результату", ("scope", "result")
+)
+
+
+class ExportCancelled(Exception):
+    """
+    Выгрузка остановлена (остановка бота).
+    """
+
+
+class ExportJob:
+    """
+    Состояние выгрузки: поток пишет written, цикл событий читает его для прогресса.
+    """
+
+    __slots__ = ("total", "written", "cancelled", "progress")
+
+    def __init__(self, total: Optional[int]):
+        # Ожидаемое число записей (None - неизвестно заранее)
+        self.total = total
+        self.written = 0
+        self.cancelled = False
+        # Отправка сообщения с прогрессом, если выгрузка шла дольше интервала
+        self.progress: Optional[asyncio.Future] = None
+
+    def describe(self) -> str:
+        if self.total:
+            percent = min(100, self.written * 100 // self.total)
+            return f"⏳ Выгрузка: {percent}% ({self.written:,} из {self.total:,} записей)"
+        return f"⏳ Выгрузка: {self.written:,} записей"
+
+
+def user_rows(events: Iterator[tuple], utc_offset: int) -> Iterator[tuple]:
+    """
+    Строки выгрузки пользователя: время по его часовому поясу.
+    """
+    tz = timezone(timedelta(seconds=utc_offset))
+    for ts, kind, amount in events:
+        name, unit = KINDS[kind]
+        yield datetime.fromtimestamp(ts, tz).isoformat(timespec="seconds"), name, round(amount, 2), unit
+
+
+def all_rows(records: Iterator[tuple]) -> Iterator[tuple]:
+    """
+    Строки выгрузки всех пользователей: время в UTC.
+    """
+    for user_id, ts, kind, amount in records:
+        name, unit = KINDS[kind]
+        moment = datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+        yield user_id, moment, name, round(amount, 2), unit
+
+
+def write_export(
+    rows: Iterator[tuple],
+    path: str,
+    fmt: str,
+    columns: tuple,
+    job: ExportJob,
+    buffer_size: int
+) -> int:
+    """
+    Пишет строки в файл по мере чтения. Выполняется в отдельном потоке.
+
+    Args:
+        rows: Строки - значения в порядке columns.
+        path (str): Файл выгрузки.
+        fmt (str): "csv" или "jsonl".
+        columns (tuple): Названия колонок.
+        job (ExportJob): Прогресс и флаг отмены.
+        buffer_size (int): Размер буфера записи, в байтах.
+
+    Returns:
+        int: Количество записанных строк.
+    """
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="", buffering=buffer_size) as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            write = writer.writerow
+        else:
+            def write(row: tuple) -> None:
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                f.write("\n")
+        for row in rows:
+            write(row)
+            written += 1
+            if written % PROGRESS_STEP == 0:
+                job.written = written
+                if job.cancelled:
+                    raise ExportCancelled()
+    job.written = written
+    return written
+
+
+class Exporter:
+    """
+    Фоновые выгрузки. Одновременно выполняется не больше max_jobs
+    (остальные ждут в очереди), у пользователя - не больше одной.
+
+    Args:
+        directory (str): Каталог файлов выгрузки.
+        max_jobs (int): Максимум одновременных выгрузок.
+        buffer_size (int): Буфер записи в файл, в байтах.
+        progress_interval (float): Период обновления сообщения с прогрессом, в секундах.
+        max_upload (int): Предел файла для отправки в Telegram, в байтах.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_jobs: int = 2,
+        buffer_size: int = 64 * 1024,
+        progress_interval: float = 3,
+        max_upload: int = 50 * 1024 * 1024
+    ):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.progress_interval = progress_interval
+        self.max_upload = max_upload
+        self._slots = asyncio.Semaphore(max_jobs)
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self._jobs: dict[Hashable, ExportJob] = {}
+        # Каталоги журналов других воркеров - для выгрузки всех (см. sharding.py)
+        self.peer_directories: list[str] = []
+
+    def busy(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    def queued(self) -> bool:
+        """
+        Все места заняты - новая выгрузка подождёт.
+        """
+        return self._slots.locked()
+
+    def export_user(self, message: Message, user_id: int, fmt: str, since: float, utc_offset: int) -> bool:
+        """
+        Запускает выгрузку записей пользователя с момента since.
+
+        Returns:
+            bool: False, если выгрузка этого пользователя уже идёт.
+        """
+        if self.busy(user_id):
+            return False
+        self._start(user_id, self._export_user(message, user_id, fmt, since, utc_offset))
+        return True
+
+    def export_all(self, message: Message, fmt: str) -> bool:
+        """
+        Запускает выгрузку всех пользователей в файл на диске.
+
+        Returns:
+            bool: False, если такая выгрузка уже идёт.
+        """
+        if self.busy("all"):
+            return False
+        self._start("all", self._export_all(message, fmt))
+        return True
+
+    def _start(self, key: Hashable, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+    async def stop(self) -> None:
+        for job in self._jobs.values():
+            job.cancelled = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _export_user(self, message: Message, user_id: int, fmt: str, since: float, utc_offset: int) -> None:
+        async with self._slots:
+            snapshot = event_log.snapshot(user_id)
+            job = ExportJob(None if since else snapshot.count(user_id))
+            os.makedirs(self.directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(dir=self.directory, prefix=f"user-{user_id}-", suffix=f".{fmt}.tmp")
+            os.close(fd)
+            try:
+                rows = user_rows(snapshot.iter_user(user_id, since), utc_offset)
+                written = await self._write(user_id, message, job, rows, path, fmt, USER_COLUMNS)
+                if not written:
+                    send(message.reply("Записей за этот период нет."))
+                elif os.path.getsize(path) > self.max_upload:
+                    send(message.reply(
+                        f"Выгрузка больше {self.max_upload // 2 ** 20} МБ - укажите период, например:\n/export {fmt} 365"
+                    ))
+                else:
+                    await send(message.reply_document(
+                        FSInputFile(path, filename=f"export.{fmt}"),
+                        caption=f"📦 Ваши записи: {written:,}"
+                    ), BULK)
+                exports_total.labels("user", "ok").inc()
+            except asyncio.CancelledError:
+                exports_total.labels("user", "cancelled").inc()
+                raise
+            except Exception:
+                exports_total.labels("user", "error").inc()
+                logger.exception("Ошибка выгрузки", extra={"fields": {"user_id": user_id}})
+                send(message.reply("Не удалось подготовить выгрузку, попробуйте позже."))
+            finally:
+                snapshot.close()
+                os.remove(path)
+
+    async def _export_all(self, message: Message, fmt: str) -> None:
+        async with self._slots:
+            snapshots: list[EventSnapshot] = [event_log.snapshot()]
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"events-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}.{fmt}")
+            try:
+                for directory in self.peer_directories:
+                    snapshots.append(await asyncio.to_thread(open_snapshot, directory))
+                job = ExportJob(sum(snapshot.count() for snapshot in snapshots))
+                # У воркеров разные пользователи - слияние сохраняет порядок (user_id, ts)
+                records = heapq.merge(*(snapshot.iter_all() for snapshot in snapshots), key=lambda r: (r[0], r[1]))
+                written = await self._write("all", message, job, all_rows(records), f"{path}.tmp", fmt, ALL_COLUMNS)
+                os.replace(f"{path}.tmp", path)
+                size = os.path.getsize(path)
+                text = f"✅ Выгрузка всех пользователей: {written:,} записей, {size / 2 ** 20:.1f} МБ\n{path}"
+                if size <= self.max_upload:
+                    await send(message.reply_document(FSInputFile(path), caption=text), BULK)
+                else:
+                    send(message.reply(text))
+                exports_total.labels("all", "ok").inc()
+            except asyncio.CancelledError:
+                exports_total.labels("all", "cancelled").inc()
+                raise
+            except Exception:
+                exports_total.labels("all", "error").inc()
+                logger.exception("Ошибка выгрузки всех пользователей")
+                send(message.reply("Не удалось подготовить выгрузку, подробности в логах."))
+            finally:
+                for snapshot in snapshots:
+                    snapshot.close()
+                if os.path.exists(f"{path}.tmp"):
+                    os.remove(f"{path}.tmp")
+
+    async def _write(
+        self,
+        key: Hashable,
+        message: Message,
+        job: ExportJob,
+        rows: Iterator[tuple],
+        path: str,
+        fmt: str,
+        columns: tuple
+    ) -> int:
+        """
+        Пишет выгрузку в потоке, показывая прогресс. При отмене ждёт,
+        пока поток остановится, чтобы срез журнала можно было закрыть.
+        """
+        self._jobs[key] = job
+        progress = asyncio.create_task(self._progress(message, job))
+        future = asyncio.ensure_future(
+            asyncio.to_thread(write_export, rows, path, fmt, columns, job, self.buffer_size)
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            job.cancelled = True
+            await asyncio.gather(future, return_exceptions=True)
+            raise
+        finally:
+            del self._jobs[key]
+            progress.cancel()
+            if job.progress is not None:
+                _edit(job.progress, f"✅ Выгружено записей: {job.written:,}")
+
+    async def _progress(self, message: Message, job: ExportJob) -> None:
+        shown = None
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            text = job.describe()
+            if text == shown:
+                continue
+            if job.progress is None:
+                job.progress = send(message.reply(text))
+            else:
+                _edit(job.progress, text)
+            shown = text
+
+
+def _edit(sent: asyncio.Future, text: str) -> None:
+    # Правка - когда сообщение отправлено; правки уходят в порядке вызова
+    def edit(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            send(future.result().edit_text(text), BULK)
+    sent.add_done_callback(edit)
+
+
+exporter = Exporter(
+    EXPORT_DIR,
+    max_jobs=EXPORT_MAX_JOBS,
+    buffer_size=EXPORT_BUFFER_SIZE,
+    progress_interval=EXPORT_PROGRESS_INTERVAL,
+    max_upload=EXPORT_MAX_UPLOAD
+)
@@ -0,0 +1,328 @@
+"""
+Локальный индекс продуктов OpenFoodFacts.
+
+Индекс строится из дампа OpenFoodFacts (JSONL или CSV, можно .gz)
+и хранится в SQLite: таблица продуктов и таблица токенов названий
+для поиска по префиксу.
+
+Импорт:
+    python food_index.py import openfoodfacts-products.jsonl.gz
+    python food_index.py import en.openfoodfacts.org.products.csv.gz
+
+Повторный импорт обновляет только изменившиеся строки.
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from cache import TTLCache
+
+# Названия, по которым индексируется продукт (первое непустое - отображаемое)
+NAME_FIELDS = ("product_name", "product_name_ru", "product_name_en", "generic_name")
+KCAL_FIELD = "energy-kcal_100g"
+
+IMPORT_BATCH_SIZE = 5000
+# Сколько кандидатов по префиксу рассматривается при поиске
+LOOKUP_CANDIDATES = 200
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    code TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_norm TEXT NOT NULL,
+    kcal REAL NOT NULL,
+    digest INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    token TEXT NOT NULL,
+    code TEXT NOT NULL,
+    PRIMARY KEY (token, code)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tokens_code ON tokens (code);
+CREATE INDEX IF NOT EXISTS products_name_norm ON products (name_norm);
+"""
+
+
+def normalize_name(name: str) -> str:
+    """
+    Приводит название продукта к виду для поиска: регистр, пробелы, "ё".
+    """
+    return " ".join(name.split()).casefold().replace("ё", "е")
+
+
+def tokenize(name: str) -> list[str]:
+    """
+    Разбивает нормализованное название на токены (слова).
+    """
+    return _TOKEN_RE.findall(normalize_name(name))
+
+
+class FoodIndex:
+    """
+    Индекс продуктов на диске с кэшем результатов поиска в памяти.
+    Запросы бота к SQLite выполняются в отдельном потоке, не блокируя цикл событий.
+
+    Args:
+        path (str): Путь к файлу SQLite.
+        cache_size (int): Размер кэша результатов поиска.
+    """
+
+    def __init__(self, path: str, cache_size: int = 10000):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._results = TTLCache(maxsize=cache_size, ttl=24 * 3600)
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="food-index")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def open(self, create: bool = False) -> bool:
+        """
+        Открывает индекс. Без create=True отсутствующий файл не создаётся.
+
+        Returns:
+            bool: True, если индекс доступен.
+        """
+        if self._conn is not None:
+            return True
+        if not create and not os.path.exists(self.path):
+            return False
+        if create:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        # Бот работает с соединением из потока _executor, импорт - из основного
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        return True
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self._results.clear()
+
+    async def lookup(self, product_name: str) -> Optional[dict]:
+        """
+        Ищет продукт по словам названия (последнее слово - по префиксу).
+        Одновременные поиски одного названия выполняют один запрос.
+
+        Returns:
+            dict: {'name': ..., 'calories': ...} или None, если продукт не найден.
+        """
+        tokens = tokenize(product_name)
+        if not tokens:
+            return None
+        if self._conn is None and not await self._run(self.open):
+            return None
+
+        key = " ".join(tokens)
+        return await self._results.get_or_load(key, lambda: self._run(self._query, key, tokens))
+
+    def _query(self, key: str, tokens: list[str]) -> Optional[dict]:
+        """
+        Запрос к индексу. Выполняется в потоке _executor.
+        """
+        # Сначала точное совпадение названия
+        row = self._conn.execute(
+            "SELECT name, kcal FROM products WHERE name_norm = ? LIMIT 1", (key,)
+        ).fetchone()
+
+        if row is None:
+            # Последнее слово ищется по префиксу, остальные - точно.
+            # Кандидатов ограничиваем, чтобы частые слова не сканировали весь индекс
+            conditions = "".join(
+                " AND EXISTS (SELECT 1 FROM tokens t WHERE t.token = ? AND t.code = c.code)"
+                for _ in tokens[:-1]
+            )
+            row = self._conn.execute(
+                "SELECT p.name, p.kcal FROM products p WHERE p.code IN ("
+                "SELECT c.code FROM tokens c WHERE c.token >= ? AND c.token < ?"
+                f"{conditions} LIMIT {LOOKUP_CANDIDATES}"
+                ") ORDER BY length(p.name) LIMIT 1",
+                (tokens[-1], tokens[-1] + "\U0010ffff", *tokens[:-1])
+            ).fetchone()
+
+        return {"name": row[0], "calories": row[1]} if row else None
+
+    def import_dump(self, path: str, progress_every: int = 100000) -> dict[str, int]:
+        """
+        Потоково импортирует дамп OpenFoodFacts, не загружая его в память целиком.
+        Строки, у которых не изменились название и калорийность, не перезаписываются.
+
+        Returns:
+            dict: Количество добавленных, обновлённых, неизменных и пропущенных строк.
+        """
+        self.open(create=True)
+        counters = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        batch = []
+        started = time.monotonic()
+        seen = 0
+
+        for record in _iter_dump(path):
+            seen += 1
+            product = _parse_product(record)
+            if product is None:
+                counters["skipped"] += 1
+            else:
+                batch.append(product)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    self._apply_batch(batch, counters)
+                    batch = []
+            if progress_every and seen % progress_every == 0:
+                print(f"{seen} строк, {time.monotonic() - started:.0f} с: {counters}", file=sys.stderr)
+
+        if batch:
+            self._apply_batch(batch, counters)
+        self._results.clear()
+        return counters
+
+    def _apply_batch(self, batch: list[tuple], counters: dict[str, int]) -> None:
+        """
+        Записывает пачку продуктов одной транзакцией, пропуская неизменные.
+        """
+        # Последняя версия продукта в пачке побеждает
+        by_code = {product[0]: product for product in batch}
+        codes = list(by_code)
+        existing = {}
+        # Ограничение SQLite на число параметров в запросе
+        for i in range(0, len(codes), 500):
+            chunk = codes[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            existing.update(self._conn.execute(
+                f"SELECT code, digest FROM products WHERE code IN ({placeholders})", chunk
+            ))
+
+        with self._conn:
+            for code, name, kcal, digest, tokens in by_code.values():
+                old_digest = existing.get(code)
+                if old_digest == digest:
+                    counters["unchanged"] += 1
+                    continue
+                if old_digest is None:
+                    counters["inserted"] += 1
+                else:
+                    counters["updated"] += 1
+                    self._conn.execute("DELETE FROM tokens WHERE code = ?", (code,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO products (code, name, name_norm, kcal, digest) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (code, name, normalize_name(name), kcal, digest)
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO tokens (token, code) VALUES (?, ?)",
+                    [(token, code) for token in tokens]
+                )
+
+
+def _open_text(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def _iter_dump(path: str) -> Iterator[dict]:
+    """
+    Построчно читает дамп: JSONL (.jsonl/.json) или CSV/TSV (.csv/.tsv).
+    """
+    base = path[:-3] if path.endswith(".gz") else path
+    with _open_text(path) as f:
+        if base.endswith((".jsonl", ".json", ".ndjson")):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        else:
+            # CSV-экспорт OpenFoodFacts разделён табуляцией
+            csv.field_size_limit(sys.maxsize)
+            first_line = f.readline()
+            delimiter = "\t" if "\t" in first_line else ","
+            header = next(csv.reader([first_line], delimiter=delimiter))
+            yield from csv.DictReader(f, fieldnames=header, delimiter=delimiter)
+
+
+def _parse_product(record: dict) -> Optional[tuple]:
+    """
+    Извлекает (code, name, kcal, digest, tokens) из строки дампа.
+    Строки без кода, названия или калорийности пропускаются.
+    """
+    code = str(record.get("code") or "").strip()
+    if not code:
+        return None
+
+    # В JSONL калорийность лежит в nutriments, в CSV - отдельной колонкой
+    nutriments = record.get("nutriments")
+    kcal = nutriments.get(KCAL_FIELD) if isinstance(nutriments, dict) else record.get(KCAL_FIELD)
+    try:
+        kcal = float(kcal)
+    except (TypeError, ValueError):
+        return None
+
+    names = []
+    for field in NAME_FIELDS:
+        value = record.get(field)
+        if isinstance(value, str) and value.strip():
+            names.append(" ".join(value.split()))
+    if not names:
+        return None
+
+    tokens = set()
+    for name in names:
+        tokens.update(tokenize(name))
+
+    digest = zlib.crc32(f"{'|'.join(names)}|{kcal}".encode("utf-8"))
+    return code, names[0], kcal, digest, tokens
+
+
+def main() -> None:
+    from config import FOOD_INDEX_PATH
+
+    parser = argparse.ArgumentParser(description="Локальный индекс продуктов OpenFoodFacts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="импорт дампа (JSONL/CSV, можно .gz)")
+    import_parser.add_argument("dump")
+    import_parser.add_argument("--db", default=FOOD_INDEX_PATH)
+
+    lookup_parser = subparsers.add_parser("lookup", help="поиск продукта в индексе")
+    lookup_parser.add_argument("name")
+    lookup_parser.add_argument("--db", default=FOOD_INDEX_PATH)
+
+    args = parser.parse_args()
+    index = FoodIndex(args.db)
+    try:
+        if args.command == "import":
+            started = time.monotonic()
+            counters = index.import_dump(args.dump)
+            print(f"Готово за {time.monotonic() - started:.1f} с: {counters}")
+        else:
+            print(asyncio.run(index.lookup(args.name)))
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    __slots__ = ("state", "data", "expires_at")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], expires_at: float):
+        self.state = state
+        self.data = data
+        self.expires_at = expires_at
+
+
+class PersistentFSMStorage(BaseStorage):
+    """
+    FSM-хранилище в памяти с сохранением на диск (SQLite), TTL и лимитом записей.
+
+    Запись живёт ttl секунд с последнего изменения: брошенные диалоги
+    удаляются лениво при чтении и периодической очисткой. Записи упорядочены
+    по времени изменения, поэтому очистка просматривает только истёкшие,
+    а при превышении max_entries вытесняются самые давние.
+    Изменения сбрасываются на диск пачками раз в flush_interval секунд,
+    при старте незавершённые диалоги загружаются обратно.
+
+    Args:
+        path (str): Путь к файлу SQLite.
+        ttl (float): Время жизни диалога без изменений, в секундах.
+        max_entries (int): Максимум одновременно хранимых диалогов.
+        sweep_interval (float): Период очистки истёкших записей, в секундах.
+        flush_interval (float): Период сброса изменений на диск, в секундах.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float,
+        max_entries: int,
+        sweep_interval: float = 60,
+        flush_interval: float = 2
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self.flush_interval = flush_interval
+        self._key_builder = DefaultKeyBuilder(with_destiny=True)
+        self._records: "OrderedDict[str, _Record]" = OrderedDict()
+        # Ключи, изменённые с последнего сброса (None - запись удалена)
+        self._dirty: dict[str, Optional[_Record]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: list[asyncio.Task] = []
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> list[tuple]:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, "
+            "state TEXT, "
+            "data TEXT NOT NULL, "
+            "expires_at REAL NOT NULL)"
+        )
+        with self._conn:
+            self._conn.execute("DELETE FROM fsm WHERE expires_at <= ?", (time.time(),))
+        return self._conn.execute(
+            "SELECT key, state, data, expires_at FROM fsm ORDER BY expires_at DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+
+    async def open(self) -> None:
+        """
+        Открывает базу, загружает незавершённые диалоги и запускает фоновые задачи.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-db")
+        rows = await self._run(self._connect)
+        # В базе хранится время по часам системы, в памяти - по monotonic
+        offset = time.monotonic() - time.time()
+        for key, state, data, expires_at in reversed(rows):
+            self._records[key] = _Record(state, json.loads(data), expires_at + offset)
+        self._tasks = [
+            asyncio.create_task(self._sweep_loop()),
+            asyncio.create_task(self._flush_loop())
+        ]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._conn is not None:
+            await self.flush()
+            await self._run(self._conn.close)
+            self._conn = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _get(self, key: StorageKey) -> Optional[_Record]:
+        """
+        Возвращает запись, удаляя её, если TTL истёк.
+        """
+        str_key = self._key_builder.build(key)
+        record = self._records.get(str_key)
+        if record is None:
+            self.misses += 1
+            return None
+        if record.expires_at <= time.monotonic():
+            self._delete(str_key)
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record
+
+    def _delete(self, str_key: str) -> None:
+        del self._records[str_key]
+        self._dirty[str_key] = None
+
+    def _update(self, key: StorageKey, state: Any = ..., data: Any = ...) -> None:
+        """
+        Изменяет запись и продлевает её TTL. Пустые записи удаляются.
+        """
+        str_key = self._key_builder.build(key)
+        record = self._records.pop(str_key, None)
+        if record is not None and record.expires_at <= time.monotonic():
+            self.expired += 1
+            record = None
+        if record is None:
+            record = _Record(None, {}, 0)
+        if state is not ...:
+            record.state = state
+        if data is not ...:
+            record.data = data
+
+        if record.state is None and not record.data:
+            self._dirty[str_key] = None
+            return
+
+        record.expires_at = time.monotonic() + self.ttl
+        self._records[str_key] = record
+        self._dirty[str_key] = record
+
+        while len(self._records) > self.max_entries:
+            old_key, _ = self._records.popitem(last=False)
+            self._dirty[old_key] = None
+            self.evicted += 1
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._update(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self._update(key, data=data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return record.data.copy() if record is not None else {}
+
+    def sweep(self) -> int:
+        """
+        Удаляет истёкшие записи. Записи идут по возрастанию expires_at,
+        поэтому просмотр останавливается на первой живой.
+
+        Returns:
+            int: Количество удалённых записей.
+        """
+        now = time.monotonic()
+        removed = 0
+        while self._records:
+            str_key, record = next(iter(self._records.items()))
+            if record.expires_at > now:
+                break
+            self._delete(str_key)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def _write(self, upserts: list[tuple], deletes: list[tuple]) -> None:
+        with self._conn:
+            if deletes:
+                self._conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+            if upserts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO fsm (key, state, data, expires_at) VALUES (?, ?, ?, ?)",
+                    upserts
+                )
+
+    async def flush(self) -> None:
+        """
+        Записывает изменения с последнего сброса одной транзакцией.
+        """
+        if not self._dirty or self._conn is None:
+            return
+        dirty, self._dirty = self._dirty, {}
+        offset = time.time() - time.monotonic()
+        upserts = []
+        deletes = []
+        for str_key, record in dirty.items():
+            if record is None:
+                deletes.append((str_key,))
+            else:
+                upserts.append((
+                    str_key,
+                    record.state,
+                    json.dumps(record.data, ensure_ascii=False),
+                    record.expires_at + offset
+                ))
+        try:
+            await self._run(self._write, upserts, deletes)
+        except Exception as e:
+            for str_key, record in dirty.items():
+                self._dirty.setdefault(str_key, record)
+            logger.error("Ошибка при сохранении FSM: %r", e)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Текущие счётчики хранилища.
+        """
+        return {
+            "size": len(self._records),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
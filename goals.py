@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import math
+from operator import itemgetter
+from typing import Callable, Optional
+
+import numpy as np
+
+from config import API_KEY_WEATHER, GOALS_REFRESH_INTERVAL, GOALS_REFRESH_CONCURRENCY
+from storage import UserRepository, users
+from utils import get_current_temperature, normalize_city
+
+logger = logging.getLogger(__name__)
+
+# Те же коэффициенты, что и в calc_daily_calories
+_CALORIES_PER_MINUTE = {"light": 4, "middle": 8, "high": 12}
+_GENDER_OFFSET = {"male": 5, "female": -161}
+
+
+def calc_daily_water_vec(weight_kg: np.ndarray, activity_minutes: np.ndarray, temperature: np.ndarray) -> np.ndarray:
+    """
+    Векторная версия calc_daily_water: та же формула и тот же порядок
+    операций, поэтому результаты совпадают с поэлементным вызовом бит в бит.
+
+    Args:
+        weight_kg (np.ndarray): Вес в кг (float64).
+        activity_minutes (np.ndarray): Длительность активности в мин. (int64).
+        temperature (np.ndarray): Температура в °C (float64).
+
+    Returns:
+        np.ndarray: Рекомендуемое количество воды в мл.
+    """
+    water = weight_kg * 30
+    water = water + (activity_minutes // 30) * 500
+    heat = np.where(
+        temperature > 30,
+        1000.0,
+        np.where(temperature > 25, 500 + (temperature - 25) * 100, 0.0)
+    )
+    return water + heat
+
+
+def calc_daily_calories_vec(
+    weight_kg: np.ndarray,
+    height_cm: np.ndarray,
+    age: np.ndarray,
+    activity_minutes: np.ndarray,
+    calories_per_minute: np.ndarray,
+    gender_offset: np.ndarray
+) -> np.ndarray:
+    """
+    Векторная версия calc_daily_calories.
+
+    Args:
+        weight_kg (np.ndarray): Вес (float64).
+        height_cm (np.ndarray): Рост (float64).
+        age (np.ndarray): Возраст (int64).
+        activity_minutes (np.ndarray): Минуты активности в день (int64).
+        calories_per_minute (np.ndarray): 4/8/12 по уровню активности (int64).
+        gender_offset (np.ndarray): +5 для мужчин, -161 для женщин (int64).
+
+    Returns:
+        np.ndarray: Рекомендуемое количество калорий в день.
+    """
+    base_calories = 10 * weight_kg + 6.25 * height_cm - 5 * age + gender_offset
+    return base_calories + activity_minutes * calories_per_minute
+
+
+def _column(rows: list[tuple], index: int, dtype) -> np.ndarray:
+    return np.fromiter(map(itemgetter(index), rows), dtype=dtype, count=len(rows))
+
+
+def _categories(rows: list[tuple], index: int) -> tuple[list[str], np.ndarray]:
+    """
+    Строковая колонка в виде (уникальные значения, индекс значения для каждой строки).
+    """
+    values = list(map(itemgetter(index), rows))
+    positions: dict[str, int] = {}
+    for value in values:
+        positions.setdefault(value, len(positions))
+    codes = np.fromiter(map(positions.__getitem__, values), dtype=np.int64, count=len(values))
+    return list(positions), codes
+
+
+def _lookup(categories: tuple[list[str], np.ndarray], mapping: dict[str, float], key: Callable[[str], str]) -> np.ndarray:
+    """
+    Значения словаря для каждой строки (NaN, если значения нет).
+    key и словарь применяются один раз на уникальное значение.
+    """
+    unique, codes = categories
+    table = np.array([mapping.get(key(value), math.nan) for value in unique], dtype=np.float64)
+    return table[codes]
+
+
+def profile_columns(profiles: list[tuple]) -> dict:
+    """
+    Переводит строки UserRepository.goal_profiles() в колонки NumPy.
+    """
+    return {
+        "user_id": _column(profiles, 0, np.int64),
+        "city": _categories(profiles, 1),
+        "weight": _column(profiles, 2, np.float64),
+        "height": _column(profiles, 3, np.float64),
+        "age": _column(profiles, 4, np.int64),
+        "activity_minutes": _column(profiles, 5, np.int64),
+        "activity_level": _categories(profiles, 6),
+        "gender": _categories(profiles, 7),
+        "base_water_goal": _column(profiles, 8, np.int64),
+        "calorie_goal": _column(profiles, 9, np.int64)
+    }
+
+
+def compute_goals(columns: dict, temperatures: dict[str, float]) -> list[tuple[int, int, int]]:
+    """
+    Пересчитывает нормы всех профилей одним векторным проходом.
+
+    Args:
+        columns (dict): Колонки профилей (см. profile_columns).
+        temperatures (dict[str, float]): Температура по нормализованному названию города.
+            Пользователи городов без температуры пропускаются.
+
+    Returns:
+        list[tuple[int, int, int]]: (user_id, base_water_goal, calorie_goal)
+            только для пользователей, у которых норма изменилась.
+    """
+    temperature = _lookup(columns["city"], temperatures, normalize_city)
+    calories_per_minute = _lookup(columns["activity_level"], _CALORIES_PER_MINUTE, str.lower)
+    gender_offset = _lookup(columns["gender"], _GENDER_OFFSET, str.lower)
+
+    # Некорректные профили и города без погоды не трогаем
+    valid = ~(np.isnan(temperature) | np.isnan(calories_per_minute) | np.isnan(gender_offset))
+    calories_per_minute = np.where(valid, calories_per_minute, 0).astype(np.int64)
+    gender_offset = np.where(valid, gender_offset, 0).astype(np.int64)
+
+    weight = columns["weight"]
+    activity_minutes = columns["activity_minutes"]
+    water = calc_daily_water_vec(weight, activity_minutes, temperature).astype(np.int64)
+    calories = calc_daily_calories_vec(
+        weight, columns["height"], columns["age"], activity_minutes, calories_per_minute, gender_offset
+    ).astype(np.int64)
+
+    changed = valid & ((water != columns["base_water_goal"]) | (calories != columns["calorie_goal"]))
+    index = np.flatnonzero(changed)
+    return list(zip(
+        columns["user_id"][index].tolist(),
+        water[index].tolist(),
+        calories[index].tolist()
+    ))
+
+
+def _recompute(profiles: list[tuple], temperatures: dict[str, float]) -> list[tuple[int, int, int]]:
+    return compute_goals(profile_columns(profiles), temperatures)
+
+
+class GoalRefresher:
+    """
+    Периодический пересчёт норм воды и калорий по текущей погоде.
+
+    Пользователи группируются по городу, температура каждого города
+    запрашивается один раз, затем нормы всех пользователей пересчитываются
+    одним векторным проходом NumPy. Обратно пишутся только изменившиеся нормы.
+
+    Args:
+        repository (UserRepository): Хранилище пользователей.
+        interval (float): Период пересчёта, в секундах.
+        concurrency (int): Максимум одновременных запросов погоды.
+    """
+
+    def __init__(self, repository: UserRepository, interval: float, concurrency: int = 10):
+        self.repository = repository
+        self.interval = interval
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+        self.updated = 0
+
+    async def _temperatures(self, cities: set[str]) -> dict[str, float]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(city: str):
+            async with semaphore:
+                return city, await get_current_temperature(city, API_KEY_WEATHER)
+
+        results = await asyncio.gather(*(fetch(city) for city in cities))
+        # Ошибка погоды - оставляем нормы города как есть
+        return {city: float(temp) for city, temp in results if not isinstance(temp, dict)}
+
+    async def run(self) -> int:
+        """
+        Один проход пересчёта.
+
+        Returns:
+            int: Количество пользователей, у которых изменились нормы.
+        """
+        profiles = await self.repository.goal_profiles()
+        if not profiles:
+            return 0
+        cities = {normalize_city(city) for city in {row[1] for row in profiles}}
+        temperatures = await self._temperatures(cities)
+        loop = asyncio.get_running_loop()
+        updates = await loop.run_in_executor(None, _recompute, profiles, temperatures)
+        if updates:
+            await self.repository.update_goals(updates)
+        self.updated += len(updates)
+        return len(updates)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run()
+            except Exception:
+                logger.exception("Ошибка при пересчёте норм")
+
+
+goal_refresher = GoalRefresher(users, GOALS_REFRESH_INTERVAL, GOALS_REFRESH_CONCURRENCY)
@@ -1,27 +1,40 @@
+import time
+from html import escape
 from aiogram import Router
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, BufferedInputFile
 from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from states import ProfileStates, FoodLogStates
-from config import API_KEY_WEATHER
+from config import ADMIN_IDS, API_KEY_WEATHER, DEFAULT_UTC_OFFSET, FOOD_MAX_ITEMS, STATS_TOP_SHOWN
 from utils import (
-    get_current_temperature,
+    get_city_weather,
     calc_daily_water,
     calc_daily_calories,
     get_food_info,
-    get_calories_burned_ninjas
+    get_food_infos,
+    get_calories_burned_ninjas,
+    lookup_cache,
+    parse_food_items
 )
-
-users = {}
+from events import event_log, WATER, FOOD, WORKOUT
+from exports import FORMATS, exporter
+from models import UserProfile, SECONDS_PER_DAY, local_day
+from outbox import send
+from reminders import DEFAULT_WINDOW, MIN_INTERVAL, Reminder, reminder_scheduler
+from reports import REPORT_PERIODS, report_renderer
+from resilience import UPSTREAMS
+from rollover import rollover_scheduler
+from stats import bot_stats
+from storage import users
 
 router = Router()
 
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
-    await message.reply(
+    send(message.reply(
         "Добро пожаловать! Используйте /set_profile, чтобы ввести свои данные."
-    )
+    ))
 
 
 @router.message(Command("help"))
@@ -32,11 +45,15 @@ async def cmd_help(message: Message):
         "❓ <b>/help</b> — сообщение с командами.\n\n"
         "📝 <b>Логирование:</b>\n"
         "💧 <b>/log_water</b> — записать выпитую воду.\n"
-        "🥗 <b>/log_food</b> — записать съеденный продукт.\n"
+        "🥗 <b>/log_food</b> — записать съеденный продукт или список: банан 120, молоко 200.\n"
         "🔥 <b>/log_workout</b> — записать тренировку.\n\n"
-        "📊 <b>/check_progress</b> — проверить ваш текущий прогресс по воде и калориям."
+        "📊 <b>/check_progress</b> — проверить ваш текущий прогресс по воде и калориям.\n"
+        "📅 <b>/history [дни]</b> — история по дням (по умолчанию за неделю).\n"
+        "📈 <b>/report [7|30]</b> — график воды и калорий относительно норм.\n"
+        "📦 <b>/export [csv|jsonl] [дни]</b> — выгрузить свои записи файлом.\n"
+        "⏰ <b>/remind_water [минуты] [часы]</b> — напоминать пить воду, /remind_water off — выключить."
     )
-    await message.reply(help_text, parse_mode="HTML")
+    send(message.reply(help_text, parse_mode="HTML"))
 
 
 @router.message(Command("set_profile"))
@@ -45,7 +62,7 @@ async def cmd_set_profile(message: Message, state: FSMContext):
     Начало настройки профиля.
     """
     # Запрос веса пользователя
-    await message.reply("Введите ваш вес (в кг):")
+    send(message.reply("Введите ваш вес (в кг):"))
     await state.set_state(ProfileStates.weight)
 
 
@@ -59,18 +76,21 @@ async def process_weight(message: Message, state: FSMContext):
         weight = float(message.text.replace(',', '.'))
     except ValueError:
         # Повторный ввод, если значение не корретно
-        return await message.reply("Пожалуйста, введите число.")
+        send(message.reply("Пожалуйста, введите число."))
+        return
 
     user_id = message.from_user.id
     # Инициализация записи для пользователя
-    if user_id not in users:
-        users[user_id] = {}
+    user = await users.get(user_id)
+    if user is None:
+        user = UserProfile()
 
     # Сохранение веса пользователя
-    users[user_id]["weight"] = weight
+    user.weight = weight
+    users.put(user_id, user)
 
     # Запрос на ввод роста
-    await message.reply("Введите ваш рост (в см):")
+    send(message.reply("Введите ваш рост (в см):"))
     await state.set_state(ProfileStates.height)
 
 
@@ -83,14 +103,17 @@ async def process_height(message: Message, state: FSMContext):
     try:
         height = float(message.text.replace(',', '.'))
     except ValueError:
-        return await message.reply("Пожалуйста, введите число.")
+        send(message.reply("Пожалуйста, введите число."))
+        return
 
     user_id = message.from_user.id
     # Сохранение веса пользователя
-    users[user_id]["height"] = height
+    user = await users.get(user_id) or UserProfile()
+    user.height = height
+    users.put(user_id, user)
 
     # Запрос на ввод возраста
-    await message.reply("Введите ваш возраст:")
+    send(message.reply("Введите ваш возраст:"))
     await state.set_state(ProfileStates.age)
 
 
@@ -103,11 +126,14 @@ async def process_age(message: Message, state: FSMContext):
     try:
         age = int(message.text)
     except ValueError:
-        return await message.reply("Пожалуйста, введите целое число.")
+        send(message.reply("Пожалуйста, введите целое число."))
+        return
 
     user_id = message.from_user.id
     # Сохранение возраста пользователя
-    users[user_id]["age"] = age
+    user = await users.get(user_id) or UserProfile()
+    user.age = age
+    users.put(user_id, user)
 
     # Селектор пола
     keyboard = InlineKeyboardMarkup(
@@ -116,7 +142,7 @@ async def process_age(message: Message, state: FSMContext):
             [InlineKeyboardButton(text="Женский", callback_data="gender_female")]
         ]
     )
-    await message.reply("Выберите ваш пол:", reply_markup=keyboard)
+    send(message.reply("Выберите ваш пол:", reply_markup=keyboard))
     await state.set_state(ProfileStates.gender)
 
 
@@ -126,23 +152,25 @@ async def process_gender(callback_query: CallbackQuery, state: FSMContext):
     Обработка выбор пола и запрос активности.
     """
     user_id = callback_query.from_user.id
+    user = await users.get(user_id) or UserProfile()
     if callback_query.data == "gender_male":
         # Сохранение если выбран мужской пол
-        users[user_id]["gender"] = "male"
+        user.gender = "male"
         gender_text = "Мужской"
     elif callback_query.data == "gender_female":
         # Сохранение если выбран женский пол
-        users[user_id]["gender"] = "female"
+        user.gender = "female"
         gender_text = "Женский"
     else:
-        await callback_query.answer("Некорректный выбор.")
+        send(callback_query.answer("Некорректный выбор."))
         return
+    users.put(user_id, user)
 
-    await callback_query.message.reply(f"Вы выбрали: {gender_text}")
-    await callback_query.answer(f"Вы выбрали: {gender_text}")
+    send(callback_query.message.reply(f"Вы выбрали: {gender_text}"))
+    send(callback_query.answer(f"Вы выбрали: {gender_text}"))
 
     # Запрос минут активности
-    await callback_query.message.reply("Сколько минут активности у вас в день?")
+    send(callback_query.message.reply("Сколько минут активности у вас в день?"))
     await state.set_state(ProfileStates.activity_minutes)
 
 
@@ -155,11 +183,14 @@ async def process_activity_minutes(message: Message, state: FSMContext):
     try:
         activity_minutes = int(message.text)
     except ValueError:
-        return await message.reply("Пожалуйста, введите целое число.")
+        send(message.reply("Пожалуйста, введите целое число."))
+        return
 
     user_id = message.from_user.id
     # Сохранение активности (мин.) пользователя
-    users[user_id]["activity_minutes"] = activity_minutes
+    user = await users.get(user_id) or UserProfile()
+    user.activity_minutes = activity_minutes
+    users.put(user_id, user)
 
     # Селектор уровня активности
     keyboard = InlineKeyboardMarkup(
@@ -169,7 +200,7 @@ async def process_activity_minutes(message: Message, state: FSMContext):
             [InlineKeyboardButton(text="Высокая", callback_data="activity_high")]
         ]
     )
-    await message.reply("Выберите уровень активности:", reply_markup=keyboard)
+    send(message.reply("Выберите уровень активности:", reply_markup=keyboard))
     await state.set_state(ProfileStates.activity_level)
 
 
@@ -179,24 +210,26 @@ async def process_activity_level(callback_query: CallbackQuery, state: FSMContex
     Обработка выбор уровня активности и запрос города.
     """
     user_id = callback_query.from_user.id
+    user = await users.get(user_id) or UserProfile()
     if callback_query.data == "activity_light":
-        users[user_id]["activity_level"] = "light"
+        user.activity_level = "light"
         activity_text = "Лёгкая"
     elif callback_query.data == "activity_middle":
-        users[user_id]["activity_level"] = "middle"
+        user.activity_level = "middle"
         activity_text = "Умеренная"
     elif callback_query.data == "activity_high":
-        users[user_id]["activity_level"] = "high"
+        user.activity_level = "high"
         activity_text = "Высокая"
     else:
-        await callback_query.answer("Некорректный выбор.")
+        send(callback_query.answer("Некорректный выбор."))
         return
+    users.put(user_id, user)
 
-    await callback_query.message.reply(f"Вы выбрали уровень активности: {activity_text}")
-    await callback_query.answer(f"Вы выбрали уровень активности: {activity_text}")
+    send(callback_query.message.reply(f"Вы выбрали уровень активности: {activity_text}"))
+    send(callback_query.answer(f"Вы выбрали уровень активности: {activity_text}"))
 
     # Запрос города
-    await callback_query.message.reply("В каком городе вы находитесь?")
+    send(callback_query.message.reply("В каком городе вы находитесь?"))
     await state.set_state(ProfileStates.city)
 
 
@@ -208,35 +241,47 @@ async def process_city(message: Message, state: FSMContext):
     user_id = message.from_user.id
     city = message.text.strip()
 
-    users[user_id]["city"] = city
+    # Один запрос погоды: при сбое API это ответ-заглушка, повторный запрос не нужен
+    weather = await get_city_weather(city, API_KEY_WEATHER)
 
-    users[user_id].setdefault("logged_water", 0)
-    users[user_id].setdefault("logged_calories", 0)
-    users[user_id].setdefault("burned_calories", 0)
+    user = await users.get(user_id) or UserProfile()
+    user.city = city
 
-    temp_result_api = get_current_temperature(city, API_KEY_WEATHER)
+    # Часовой пояс города - для смены дня в полночь по местному времени.
+    # Без ответа API пояс уже настроенного пользователя не меняется
+    utc_offset = weather.get("utc_offset", user.utc_offset if user.day else DEFAULT_UTC_OFFSET)
+    if utc_offset != user.utc_offset or not user.day:
+        # Текущий день - по новому поясу; сегодняшние счётчики сохраняются
+        user.utc_offset = utc_offset
+        user.day = local_day(time.time(), utc_offset)
+        if user.logged_water or user.logged_calories or user.burned_calories:
+            rollover_scheduler.schedule(user_id, user)
 
     # Проверка получения текущей температуры, если не нашло - берем температуру 20°C
-    if isinstance(temp_result_api, dict):
-        await message.reply(f"Не удалось получить температуру для '{city}'. "
-                            f"Считаем, что на улице 20°C.")
+    if "temp" not in weather:
+        send(message.reply(f"Не удалось получить температуру для '{city}'. "
+                           f"Считаем, что на улице 20°C."))
         temperature = 20
     else:
-        temperature = temp_result_api
+        temperature = weather["temp"]
 
-    weight = users[user_id]["weight"]
-    height = users[user_id]["height"]
-    age = users[user_id]["age"]
-    activity_minutes = users[user_id]["activity_minutes"]
-    activity_level = users[user_id]["activity_level"]
-    gender = users[user_id]["gender"]
+    weight = user.weight
+    height = user.height
+    age = user.age
+    activity_minutes = user.activity_minutes
+    activity_level = user.activity_level
+    gender = user.gender
 
     # Подсчет дневных норм
     water_goal = calc_daily_water(weight, activity_minutes, temperature)
     calorie_goal = calc_daily_calories(weight, height, age, activity_minutes, activity_level, gender)
 
-    users[user_id]["water_goal"] = int(water_goal)
-    users[user_id]["calorie_goal"] = int(calorie_goal)
+    user.base_water_goal = int(water_goal)
+    user.water_goal = user.base_water_goal
+    user.calorie_goal = int(calorie_goal)
+    user.profile_ready = True
+    users.put(user_id, user)
+    bot_stats.record_profile(user_id)
 
     summary = (
         "<b>Ваш профиль успешно сохранён!</b>\n"
@@ -247,11 +292,11 @@ async def process_city(message: Message, state: FSMContext):
         f"💪️ <b>Активность:</b> {activity_minutes} мин/день ({activity_level.capitalize()})\n"
         f"🏙️ <b>Город:</b> {city} (температура: {temperature}°C)\n\n"
         f"Рассчитанные нормы:\n"
-        f"💧 <b>Вода:</b> {users[user_id]['water_goal']} мл/день\n"
-        f"🥗 <b>Калории:</b> {users[user_id]['calorie_goal']} ккал/день\n"
+        f"💧 <b>Вода:</b> {user.water_goal} мл/день\n"
+        f"🥗 <b>Калории:</b> {user.calorie_goal} ккал/день\n"
     )
 
-    await message.reply(summary, parse_mode="HTML")
+    send(message.reply(summary, parse_mode="HTML"))
     await state.clear()
 
 
@@ -269,26 +314,31 @@ async def cmd_log_water(message: Message, command: CommandObject):
     user_id = message.from_user.id
 
     # Если нет профиля - перенаправляет на команду /set_profile
-    if user_id not in users or "water_goal" not in users[user_id]:
-        await message.reply("Сначала настройте профиль командой /set_profile.")
+    user = await users.get(user_id)
+    if user is None or not user.profile_ready:
+        send(message.reply("Сначала настройте профиль командой /set_profile."))
         return
 
     # Если нет аргументов
     if not command.args:
-        await message.reply("Укажите количество воды в миллилитрах, например:\n/log_water 300")
+        send(message.reply("Укажите количество воды в миллилитрах, например:\n/log_water 300"))
         return
 
     # Проверка на целочисленность
     try:
         water_amount = int(command.args)
     except ValueError:
-        await message.reply("Пожалуйста, введите целое число мл.")
+        send(message.reply("Пожалуйста, введите целое число мл."))
         return
 
-    users[user_id]["logged_water"] += water_amount
+    user.logged_water += water_amount
+    users.put(user_id, user)
+    rollover_scheduler.schedule(user_id, user)
+    event_log.append(user_id, WATER, water_amount)
+    bot_stats.record_water(user_id, water_amount)
 
-    water_goal = users[user_id]["water_goal"]
-    logged_water = users[user_id]["logged_water"]
+    water_goal = user.water_goal
+    logged_water = user.logged_water
     delta = water_goal - logged_water
 
     if delta > 0:
@@ -304,7 +354,7 @@ async def cmd_log_water(message: Message, command: CommandObject):
             f"Поздравляю!🎊 Вы достигли (или превысили) дневную норму воды."
         )
 
-    await message.reply(msg)
+    send(message.reply(msg))
 
 
 @router.message(Command("log_food"))
@@ -312,7 +362,9 @@ async def cmd_log_food(message: Message, command: CommandObject, state: FSMConte
     """
     Логирует съеденную пользователем еду.
 
-    Пример: /log_food банан
+    Примеры:
+        /log_food банан - граммы спрашиваются следующим сообщением.
+        /log_food банан 120, овсянка 60, молоко 200 - список с количеством записывается сразу.
 
     Args:
         message (Message): Сообщение от пользователя.
@@ -322,21 +374,31 @@ async def cmd_log_food(message: Message, command: CommandObject, state: FSMConte
     user_id = message.from_user.id
 
     # Если нет профиля - перенаправляет на команду /set_profile
-    if user_id not in users or "calorie_goal" not in users[user_id]:
-        await message.reply("Сначала настройте профиль командой /set_profile.")
+    user = await users.get(user_id)
+    if user is None or not user.profile_ready:
+        send(message.reply("Сначала настройте профиль командой /set_profile."))
         return
 
     # Если нет аргументов
     if not command.args:
-        await message.reply("Формат: /log_food <название продукта>\nНапример: /log_food банан")
+        send(message.reply(
+            "Формат: /log_food <название продукта>\nНапример: /log_food банан\n"
+            "Или сразу список с граммами: /log_food банан 120, овсянка 60, молоко 200"
+        ))
         return
 
     product_name = command.args.strip()
-    info = get_food_info(product_name)
+    items, invalid = parse_food_items(product_name)
+    if items or len(invalid) > 1:
+        await log_food_items(message, items, invalid)
+        return
+
+    # Один продукт без количества - граммы спрашиваются следующим сообщением
+    info = await get_food_info(product_name)
 
     # Продукт не найден
     if not info:
-        await message.reply(f"Не удалось найти продукт '{product_name}' в базе OpenFoodFacts.")
+        send(message.reply(f"Не удалось найти продукт '{product_name}' в базе OpenFoodFacts."))
         return
 
     # Для следующего шага
@@ -346,14 +408,79 @@ async def cmd_log_food(message: Message, command: CommandObject, state: FSMConte
     )
 
     # Вызов граммовки съеденного
-    await message.reply(
+    send(message.reply(
         f"Найдено: {info['name']}.\n"
         f"Калорийность: {info['calories']} ккал на 100 г.\n"
         "Сколько грамм вы съели?"
-    )
+    ))
     await state.set_state(FoodLogStates.waiting_for_grams)
 
 
+async def log_food_items(message: Message, items: list[tuple[str, float]], invalid: list[str]):
+    """
+    Записывает список продуктов с количеством одним обновлением.
+    Продукты ищутся одновременно, в ответе - калории по каждой позиции
+    и не найденные продукты.
+
+    Args:
+        message (Message): Сообщение от пользователя.
+        items (list): Пары (название, граммы).
+        invalid (list): Позиции без количества.
+    """
+    user_id = message.from_user.id
+
+    if len(items) + len(invalid) > FOOD_MAX_ITEMS:
+        send(message.reply(f"Не больше {FOOD_MAX_ITEMS} продуктов за раз."))
+        return
+
+    if not items:
+        send(message.reply(
+            "Укажите количество в граммах для каждого продукта, например:\n"
+            "/log_food банан 120, овсянка 60, молоко 200"
+        ))
+        return
+
+    infos = await get_food_infos([name for name, _ in items])
+
+    lines = []
+    logged = []
+    not_found = []
+    total_cals = 0.0
+    for name, grams in items:
+        info = infos.get(name)
+        try:
+            cals_per_100 = float(info["calories"])
+        except (TypeError, ValueError):
+            not_found.append(name)
+            continue
+        cals = cals_per_100 * grams / 100.0
+        total_cals += cals
+        logged.append((info["name"] or name, cals))
+        lines.append(f"- {info['name'] or name} ~ {grams:g} г = {round(cals, 1)} ккал")
+
+    text = ""
+    if lines:
+        user = await users.get(user_id) or UserProfile()
+        user.logged_calories += total_cals
+        users.put(user_id, user)
+        rollover_scheduler.schedule(user_id, user)
+        event_log.append(user_id, FOOD, total_cals)
+        for name, cals in logged:
+            bot_stats.record_food(user_id, name, cals)
+
+        text = (
+            "Записано:\n" + "\n".join(lines) + "\n"
+            f"Итого: {round(total_cals, 1)} ккал.\n"
+            f"Всего за сегодня: {round(user.logged_calories, 1)} ккал."
+        )
+    if not_found:
+        text += f"\n\nНе найдены в базе OpenFoodFacts: {', '.join(not_found)}."
+    if invalid:
+        text += f"\n\nНе указано количество: {', '.join(invalid)}."
+
+    send(message.reply(text.strip()))
+
+
 @router.message(FoodLogStates.waiting_for_grams)
 async def process_food_grams(message: Message, state: FSMContext):
     """
@@ -365,7 +492,7 @@ async def process_food_grams(message: Message, state: FSMContext):
     try:
         grams = float(message.text)
     except ValueError:
-        await message.reply("Введите число (количество граммов).")
+        send(message.reply("Введите число (количество граммов)."))
         return
 
     data = await state.get_data()
@@ -373,28 +500,33 @@ async def process_food_grams(message: Message, state: FSMContext):
     cals_per_100 = data.get("calories_per_100")
 
     if cals_per_100 is None:
-        await message.reply(f"Не удалось получить данные о калорийности для продукта: {product_name}.")
+        send(message.reply(f"Не удалось получить данные о калорийности для продукта: {product_name}."))
         await state.clear()
         return
 
     try:
         cals_per_100 = float(cals_per_100)
     except (ValueError, TypeError):
-        await message.reply(f"Неверное значение калорийности для продукта: {product_name}.")
+        send(message.reply(f"Неверное значение калорийности для продукта: {product_name}."))
         await state.clear()
         return
 
     total_cals = (cals_per_100 * grams) / 100.0
 
-    users[user_id]["logged_calories"] = users[user_id].get("logged_calories") + total_cals
+    user = await users.get(user_id) or UserProfile()
+    user.logged_calories += total_cals
+    users.put(user_id, user)
+    rollover_scheduler.schedule(user_id, user)
+    event_log.append(user_id, FOOD, total_cals)
+    bot_stats.record_food(user_id, product_name, total_cals)
 
     total_cals_rounded = round(total_cals, 1)
-    total_logged = round(users[user_id]["logged_calories"], 1)
+    total_logged = round(user.logged_calories, 1)
 
-    await message.reply(
+    send(message.reply(
         f"Записано: {product_name} ~ {grams} г = {total_cals_rounded} ккал.\n"
         f"Всего за сегодня: {total_logged} ккал."
-    )
+    ))
 
     await state.clear()
 
@@ -409,17 +541,18 @@ async def cmd_log_workout(message: Message, command: CommandObject):
     user_id = message.from_user.id
 
     # Если нет профиля - перенаправляет на команду /set_profile
-    if user_id not in users or "calorie_goal" not in users[user_id] or "water_goal" not in users[user_id]:
-        await message.reply("Сначала настройте профиль командой /set_profile.")
+    user = await users.get(user_id)
+    if user is None or not user.profile_ready:
+        send(message.reply("Сначала настройте профиль командой /set_profile."))
         return
 
     if not command.args:
-        await message.reply("Используйте: /log_workout <activity> <minutes>\nНапример: /log_workout running 30 (Только английский!)")
+        send(message.reply("Используйте: /log_workout <activity> <minutes>\nНапример: /log_workout бег 30"))
         return
 
     parts = command.args.split()
     if len(parts) < 2:
-        await message.reply("Нужно указать 2 аргумента: /log_workout <activity> <minutes>")
+        send(message.reply("Нужно указать 2 аргумента: /log_workout <activity> <minutes>"))
         return
 
     activity = parts[0]
@@ -427,29 +560,38 @@ async def cmd_log_workout(message: Message, command: CommandObject):
     try:
         minutes = int(parts[1])
     except ValueError:
-        await message.reply("Минуты должны быть числом.")
+        send(message.reply("Минуты должны быть числом."))
         return
 
     if minutes <= 0:
-        await message.reply("Время тренировки должно быть > 0.")
+        send(message.reply("Время тренировки должно быть > 0."))
         return
 
-    user_weight_kg = users[user_id]["weight"]
+    user_weight_kg = user.weight
 
-    burned_cals = get_calories_burned_ninjas(activity, minutes, user_weight_kg)
+    burned_cals = await get_calories_burned_ninjas(activity, minutes, user_weight_kg)
 
     if burned_cals == 0.0:
-        await message.reply(f"Не удалось найти/рассчитать калории для '{activity}'.")
+        send(message.reply(f"Не удалось найти/рассчитать калории для '{activity}'."))
         return
 
-    users[user_id]["burned_calories"] += burned_cals
+    # Пока шёл запрос, пользователь мог записать воду или еду - берём актуальную запись
+    user = await users.get(user_id)
+    if user is None:
+        send(message.reply("Сначала настройте профиль командой /set_profile."))
+        return
+    user.burned_calories += burned_cals
     extra_water = (minutes // 30) * 200
-    users[user_id]["water_goal"] += extra_water
+    user.water_goal += extra_water
+    users.put(user_id, user)
+    rollover_scheduler.schedule(user_id, user)
+    event_log.append(user_id, WORKOUT, burned_cals)
+    bot_stats.record_workout(user_id, activity, burned_cals)
 
-    water_goal = users[user_id]["water_goal"]
+    water_goal = user.water_goal
     burned_rounded = round(burned_cals, 1)
-    total_rounded = round(users[user_id]["burned_calories"], 1)
-    total_water = users[user_id]["logged_water"]
+    total_rounded = round(user.burned_calories, 1)
+    total_water = user.logged_water
 
     response_text = (
         f"Тренировка: {activity} ({activity}), {minutes} мин.\n"
@@ -470,7 +612,7 @@ async def cmd_log_workout(message: Message, command: CommandObject):
             f"Осталось выпить: {water_goal-total_water} мл."
         )
 
-    await message.answer(response_text)
+    send(message.answer(response_text))
 
 
 @router.message(Command("check_progress"))
@@ -480,19 +622,18 @@ async def cmd_check_progress(message: Message):
     """
     user_id = message.from_user.id
 
-    if user_id not in users:
-        await message.answer("Сначала настройте свой профиль командой /set_profile.")
+    user_data = await users.get(user_id)
+    if user_data is None or not user_data.profile_ready:
+        send(message.answer("Сначала настройте свой профиль командой /set_profile."))
         return
 
-    user_data = users[user_id]
-
     # Достаём данные
-    water_goal = user_data.get("water_goal")
-    logged_water = user_data.get("logged_water")
+    water_goal = user_data.water_goal
+    logged_water = user_data.logged_water
 
-    calorie_goal = user_data.get("calorie_goal")
-    logged_calories = user_data.get("logged_calories")
-    burned_calories = user_data.get("burned_calories")
+    calorie_goal = user_data.calorie_goal
+    logged_calories = user_data.logged_calories
+    burned_calories = user_data.burned_calories
 
     water_delta = water_goal - logged_water
     if water_delta < 0:
@@ -512,7 +653,312 @@ async def cmd_check_progress(message: Message):
         f"- Баланс (потреблённые - сожжённые): {net_calories} ккал\n"
     )
 
-    await message.answer(progress_text, parse_mode="HTML")
+    send(message.answer(progress_text, parse_mode="HTML"))
+
+
+@router.message(Command("history"))
+async def cmd_history(message: Message, command: CommandObject):
+    """
+    История воды и калорий по дням.
+
+    Пример: /history 30
+
+    Args:
+        message (Message): Сообщение от пользователя.
+        command (CommandObject): Объект команды, содержащий аргументы команды (количество дней, по умолчанию 7).
+    """
+    user_id = message.from_user.id
+
+    days = 7
+    if command.args:
+        try:
+            days = int(command.args)
+        except ValueError:
+            send(message.reply("Количество дней должно быть целым числом, например:\n/history 30"))
+            return
+        if not 1 <= days <= 365:
+            send(message.reply("Количество дней должно быть от 1 до 365."))
+            return
+
+    # Дни считаются по часовому поясу пользователя
+    user = await users.get(user_id)
+    utc_offset = user.utc_offset if user is not None and user.profile_ready else DEFAULT_UTC_OFFSET
+
+    # Начало периода - локальная полночь (days - 1) дней назад
+    first_day = local_day(time.time(), utc_offset) - (days - 1)
+    since = first_day * SECONDS_PER_DAY - utc_offset
+
+    totals_by_day = {}
+    for event in event_log.query(user_id, since=since):
+        day = time.strftime("%d.%m", time.gmtime(event.ts + utc_offset))
+        totals = totals_by_day.setdefault(day, {WATER: 0.0, FOOD: 0.0, WORKOUT: 0.0})
+        totals[event.kind] += event.amount
+
+    if not totals_by_day:
+        send(message.reply(f"За последние {days} дн. записей нет."))
+        return
+
+    lines = [f"<b>📅 История за {days} дн.</b>\n"]
+    for day, totals in totals_by_day.items():
+        lines.append(
+            f"{day}: 💧 {round(totals[WATER])} мл | "
+            f"🥗 {round(totals[FOOD], 1)} ккал | "
+            f"🔥 {round(totals[WORKOUT], 1)} ккал"
+        )
+
+    water = sum(totals[WATER] for totals in totals_by_day.values())
+    eaten = sum(totals[FOOD] for totals in totals_by_day.values())
+    burned = sum(totals[WORKOUT] for totals in totals_by_day.values())
+    lines.append(
+        f"\n<b>Итого:</b> 💧 {round(water)} мл | 🥗 {round(eaten, 1)} ккал | 🔥 {round(burned, 1)} ккал\n"
+        f"<b>В среднем за день:</b> 💧 {round(water / days)} мл | "
+        f"🥗 {round(eaten / days, 1)} ккал | 🔥 {round(burned / days, 1)} ккал"
+    )
+
+    send(message.reply("\n".join(lines), parse_mode="HTML"))
+
+
+@router.message(Command("report"))
+async def cmd_report(message: Message, command: CommandObject):
+    """
+    График воды и калорий относительно норм за 7 или 30 дней.
+
+    Пример: /report 30
+
+    Args:
+        message (Message): Сообщение от пользователя.
+        command (CommandObject): Объект команды, аргумент - период в днях (по умолчанию 7).
+    """
+    user_id = message.from_user.id
+
+    days = REPORT_PERIODS[0]
+    if command.args:
+        try:
+            days = int(command.args)
+        except ValueError:
+            days = 0
+        if days not in REPORT_PERIODS:
+            send(message.reply("Период отчёта - 7 или 30 дней, например:\n/report 30"))
+            return
+
+    user = await users.get(user_id)
+    if user is None or not user.profile_ready:
+        send(message.reply("Сначала настройте профиль командой /set_profile."))
+        return
+
+    png = await report_renderer.render(user_id, user, days)
+    if png is None:
+        send(message.reply(f"За последние {days} дн. записей нет."))
+        return
+
+    send(message.reply_photo(
+        BufferedInputFile(png, filename=f"report_{days}.png"),
+        caption=f"📈 Прогресс за {days} дн."
+    ))
+
+
+def _format_window(start: int, end: int) -> str:
+    return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+
+@router.message(Command("remind_water"))
+async def cmd_remind_water(message: Message, command: CommandObject):
+    """
+    Напоминания выпить воды, пока не выпита дневная норма.
+
+    Примеры:
+        /remind_water 120 - каждые 2 часа с 9 до 21 по местному времени.
+        /remind_water 90 8-22 - каждые 1,5 часа с 8 до 22.
+        /remind_water off - выключить.
+
+    Args:
+        message (Message): Сообщение от пользователя.
+        command (CommandObject): Объект команды: интервал в минутах и окно в часах.
+    """
+    user_id = message.from_user.id
+
+    user = await users.get(user_id)
+    if user is None or not user.profile_ready:
+        send(message.reply("Сначала настройте профиль командой /set_profile."))
+        return
+
+    usage = (
+        "Формат: /remind_water <минуты> [с-до], например:\n"
+        "/remind_water 120 - каждые 2 часа с 9 до 21\n"
+        "/remind_water 90 8-22\n"
+        "/remind_water off - выключить"
+    )
+
+    if not command.args:
+        reminder = reminder_scheduler.get(user_id)
+        if reminder is None:
+            send(message.reply(f"Напоминания выключены.\n\n{usage}"))
+        else:
+            send(message.reply(
+                f"Напоминания каждые {reminder.interval} мин., "
+                f"{_format_window(reminder.start, reminder.end)}.\n\n{usage}"
+            ))
+        return
+
+    parts = command.args.split()
+    if parts[0].lower() in ("off", "выкл", "стоп"):
+        await reminder_scheduler.set(user_id, None)
+        send(message.reply("Напоминания о воде выключены."))
+        return
+
+    try:
+        interval = int(parts[0])
+        start, end = DEFAULT_WINDOW
+        if len(parts) > 1:
+            start_hour, end_hour = (int(hour) for hour in parts[1].split("-"))
+            start, end = start_hour * 60, end_hour * 60
+    except ValueError:
+        send(message.reply(usage))
+        return
+
+    if interval < MIN_INTERVAL:
+        send(message.reply(f"Интервал - не меньше {MIN_INTERVAL} минут."))
+        return
+    if not 0 <= start < end <= 24 * 60:
+        send(message.reply("Часы напоминаний - от 0 до 24, начало раньше конца, например 8-22."))
+        return
+
+    due = await reminder_scheduler.set(user_id, Reminder(interval, start, end, user.utc_offset))
+    send(message.reply(
+        f"Буду напоминать пить воду каждые {interval} мин., {_format_window(start, end)}, "
+        f"пока не выпита норма.\n"
+        f"Ближайшее напоминание в {time.strftime('%H:%M', time.gmtime(due + user.utc_offset))}."
+    ))
+
+
+def _parse_export_args(args: str) -> tuple[str, int]:
+    """
+    Формат и период выгрузки из аргументов в любом порядке: "jsonl 30".
+
+    Returns:
+        tuple: (формат, дни); 0 дней - за всё время.
+    """
+    fmt, days = FORMATS[0], 0
+    for part in args.lower().split():
+        if part in FORMATS:
+            fmt = part
+        else:
+            days = int(part)
+            if days < 1:
+                raise ValueError(part)
+    return fmt, days
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    """
+    Выгрузка своих записей (вода, еда, тренировки) файлом CSV или JSONL.
+
+    Примеры:
+        /export - все записи в CSV.
+        /export jsonl 30 - за последние 30 дней в JSONL.
+
+    Args:
+        message (Message): Сообщение от пользователя.
+        command (CommandObject): Объект команды: формат и количество дней.
+    """
+    user_id = message.from_user.id
+
+    try:
+        fmt, days = _parse_export_args(command.args or "")
+    except ValueError:
+        send(message.reply("Формат: /export [csv|jsonl] [дни], например:\n/export csv 30"))
+        return
+
+    # Время записей и начало периода - по часовому поясу пользователя
+    user = await users.get(user_id)
+    utc_offset = user.utc_offset if user is not None and user.profile_ready else DEFAULT_UTC_OFFSET
+    since = 0.0
+    if days:
+        since = (local_day(time.time(), utc_offset) - (days - 1)) * SECONDS_PER_DAY - utc_offset
+
+    if not exporter.export_user(message, user_id, fmt, since, utc_offset):
+        send(message.reply("Выгрузка уже готовится, дождитесь файла."))
+    elif exporter.queued():
+        send(message.reply("Выгрузка поставлена в очередь, файл придёт, когда подойдёт очередь."))
+
+
+@router.message(Command("export_all"))
+async def cmd_export_all(message: Message, command: CommandObject):
+    """
+    Выгрузка записей всех пользователей в файл на сервере (только для администраторов).
+
+    Args:
+        message (Message): Сообщение от администратора.
+        command (CommandObject): Объект команды, аргумент - формат (csv или jsonl).
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        send(message.reply("Команда доступна только администраторам."))
+        return
+
+    fmt = (command.args or FORMATS[0]).strip().lower()
+    if fmt not in FORMATS:
+        send(message.reply("Формат: /export_all [csv|jsonl]"))
+        return
+
+    if not exporter.export_all(message, fmt):
+        send(message.reply("Выгрузка всех пользователей уже идёт."))
+    else:
+        send(message.reply("Выгрузка всех пользователей запущена, прогресс будет в этом чате."))
+
+
+def _format_top(title: str, top: list[tuple]) -> list[str]:
+    if not top:
+        return [f"{title} нет данных"]
+    lines = [title]
+    for place, (item, count, error) in enumerate(top, 1):
+        # Space-Saving может завысить счёт не больше чем на ошибку
+        lines.append(f"{place}. {escape(str(item))} — {count:g}" + (f" (±{error:g})" if error else ""))
+    return lines
+
+
+def _percent(part: float, whole: float) -> str:
+    return f"{part * 100 / whole:.1f}%" if whole else "—"
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """
+    Сводка для администраторов: итоги дня, частые продукты и активности,
+    промахи кэшей и отказы внешних API. Все значения поддерживаются
+    при записи (см. stats.py), время ответа не зависит от числа пользователей.
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        send(message.reply("Команда доступна только администраторам."))
+        return
+
+    today = bot_stats.today()
+    entries = today["entries"]
+    lines = [
+        f"<b>📊 Статистика за {time.strftime('%d.%m', time.gmtime(time.time() + bot_stats.utc_offset))}</b>\n",
+        f"👥 Активных пользователей: ~{today['active']}",
+        f"💧 Вода: {today['water']} мл, записей: {entries['water']}",
+        f"🥗 Съедено: {round(today['eaten'], 1)} ккал, записей: {entries['food']}",
+        f"🔥 Сожжено: {round(today['burned'], 1)} ккал, тренировок: {entries['workout']}",
+        f"⚙️ Заполнено профилей: {entries['profile']}",
+        "",
+        *_format_top("<b>🍽 Частые продукты:</b>", bot_stats.foods.top(STATS_TOP_SHOWN)),
+        "",
+        *_format_top("<b>🏃 Частые активности:</b>", bot_stats.activities.top(STATS_TOP_SHOWN)),
+        "",
+        "<b>🗄 Промахи кэшей:</b>",
+    ]
+    for name, cache in lookup_cache.stats().items():
+        lookups = cache["hits"] + cache["misses"]
+        lines.append(f"{name}: {_percent(cache['misses'], lookups)} ({cache['misses']} из {lookups})")
+    lines.append("\n<b>🌐 Отказы внешних API:</b>")
+    for upstream in UPSTREAMS:
+        lines.append(
+            f"{upstream.name}: {_percent(upstream.fallbacks, upstream.calls)} "
+            f"({upstream.fallbacks} из {upstream.calls}), автомат {upstream.breaker.state}"
+        )
+
+    send(message.reply("\n".join(lines), parse_mode="HTML"))
 
 
 def setup_handlers(dp):
@@ -0,0 +1,59 @@
+from typing import Optional
+
+import aiohttp
+
+from config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_TOTAL_TIMEOUT,
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT
+)
+
+# Единственная сессия на всё время жизни бота
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def open_session() -> aiohttp.ClientSession:
+    """
+    Создаёт общую сессию с пулом keep-alive соединений.
+    Вызывается один раз при старте бота.
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        return _session
+
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=HTTP_TOTAL_TIMEOUT,
+        sock_connect=HTTP_CONNECT_TIMEOUT
+    )
+    _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+
+async def close_session() -> None:
+    """
+    Закрывает общую сессию и все соединения пула.
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Возвращает общую сессию.
+
+    Raises:
+        RuntimeError: Если сессия ещё не открыта через open_session().
+    """
+    if _session is None or _session.closed:
+        raise RuntimeError("HTTP-сессия не открыта. Вызовите open_session() при старте.")
+    return _session
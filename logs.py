@@ -0,0 +1,121 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Optional
+
+from config import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATE, LOG_REDACT_TEXT
+
+# Сколько символов текста сообщения писать в лог без редактирования
+TEXT_LIMIT = 200
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна запись - одна строка JSON. Структурные поля передаются
+    через extra={"fields": {...}} и попадают в запись на верхний уровень.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "msg": record.getMessage()
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler с ограниченной очередью: при переполнении запись
+    отбрасывается, а не блокирует цикл событий.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # JSON собирается в фоновом потоке; здесь только фиксируем сообщение и трассировку,
+        # пока аргументы и исключение ещё живы
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging() -> None:
+    """
+    Настраивает корневой логгер: записи кладутся в очередь,
+    а пишет их в stdout фоновый поток (QueueListener).
+    Повторный вызов ничего не делает.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [DroppingQueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    # Обновления логируются своим middleware, служебные записи aiogram не нужны
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """
+    Дописывает оставшиеся в очереди записи и останавливает фоновый поток.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
+
+def sampled() -> bool:
+    """
+    Попадает ли рядовое событие в лог (доля LOG_SAMPLE_RATE).
+    """
+    return LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE
+
+
+def redact(text: Optional[str]) -> Optional[str]:
+    """
+    Текст сообщения для лога: при LOG_REDACT_TEXT остаётся только команда,
+    остальной текст заменяется его длиной.
+    """
+    if text is None:
+        return None
+    if not LOG_REDACT_TEXT:
+        return text[:TEXT_LIMIT]
+    if text.startswith("/"):
+        return text.split(maxsplit=1)[0][:TEXT_LIMIT]
+    return f"<{len(text)} симв.>"
@@ -0,0 +1,208 @@
+"""
+Кэш ответов внешних API (погода, продукты, активности), переживающий перезапуск.
+
+Каждое API - своё пространство имён со своим TTL и размером. Периодически
+и при остановке живые записи пишутся в компактный двоичный снимок,
+а при старте читаются из него через mmap (от давно использованных
+к недавним, чтобы сохранить порядок вытеснения).
+
+Формат снимка:
+    заголовок   b"LKC1", число пространств (B), их названия (B длина + UTF-8)
+    запись      истекает в (d, unix), пространство (B), длина ключа (H),
+                длина значения (I), ключ UTF-8, значение JSON UTF-8
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Optional
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LKC1"
+RECORD = struct.Struct("<dBHI")
+
+# Латинские буквы, похожие на кириллические, и наоборот (после casefold)
+_LATIN = "aceopxyk"
+_CYRILLIC = "асеорхук"
+_TO_CYRILLIC = str.maketrans(_LATIN, _CYRILLIC)
+_TO_LATIN = str.maketrans(_CYRILLIC, _LATIN)
+
+
+def _fold_word(word: str) -> str:
+    # Слово из смеси алфавитов приводится к алфавиту большинства его букв
+    cyrillic = sum("а" <= ch <= "я" for ch in word)
+    latin = sum("a" <= ch <= "z" for ch in word)
+    if not cyrillic or not latin:
+        return word
+    return word.translate(_TO_CYRILLIC if cyrillic >= latin else _TO_LATIN)
+
+
+def normalize_key(text: str) -> str:
+    """
+    Ключ кэша: регистр, пробелы, "ё" и латинские буквы-двойники
+    в кириллических словах ("мoлоко" с латинской "o" -> "молоко").
+    """
+    text = text.casefold().replace("ё", "е")
+    return " ".join(_fold_word(word) for word in text.split())
+
+
+class LookupCache:
+    """
+    Набор TTLCache по внешним API со снимком на диске.
+
+    Args:
+        path (str): Файл снимка.
+        snapshot_interval (float): Период записи снимка, в секундах.
+    """
+
+    def __init__(self, path: str, snapshot_interval: float = 300):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self._namespaces: dict[str, TTLCache] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def namespace(self, name: str, maxsize: int, ttl: float) -> TTLCache:
+        """
+        Кэш одного API (ключи - строки, значения - то, что сериализуется в JSON).
+        """
+        cache = self._namespaces[name] = TTLCache(maxsize=maxsize, ttl=ttl)
+        return cache
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """
+        Счётчики кэша каждого API (см. TTLCache.stats).
+        """
+        return {name: cache.stats() for name, cache in self._namespaces.items()}
+
+    def load(self) -> int:
+        """
+        Загружает неистёкшие записи из снимка.
+
+        Returns:
+            int: Количество загруженных записей.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return 0
+        loaded = 0
+        with f:
+            if os.fstat(f.fileno()).st_size < len(MAGIC) + 1:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                try:
+                    loaded = self._read(data)
+                except (ValueError, struct.error, UnicodeDecodeError) as e:
+                    logger.warning("Снимок кэша %s повреждён: %r", self.path, e)
+        return loaded
+
+    def _read(self, data: mmap.mmap) -> int:
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("неизвестный формат")
+        count, position = data[len(MAGIC)], len(MAGIC) + 1
+        names = []
+        for _ in range(count):
+            size = data[position]
+            names.append(data[position + 1:position + 1 + size].decode())
+            position += 1 + size
+
+        now = time.time()
+        loaded = 0
+        end = len(data)
+        while position + RECORD.size <= end:
+            expires_at, ns, key_size, value_size = RECORD.unpack_from(data, position)
+            position += RECORD.size
+            start, position = position, position + key_size + value_size
+            # Истёкшие записи и пространства, которых больше нет, пропускаются без разбора значения
+            cache = self._namespaces.get(names[ns]) if ns < len(names) else None
+            if cache is None or expires_at <= now or position > end:
+                continue
+            key = data[start:start + key_size].decode()
+            value = json.loads(data[start + key_size:position])
+            cache.set(key, value, ttl=expires_at - now)
+            loaded += 1
+        return loaded
+
+    def _collect(self) -> tuple[list[str], list[tuple]]:
+        # Копия живых записей - в потоке цикла, чтобы не гоняться с изменениями кэшей
+        names = list(self._namespaces)
+        now = time.time()
+        entries = [
+            (ns, key, now + ttl, value)
+            for ns, name in enumerate(names)
+            for key, ttl, value in self._namespaces[name].items()
+            if isinstance(key, str)
+        ]
+        return names, entries
+
+    def _write(self, names: list[str], entries: list[tuple]) -> int:
+        header = bytearray(MAGIC)
+        header.append(len(names))
+        for name in names:
+            encoded = name.encode()
+            header.append(len(encoded))
+            header += encoded
+
+        chunks = [bytes(header)]
+        for ns, key, expires_at, value in entries:
+            encoded_key = key.encode()
+            encoded_value = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+            chunks.append(RECORD.pack(expires_at, ns, len(encoded_key), len(encoded_value)))
+            chunks.append(encoded_key)
+            chunks.append(encoded_value)
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Уникальный временный файл: снимок не смешается с чужой недописанной записью
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(b"".join(chunks))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return len(entries)
+
+    async def save(self) -> int:
+        """
+        Записывает живые записи в снимок (атомарно, через временный файл).
+        Сериализация и запись - в отдельном потоке.
+
+        Returns:
+            int: Количество записанных записей.
+        """
+        names, entries = self._collect()
+        return await asyncio.to_thread(self._write, names, entries)
+
+    async def start(self) -> None:
+        loaded = self.load()
+        logger.info("Кэш внешних API: загружено %d записей из снимка", loaded)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.save()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                saved = await self.save()
+            except OSError as e:
+                logger.warning("Не удалось записать снимок кэша: %r", e)
+                continue
+            logger.info("Снимок кэша внешних API: %d записей", saved, extra={"fields": {"caches": self.stats()}})
@@ -0,0 +1,241 @@
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT
+
+# Границы корзин гистограмм задержки, в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+registry: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    Базовый класс метрики с метками.
+
+    Метрики изменяются только из потока цикла событий, поэтому
+    обходятся без блокировок: инкремент - обычная операция над числом.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        registry.append(self)
+
+    def labels(self, *values: str):
+        """
+        Дочерняя метрика для набора меток (создаётся при первом обращении).
+        """
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {child.sum}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+def render() -> str:
+    """
+    Все метрики в текстовом формате Prometheus.
+    """
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+handler_latency = Histogram(
+    "bot_handler_duration_seconds", "Время обработки события хендлером", ("handler",)
+)
+handler_errors = Counter(
+    "bot_handler_errors_total", "Исключения в хендлерах", ("handler",)
+)
+upstream_latency = Histogram(
+    "bot_upstream_duration_seconds", "Время запроса к внешнему API", ("upstream",)
+)
+upstream_requests = Counter(
+    "bot_upstream_requests_total", "Запросы к внешним API по коду ответа", ("upstream", "status")
+)
+throttled = Counter(
+    "bot_throttled_total", "Сообщения, отклонённые ограничением частоты", ("rule",)
+)
+
+
+class track_upstream:
+    """
+    Замер запроса к внешнему API: время, код ответа или исход
+    ("ok", "timeout", "cancelled", "error").
+
+        with track_upstream("openweathermap") as call:
+            async with session.get(...) as response:
+                call.status = response.status
+    """
+
+    __slots__ = ("upstream", "status", "_started")
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.status: Optional[int] = None
+
+    def __enter__(self) -> "track_upstream":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        upstream_latency.labels(self.upstream).observe(time.perf_counter() - self._started)
+        # Ответ получен - считаем по его коду, даже если вызывающий затем поднял ошибку (5xx, 429)
+        if self.status is not None:
+            status = str(self.status)
+        elif exc_type is None:
+            status = "ok"
+        elif issubclass(exc_type, asyncio.TimeoutError):
+            status = "timeout"
+        elif issubclass(exc_type, asyncio.CancelledError):
+            # Отмена по истечении бюджета (см. resilience.deadline) - таймаут,
+            # иначе (проигравший дублирующий запрос) - не ошибка API
+            from resilience import remaining  # resilience импортирует metrics
+            left = remaining()
+            status = "timeout" if left is not None and left <= 0 else "cancelled"
+        else:
+            status = "error"
+        upstream_requests.labels(self.upstream, status).inc()
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """
+    Замер запросов к Bot API (отправка сообщений и т. п.) как внешнего API "telegram".
+    """
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod):
+        with track_upstream("telegram") as call:
+            response = await make_request(bot, method)
+            # Ошибки Bot API сессия поднимает исключениями
+            call.status = 200
+        return response
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+class MetricsServer:
+    """
+    HTTP-эндпоинт /metrics для Prometheus (port 0 - выключен).
+
+    Args:
+        host (str): Адрес для прослушивания.
+        port (int): Порт.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT)
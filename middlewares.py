@@ -1,8 +1,203 @@
-from aiogram.types import Message
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Union
+
+from aiogram.types import CallbackQuery, Message
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
 
+from config import LOG_SLOW_UPDATE_MS
+from logs import redact, sampled
+from metrics import handler_errors, handler_latency, throttled
+from outbox import send
+from resilience import deadline
+
+logger = logging.getLogger("bot.updates")
+
 
 class LoggingMiddleware(BaseMiddleware):
+    """
+    Структурная запись на каждое обработанное событие: update_id, user_id,
+    хендлер, время обработки и результат. Ошибки и медленные обновления
+    пишутся всегда, остальные - с долей LOG_SAMPLE_RATE.
+    Подключается к сообщениям и callback-запросам.
+    """
+
+    async def __call__(self, handler, event: Union[Message, CallbackQuery], data: dict):
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception:
+            self._log(event, data, "error", (time.perf_counter() - started) * 1000)
+            raise
+        latency_ms = (time.perf_counter() - started) * 1000
+        if latency_ms >= LOG_SLOW_UPDATE_MS or sampled():
+            self._log(event, data, "ok", latency_ms)
+        return result
+
+    @staticmethod
+    def _log(event: Union[Message, CallbackQuery], data: dict, outcome: str, latency_ms: float) -> None:
+        update = data.get("event_update")
+        handler_object = data.get("handler")
+        user = event.from_user
+        fields = {
+            "update_id": update.update_id if update is not None else None,
+            "user_id": user.id if user is not None else None,
+            "handler": handler_object.callback.__name__ if handler_object is not None else None,
+            "latency_ms": round(latency_ms, 2),
+            "outcome": outcome
+        }
+        if isinstance(event, Message):
+            fields["text"] = redact(event.text)
+        else:
+            fields["data"] = event.data
+        level = logging.ERROR if outcome == "error" else logging.INFO
+        logger.log(level, "update", exc_info=outcome == "error", extra={"fields": fields})
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Гистограмма времени обработки и счётчик ошибок по хендлерам
+    (количество вызовов - в _count гистограммы).
+    """
+
+    async def __call__(self, handler, event: Union[Message, CallbackQuery], data: dict):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.labels(name).inc()
+            raise
+        finally:
+            handler_latency.labels(name).observe(time.perf_counter() - started)
+
+
+def rule_key(event: Message, data: dict) -> str:
+    """
+    Ключ правила для сообщения: команда без "/" и @имени бота,
+    иначе состояние FSM, иначе "*".
+    """
+    text = event.text or ""
+    if text.startswith("/"):
+        return text[1:].split(maxsplit=1)[0].split("@", 1)[0].lower() if len(text) > 1 else "*"
+    return data.get("raw_state") or "*"
+
+
+class _Limit:
+    """
+    Вёдра токенов одного правила по user_id.
+
+    Ведро хранится кортежем (токены, время последнего обращения, уведомлён ли
+    пользователь) в OrderedDict в порядке обращений, поэтому в начале всегда
+    самые давние. Ведро, простоявшее дольше времени полного восстановления,
+    не отличается от нового и удаляется.
+    """
+
+    __slots__ = ("rate", "burst", "idle", "buckets")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.idle = burst / rate
+        self.buckets: "OrderedDict[int, tuple[float, float, bool]]" = OrderedDict()
+
+    def hit(self, user_id: int, now: float) -> tuple[bool, float, bool]:
+        """
+        Returns:
+            tuple: (пропустить ли, через сколько секунд будет токен,
+                    нужно ли сообщить пользователю об ограничении).
+        """
+        buckets = self.buckets
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if now - oldest[1] < self.idle:
+                break
+            buckets.popitem(last=False)
+
+        entry = buckets.pop(user_id, None)
+        if entry is None:
+            tokens, notified = self.burst, False
+        else:
+            tokens = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+            notified = entry[2]
+        if tokens >= 1:
+            buckets[user_id] = (tokens - 1, now, False)
+            return True, 0.0, False
+        buckets[user_id] = (tokens, now, True)
+        return False, (1 - tokens) / self.rate, not notified
+
+
+def parse_limits(spec: str) -> dict[str, _Limit]:
+    """
+    Разбирает правила вида "log_food=10/60:3,*=60/60:20".
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        amount, _, rest = value.partition("/")
+        seconds, _, burst = rest.partition(":")
+        limits[key.strip()] = _Limit(float(amount) / float(seconds), float(burst or amount))
+    return limits
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты сообщений пользователя по правилам для команд
+    и состояний FSM. Отклонённое сообщение не доходит до хендлера,
+    пользователь один раз получает короткий ответ.
+    Подключается как outer-middleware, до фильтров и хендлеров.
+    """
+
+    def __init__(self, limits: dict[str, _Limit]):
+        self.limits = limits
+        self.default = limits.get("*")
+
+    async def __call__(self, handler, event: Message, data: dict):
+        if event.from_user is None:
+            return await handler(event, data)
+        rule = rule_key(event, data)
+        limit = self.limits.get(rule)
+        if limit is None:
+            rule, limit = "*", self.default
+            if limit is None:
+                return await handler(event, data)
+
+        allowed, wait, notify = limit.hit(event.from_user.id, time.monotonic())
+        if allowed:
+            return await handler(event, data)
+        throttled.labels(rule).inc()
+        if notify:
+            send(event.answer(f"Слишком много запросов. Попробуйте через {math.ceil(wait)} с."))
+        return None
+
+
+def parse_budgets(spec: str) -> dict[str, float]:
+    """
+    Разбирает бюджеты вида "log_food=3,*=5" (секунды).
+    """
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        budgets[key.strip()] = float(value)
+    return budgets
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """
+    Задаёт бюджет времени на обработку сообщения по команде или состоянию FSM:
+    запросы к внешним API в хендлере не выходят за его остаток (см. resilience.py).
+    """
+
+    def __init__(self, budgets: dict[str, float]):
+        self.budgets = budgets
+        self.default = budgets.get("*")
+
     async def __call__(self, handler, event: Message, data: dict):
-        print(f"Получено сообщение: {event.text}")
-        return await handler(event, data)
+        budget = self.budgets.get(rule_key(event, data), self.default)
+        if budget is None:
+            return await handler(event, data)
+        with deadline(budget):
+            return await handler(event, data)
@@ -0,0 +1,139 @@
+from typing import Optional
+
+SECONDS_PER_DAY = 86400
+
+
+def local_day(ts: float, utc_offset: int) -> int:
+    """
+    Номер локального дня (дней с 01.01.1970) для момента ts в поясе utc_offset.
+    """
+    return int((ts + utc_offset) // SECONDS_PER_DAY)
+
+
+class UserProfile:
+    """
+    Профиль и дневные счётчики пользователя.
+
+    Используются __slots__ вместо словаря: у записи фиксированный набор
+    полей с явными значениями по умолчанию и нет накладных расходов на __dict__.
+    """
+
+    __slots__ = (
+        "weight",
+        "height",
+        "age",
+        "gender",
+        "activity_minutes",
+        "activity_level",
+        "city",
+        "utc_offset",
+        "base_water_goal",
+        "water_goal",
+        "calorie_goal",
+        "logged_water",
+        "logged_calories",
+        "burned_calories",
+        "day",
+        "profile_ready"
+    )
+
+    def __init__(
+        self,
+        weight: float = 0.0,
+        height: float = 0.0,
+        age: int = 0,
+        gender: str = "",
+        activity_minutes: int = 0,
+        activity_level: str = "",
+        city: str = "",
+        utc_offset: int = 0,
+        base_water_goal: int = 0,
+        water_goal: int = 0,
+        calorie_goal: int = 0,
+        logged_water: int = 0,
+        logged_calories: float = 0.0,
+        burned_calories: float = 0.0,
+        day: int = 0,
+        profile_ready: bool = False
+    ):
+        self.weight = weight
+        self.height = height
+        self.age = age
+        self.gender = gender
+        self.activity_minutes = activity_minutes
+        self.activity_level = activity_level
+        self.city = city
+        # Смещение часового пояса города от UTC, в секундах
+        self.utc_offset = utc_offset
+        # Норма воды по профилю, без добавок за тренировки
+        self.base_water_goal = base_water_goal
+        self.water_goal = water_goal
+        self.calorie_goal = calorie_goal
+        self.logged_water = logged_water
+        self.logged_calories = logged_calories
+        self.burned_calories = burned_calories
+        # Локальный день, к которому относятся счётчики (0 - не задан)
+        self.day = day
+        # Профиль заполнен полностью и нормы рассчитаны
+        self.profile_ready = profile_ready
+
+    def next_rollover(self) -> float:
+        """
+        Момент (unix) ближайшей локальной полуночи, когда счётчики нужно обнулить.
+        """
+        return (self.day + 1) * SECONDS_PER_DAY - self.utc_offset
+
+    def roll_over(self, now: float) -> Optional[tuple]:
+        """
+        Если локальный день сменился - обнуляет дневные счётчики
+        и возвращает норму воды к базовой.
+
+        Returns:
+            tuple: (day, logged_water, logged_calories, burned_calories, water_goal, calorie_goal)
+                   завершённого дня, если в нём были записи, иначе None.
+        """
+        today = local_day(now, self.utc_offset)
+        if self.day >= today:
+            return None
+        if self.day == 0:
+            # Без города часовой пояс ещё неизвестен - день зафиксирует process_city
+            if self.city:
+                self.day = today
+            return None
+
+        finished = (
+            self.day,
+            self.logged_water,
+            self.logged_calories,
+            self.burned_calories,
+            self.water_goal,
+            self.calorie_goal
+        )
+        self.logged_water = 0
+        self.logged_calories = 0.0
+        self.burned_calories = 0.0
+        self.water_goal = self.base_water_goal
+        self.day = today
+
+        if finished[1] or finished[2] or finished[3]:
+            return finished
+        return None
+
+    def to_row(self) -> tuple:
+        """
+        Значения полей в порядке __slots__ (для записи в базу).
+        """
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    @classmethod
+    def from_row(cls, row) -> "UserProfile":
+        """
+        Создаёт профиль из значений в порядке __slots__.
+        """
+        profile = cls(*row)
+        profile.profile_ready = bool(profile.profile_ready)
+        return profile
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"UserProfile({fields})"
@@ -0,0 +1,360 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from typing import Hashable, Optional
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import TelegramMethod
+
+from config import (
+    OUTBOX_WORKERS,
+    OUTBOX_GLOBAL_RATE,
+    OUTBOX_CHAT_RATE,
+    OUTBOX_GROUP_RATE,
+    OUTBOX_CHAT_BURST,
+    OUTBOX_MAX_RETRIES
+)
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: ответы пользователю раньше массовых рассылок
+INTERACTIVE = 0
+BULK = 1
+
+# Период очистки неактивных чатов, в секундах
+SWEEP_INTERVAL = 60
+
+# Ошибки, после которых отправку имеет смысл повторить
+RETRYABLE_ERRORS = (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError)
+
+outbox_messages = Counter(
+    "bot_outbox_messages_total", "Исходящие запросы к Bot API по результату", ("result",)
+)
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity про запас.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """
+        Через сколько секунд будет доступен токен (0 - уже доступен).
+        """
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> float:
+        """
+        Забирает токен, даже если его ещё нет (уходя в долг).
+
+        Returns:
+            float: Сколько секунд нужно подождать перед отправкой.
+        """
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Outgoing:
+    __slots__ = ("method", "priority", "future", "attempts")
+
+    def __init__(self, method: TelegramMethod, priority: int, future: asyncio.Future):
+        self.method = method
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+
+
+class _Chat:
+    """
+    Очередь отправок одного чата: сообщения чата уходят строго по порядку и по одному.
+    """
+
+    __slots__ = ("queue", "bucket", "busy", "scheduled")
+
+    def __init__(self, bucket: Optional[TokenBucket]):
+        self.queue: deque[_Outgoing] = deque()
+        self.bucket = bucket
+        # Отправляется головной элемент
+        self.busy = False
+        # Чат стоит в куче готовых или отложенных
+        self.scheduled = False
+
+
+class Outbox:
+    """
+    Очередь исходящих запросов к Bot API.
+
+    Хендлеры ставят отправку в очередь (send) и сразу продолжают работу.
+    Диспетчер выбирает чат с самым приоритетным первым сообщением
+    с учётом общего ведра токенов и ведра каждого чата (лимиты Telegram),
+    а отправки выполняются параллельно в пределах workers.
+    На 429 чат ставится на паузу retry_after, на сетевые ошибки и 5xx -
+    повтор с экспоненциальной задержкой со случайным разбросом.
+
+    Args:
+        workers (int): Максимум одновременных запросов.
+        global_rate (float): Общий лимит, сообщений в секунду.
+        chat_rate (float): Лимит на личный чат, сообщений в секунду.
+        group_rate (float): Лимит на групповой чат, сообщений в секунду.
+        chat_burst (float): Сколько сообщений в чат можно отправить подряд.
+        max_retries (int): Максимум повторов одной отправки.
+        base_backoff (float): Начальная задержка повтора, в секундах.
+        max_backoff (float): Максимальная задержка повтора, в секундах.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        global_rate: float,
+        chat_rate: float,
+        group_rate: float,
+        chat_burst: float,
+        max_retries: int,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0
+    ):
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._global = TokenBucket(global_rate, max(1.0, global_rate))
+        self._chats: dict[Hashable, _Chat] = {}
+        self._ready: list[tuple[int, int, Hashable]] = []
+        self._delayed: list[tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._pending = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._swept = time.monotonic()
+
+    def __len__(self) -> int:
+        return self._pending
+
+    def send(self, method: TelegramMethod, priority: int = INTERACTIVE) -> asyncio.Future:
+        """
+        Ставит запрос в очередь и сразу возвращает управление.
+        Метод должен быть привязан к боту (message.reply(...), method.as_(bot)).
+
+        Returns:
+            asyncio.Future: Результат запроса; ждать его не обязательно.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Ошибка уже записана в лог, не ждавший результата вызов её не увидит
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        chat_id = getattr(method, "chat_id", None)
+        # Запросы без чата (ответ на callback) ни с чем не упорядочиваются
+        key: Hashable = chat_id if chat_id is not None else ("no-chat", next(self._seq))
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = _Chat(self._bucket_for(chat_id))
+        chat.queue.append(_Outgoing(method, priority, future))
+        self._pending += 1
+        self._idle.clear()
+        if not chat.busy and not chat.scheduled:
+            self._schedule(key, chat)
+        return future
+
+    def _bucket_for(self, chat_id) -> Optional[TokenBucket]:
+        if chat_id is None:
+            return None
+        # У групп и каналов отрицательный id (или @username канала)
+        group = not isinstance(chat_id, int) or chat_id < 0
+        return TokenBucket(self.group_rate if group else self.chat_rate, self.chat_burst)
+
+    def _schedule(self, key: Hashable, chat: _Chat, not_before: float = 0.0) -> None:
+        chat.scheduled = True
+        if not_before > time.monotonic():
+            heapq.heappush(self._delayed, (not_before, next(self._seq), key))
+        else:
+            heapq.heappush(self._ready, (chat.queue[0].priority, next(self._seq), key))
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        self._slots = asyncio.Semaphore(self.workers)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Ждёт, пока очередь опустеет.
+
+        Returns:
+            bool: True, если всё отправлено до таймаута.
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, timeout: float = 30) -> None:
+        """
+        Дожидается отправки накопленного (не дольше timeout) и останавливает очередь.
+        """
+        if self._dispatcher is None:
+            return
+        if not await self.join(timeout):
+            logger.warning("Не отправлено при остановке: %d", self._pending)
+        for task in (self._dispatcher, *self._tasks):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._dispatcher = None
+
+    async def _dispatch(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, key = heapq.heappop(self._delayed)
+                chat = self._chats[key]
+                heapq.heappush(self._ready, (chat.queue[0].priority, next(self._seq), key))
+
+            if not self._ready:
+                if now - self._swept > SWEEP_INTERVAL:
+                    self._sweep(now)
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, key = heapq.heappop(self._ready)
+            chat = self._chats[key]
+            if chat.bucket is not None:
+                wait = chat.bucket.delay(now)
+                if wait > 0:
+                    heapq.heappush(self._delayed, (now + wait, next(self._seq), key))
+                    continue
+                chat.bucket.take(now)
+
+            wait = self._global.take(now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self._slots.acquire()
+            chat.scheduled = False
+            chat.busy = True
+            task = asyncio.create_task(self._deliver(key, chat))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _sweep(self, now: float) -> None:
+        """
+        Забывает чаты без очереди, у которых ведро уже восстановилось.
+        """
+        self._swept = now
+        idle = [
+            key for key, chat in self._chats.items()
+            if not chat.queue and not chat.busy and (chat.bucket is None or chat.bucket.full(now))
+        ]
+        for key in idle:
+            del self._chats[key]
+
+    def _backoff(self, attempts: int) -> float:
+        # Экспоненциальная задержка, половина которой случайна
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _deliver(self, key: Hashable, chat: _Chat) -> None:
+        item = chat.queue[0]
+        retry_in: Optional[float] = None
+        try:
+            result = await item.method
+        except TelegramRetryAfter as e:
+            item.attempts += 1
+            retry_in = float(e.retry_after)
+            error: Optional[BaseException] = e
+        except RETRYABLE_ERRORS as e:
+            item.attempts += 1
+            retry_in = self._backoff(item.attempts)
+            error = e
+        except Exception as e:
+            error = e
+        else:
+            error = None
+
+        try:
+            if error is None:
+                outbox_messages.labels("sent").inc()
+                self._done(chat, item)
+                if not item.future.done():
+                    item.future.set_result(result)
+            elif retry_in is not None and item.attempts <= self.max_retries:
+                outbox_messages.labels("retried").inc()
+                logger.info(
+                    "Повтор отправки через %.1f с: %r", retry_in, error,
+                    extra={"fields": {"chat_id": getattr(item.method, "chat_id", None), "attempt": item.attempts}}
+                )
+            else:
+                outbox_messages.labels("failed").inc()
+                logger.warning(
+                    "Не удалось отправить %s: %r", type(item.method).__name__, error,
+                    extra={"fields": {"chat_id": getattr(item.method, "chat_id", None), "attempts": item.attempts}}
+                )
+                self._done(chat, item)
+                if not item.future.done():
+                    item.future.set_exception(error)
+                retry_in = None
+        finally:
+            chat.busy = False
+            self._slots.release()
+            if chat.queue:
+                self._schedule(key, chat, time.monotonic() + retry_in if retry_in else 0.0)
+            elif chat.bucket is None or chat.bucket.full(time.monotonic()):
+                # Ведро полное - о чате можно забыть
+                del self._chats[key]
+
+    def _done(self, chat: _Chat, item: _Outgoing) -> None:
+        chat.queue.popleft()
+        self._pending -= 1
+        if not self._pending:
+            self._idle.set()
+
+
+outbox = Outbox(
+    OUTBOX_WORKERS,
+    global_rate=OUTBOX_GLOBAL_RATE,
+    chat_rate=OUTBOX_CHAT_RATE,
+    group_rate=OUTBOX_GROUP_RATE,
+    chat_burst=OUTBOX_CHAT_BURST,
+    max_retries=OUTBOX_MAX_RETRIES
+)
+
+
+def send(method: TelegramMethod, priority: int = INTERACTIVE) -> asyncio.Future:
+    """
+    Отправка без ожидания: send(message.reply("...")).
+    """
+    return outbox.send(method, priority)
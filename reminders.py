@@ -0,0 +1,295 @@
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, NamedTuple, Optional
+
+from aiogram import Bot
+from aiogram.methods import SendMessage
+
+from config import (
+    REMINDERS_DB_PATH,
+    REMINDER_TICK_INTERVAL,
+    REMINDER_RATE,
+    REMINDER_BATCH_SIZE,
+    REMINDER_MAX_PENDING
+)
+from metrics import Counter, Histogram
+from models import SECONDS_PER_DAY
+from outbox import BULK, TokenBucket, outbox
+from storage import UserRepository, users
+
+logger = logging.getLogger(__name__)
+
+# Окно напоминаний по умолчанию (местное время, минуты от полуночи) и минимальный интервал
+DEFAULT_WINDOW = (9 * 60, 21 * 60)
+MIN_INTERVAL = 30
+
+reminder_lag = Histogram(
+    "bot_reminder_lag_seconds", "Задержка отправки напоминания относительно срока",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+)
+reminder_batch = Histogram(
+    "bot_reminder_batch_size", "Напоминаний, обработанных за один тик",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+reminders_total = Counter(
+    "bot_reminders_total", "Напоминания о воде по результату", ("result",)
+)
+
+
+class Reminder(NamedTuple):
+    # Интервал, начало и конец окна - в минутах, смещение пояса - в секундах
+    interval: int
+    start: int
+    end: int
+    utc_offset: int
+
+
+def next_due(now: float, reminder: Reminder) -> float:
+    """
+    Ближайший срок напоминания после now: start, start + interval, ...
+    не позже end по местному времени, затем - начало окна следующего дня.
+    """
+    local = now + reminder.utc_offset
+    day_start = local - local % SECONDS_PER_DAY
+    minute = (local - day_start) / 60
+    if minute < reminder.start:
+        slot = reminder.start
+    else:
+        slot = reminder.start + (int((minute - reminder.start) // reminder.interval) + 1) * reminder.interval
+    if slot > reminder.end:
+        day_start += SECONDS_PER_DAY
+        slot = reminder.start
+    return day_start + slot * 60 - reminder.utc_offset
+
+
+class ReminderScheduler:
+    """
+    Напоминания выпить воды - один планировщик на все расписания.
+
+    Сроки лежат в min-куче (срок, user_id); тик забирает наступившие
+    пачками: не быстрее rate в секунду и не больше batch_size за тик, а при
+    очереди исходящих больше max_pending ждёт, пока она разойдётся.
+    Пользователи, уже выпившие норму, пропускаются. Расписания хранятся
+    в SQLite, сроки при старте вычисляются заново (пропущенные за время
+    простоя напоминания не отправляются).
+
+    Args:
+        path (str): Путь к файлу SQLite.
+        repository (UserRepository): Хранилище пользователей.
+        tick_interval (float): Период проверки кучи, в секундах.
+        rate (float): Лимит напоминаний в секунду.
+        batch_size (int): Максимум напоминаний за тик.
+        max_pending (int): Предел очереди исходящих сообщений.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        repository: UserRepository,
+        tick_interval: float = 1,
+        rate: float = 25,
+        batch_size: int = 500,
+        max_pending: int = 1000
+    ):
+        self.path = path
+        self.repository = repository
+        self.tick_interval = tick_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._bucket = TokenBucket(rate, batch_size)
+        self._heap: list[tuple[float, int]] = []
+        # Актуальный срок и расписание по пользователю (устаревшие записи кучи пропускаются)
+        self._due: dict[int, float] = {}
+        self._reminders: dict[int, Reminder] = {}
+        # Предикат шардирования: только свои пользователи (см. sharding.py)
+        self.owns: Optional[Callable[[int], bool]] = None
+        self._bot: Optional[Bot] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+
+    def __len__(self) -> int:
+        return len(self._reminders)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> list[tuple]:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reminders ("
+            "user_id INTEGER PRIMARY KEY, "
+            "interval INTEGER NOT NULL, "
+            "start INTEGER NOT NULL, "
+            "end INTEGER NOT NULL, "
+            "utc_offset INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        return self._conn.execute(
+            "SELECT user_id, interval, start, end, utc_offset FROM reminders"
+        ).fetchall()
+
+    def _save(self, user_id: int, reminder: Optional[Reminder]) -> None:
+        with self._conn:
+            if reminder is None:
+                self._conn.execute("DELETE FROM reminders WHERE user_id = ?", (user_id,))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO reminders (user_id, interval, start, end, utc_offset) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (user_id, *reminder)
+                )
+
+    async def start(self, bot: Bot) -> None:
+        """
+        Загружает расписания своих пользователей и запускает тики.
+        """
+        self._bot = bot
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reminders-db")
+        rows = await self._run(self._connect)
+        self.load(rows, time.time())
+        logger.info("Напоминания о воде: %d расписаний", len(self._reminders))
+        self._task = asyncio.create_task(self._loop())
+
+    def load(self, rows, now: float) -> None:
+        """
+        Заполняет кучу расписаниями (user_id, interval, start, end, utc_offset).
+        """
+        owns = self.owns
+        # Одинаковые расписания - один объект: их немного разных на сотни тысяч пользователей
+        shared: dict[tuple, Reminder] = {}
+        for user_id, *fields in rows:
+            if owns is not None and not owns(user_id):
+                continue
+            fields = tuple(fields)
+            reminder = shared.get(fields)
+            if reminder is None:
+                reminder = shared[fields] = Reminder(*fields)
+            self._reminders[user_id] = reminder
+            self._due[user_id] = due = next_due(now, reminder)
+            self._heap.append((due, user_id))
+        heapq.heapify(self._heap)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get(self, user_id: int) -> Optional[Reminder]:
+        return self._reminders.get(user_id)
+
+    async def set(self, user_id: int, reminder: Optional[Reminder]) -> Optional[float]:
+        """
+        Включает (или меняет) напоминания пользователя; None - выключает.
+
+        Returns:
+            float: Срок ближайшего напоминания (unix) или None.
+        """
+        # Память меняется до записи в базу: идущая отправка (_remind) увидит
+        # смену расписания, а её запись в базу встанет в очередь раньше этой
+        if reminder is None:
+            self._reminders.pop(user_id, None)
+            self._due.pop(user_id, None)
+            due = None
+        else:
+            self._reminders[user_id] = reminder
+            due = self._schedule(user_id, next_due(time.time(), reminder))
+        await self._run(self._save, user_id, reminder)
+        return due
+
+    def _schedule(self, user_id: int, due: float) -> float:
+        self._due[user_id] = due
+        heapq.heappush(self._heap, (due, user_id))
+        return due
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """
+        Обрабатывает наступившие напоминания в пределах лимита.
+
+        Returns:
+            int: Количество обработанных напоминаний.
+        """
+        now = time.time() if now is None else now
+        processed = 0
+        clock = time.monotonic()
+        while self._heap and self._heap[0][0] <= now and processed < self.batch_size:
+            if len(outbox) >= self.max_pending or self._bucket.delay(clock) > 0:
+                break
+            due, user_id = heapq.heappop(self._heap)
+            if self._due.get(user_id) != due:
+                continue
+            self._bucket.take(clock)
+            processed += 1
+            reminder_lag.labels().observe(now - due)
+            await self._remind(user_id, now)
+        if processed:
+            reminder_batch.labels().observe(processed)
+        return processed
+
+    async def _remind(self, user_id: int, now: float) -> None:
+        reminder = self._reminders.get(user_id)
+        if reminder is None:
+            return
+        user = await self.repository.get(user_id)
+        if self._reminders.get(user_id) is not reminder:
+            # Пока читали профиль, напоминания выключили или изменили (set)
+            return
+        if user is None or not user.profile_ready:
+            reminders_total.labels("no_profile").inc()
+        elif user.logged_water >= user.water_goal:
+            reminders_total.labels("goal_met").inc()
+        else:
+            reminders_total.labels("sent").inc()
+            self.sent += 1
+            # Метод, а не корутина: очередь повторяет его после 429/5xx и берёт из него chat_id
+            outbox.send(SendMessage(
+                chat_id=user_id,
+                text=f"💧 Пора выпить воды! Выпито {user.logged_water} из {user.water_goal} мл."
+            ).as_(self._bot), BULK)
+        if user is not None and user.utc_offset != reminder.utc_offset:
+            # Пользователь сменил город - сроки по новому часовому поясу
+            reminder = reminder._replace(utc_offset=user.utc_offset)
+            self._reminders[user_id] = reminder
+            await self._run(self._save, user_id, reminder)
+            if self._reminders.get(user_id) is not reminder:
+                return
+        self._schedule(user_id, next_due(now, reminder))
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                while await self.run_due():
+                    # Очередь не разобрана - следующая пачка без ожидания тика
+                    await asyncio.sleep(0)
+            except Exception:
+                logger.exception("Ошибка при отправке напоминаний")
+
+
+reminder_scheduler = ReminderScheduler(
+    REMINDERS_DB_PATH,
+    users,
+    tick_interval=REMINDER_TICK_INTERVAL,
+    rate=REMINDER_RATE,
+    batch_size=REMINDER_BATCH_SIZE,
+    max_pending=REMINDER_MAX_PENDING
+)
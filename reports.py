@@ -0,0 +1,150 @@
+import asyncio
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Hashable, Optional
+
+from cache import TTLCache
+from config import REPORT_WORKERS, REPORT_CACHE_SIZE
+from events import event_log, WATER, FOOD, WORKOUT
+from models import UserProfile, SECONDS_PER_DAY, local_day
+
+# Периоды отчёта, в днях
+REPORT_PERIODS = (7, 30)
+
+# Версия кэшированного графика меняется вместе с данными, так что TTL - только страховка
+REPORT_CACHE_TTL = SECONDS_PER_DAY
+
+
+def _init_worker() -> None:
+    # matplotlib импортируется один раз на процесс пула, а не на каждый отчёт
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+
+
+def render_report(
+    labels: list[str],
+    water: list[float],
+    eaten: list[float],
+    burned: list[float],
+    water_goal: float,
+    calorie_goal: float
+) -> bytes:
+    """
+    Рисует PNG с графиками воды и калорий по дням относительно норм.
+    Выполняется в процессе пула.
+
+    Args:
+        labels (list[str]): Подписи дней.
+        water (list[float]): Выпито воды по дням, мл.
+        eaten (list[float]): Потреблено калорий по дням, ккал.
+        burned (list[float]): Сожжено калорий по дням, ккал.
+        water_goal (float): Норма воды, мл.
+        calorie_goal (float): Норма калорий, ккал.
+
+    Returns:
+        bytes: Изображение PNG.
+    """
+    import matplotlib.pyplot as plt
+
+    positions = range(len(labels))
+    fig, (water_ax, calories_ax) = plt.subplots(2, 1, figsize=(10, 7), sharex=True)
+    try:
+        water_ax.bar(positions, water, color="#4a90d9", label="Выпито")
+        water_ax.axhline(water_goal, color="#1f4e79", linestyle="--", label="Норма")
+        water_ax.set_ylabel("мл")
+        water_ax.set_title(f"Вода за {len(labels)} дн.")
+        water_ax.legend(loc="upper left", bbox_to_anchor=(1.01, 1))
+
+        width = 0.4
+        calories_ax.bar([p - width / 2 for p in positions], eaten, width, color="#7cb342", label="Потреблено")
+        calories_ax.bar([p + width / 2 for p in positions], burned, width, color="#f4511e", label="Сожжено")
+        calories_ax.axhline(calorie_goal, color="#33691e", linestyle="--", label="Норма")
+        calories_ax.set_ylabel("ккал")
+        calories_ax.set_title("Калории")
+        calories_ax.legend(loc="upper left", bbox_to_anchor=(1.01, 1))
+
+        # Для 30 дней подписываем каждый третий день
+        step = 1 if len(labels) <= 10 else 3
+        calories_ax.set_xticks(list(positions)[::step])
+        calories_ax.set_xticklabels(labels[::step], rotation=45)
+
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=100)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class ReportRenderer:
+    """
+    Графики прогресса за период. Рисование (CPU) выполняется в пуле процессов,
+    чтобы не блокировать цикл событий. Готовые PNG кэшируются по
+    (пользователь, период, версия данных) с LRU-вытеснением, одновременные
+    запросы одного отчёта ждут одну отрисовку.
+
+    Args:
+        workers (int): Число процессов пула.
+        cache_size (int): Сколько готовых графиков хранить.
+    """
+
+    def __init__(self, workers: int, cache_size: int):
+        self.workers = workers
+        self.cache = TTLCache(maxsize=cache_size, ttl=REPORT_CACHE_TTL)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def start(self) -> None:
+        # spawn: в процессе бота работают потоки (логи, SQLite), fork их не переносит
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    async def stop(self) -> None:
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.shutdown, True, cancel_futures=True)
+            self._pool = None
+
+    async def render(self, user_id: int, user: UserProfile, days: int) -> Optional[bytes]:
+        """
+        График пользователя за последние days дней.
+
+        Returns:
+            bytes: PNG или None, если за период нет записей.
+        """
+        # Дни считаются по часовому поясу пользователя
+        first_day = local_day(time.time(), user.utc_offset) - (days - 1)
+        since = first_day * SECONDS_PER_DAY - user.utc_offset
+        events = event_log.query(user_id, since=since)
+        if not events:
+            return None
+
+        # Новые события, смена дня или норм дают новую версию отчёта
+        version = (first_day, len(events), events[-1].ts, user.water_goal, user.calorie_goal)
+        key: Hashable = (user_id, days, version)
+        return await self.cache.get_or_load(
+            key, lambda: self._render(events, first_day, days, user)
+        )
+
+    async def _render(self, events, first_day: int, days: int, user: UserProfile) -> bytes:
+        totals = {kind: [0.0] * days for kind in (WATER, FOOD, WORKOUT)}
+        for event in events:
+            index = local_day(event.ts, user.utc_offset) - first_day
+            if 0 <= index < days:
+                totals[event.kind][index] += event.amount
+        labels = [
+            time.strftime("%d.%m", time.gmtime((first_day + i) * SECONDS_PER_DAY))
+            for i in range(days)
+        ]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, render_report,
+            labels, totals[WATER], totals[FOOD], totals[WORKOUT], user.water_goal, user.calorie_goal
+        )
+
+
+report_renderer = ReportRenderer(REPORT_WORKERS, REPORT_CACHE_SIZE)
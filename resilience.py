@@ -0,0 +1,257 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from config import (
+    UPSTREAM_TIMEOUT,
+    BREAKER_FAILURES,
+    BREAKER_RESET,
+    HEDGE_UPSTREAMS,
+    HEDGE_MIN_DELAY
+)
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних задержек хранить для оценки p95 и сколько нужно для первой оценки
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+# Момент (time.monotonic()), к которому должна закончиться обработка текущего сообщения
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+upstream_fallbacks = Counter(
+    "bot_upstream_fallbacks_total", "Ответы-заглушки вместо ответа внешнего API", ("upstream", "reason")
+)
+upstream_hedges = Counter(
+    "bot_upstream_hedged_total", "Дублирующие запросы к внешнему API", ("upstream",)
+)
+breaker_transitions = Counter(
+    "bot_circuit_breaker_transitions_total", "Переключения автоматов отключения", ("upstream", "state")
+)
+
+
+class UpstreamError(Exception):
+    """
+    Внешний API ответил ошибкой на своей стороне (5xx, 429) - ответ не годится,
+    а сбой засчитывается автомату отключения.
+    """
+
+
+@contextmanager
+def deadline(budget: float) -> Iterator[None]:
+    """
+    Ограничивает время обработки в текущем контексте: все вызовы Upstream.call
+    внутри укладываются в budget секунд. Вложенный бюджет не продлевает внешний.
+    """
+    until = time.monotonic() + budget
+    current = _deadline.get()
+    if current is not None:
+        until = min(until, current)
+    token = _deadline.set(until)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """
+    Сколько секунд осталось до конца бюджета (None - бюджета нет).
+    """
+    until = _deadline.get()
+    return None if until is None else until - time.monotonic()
+
+
+class CircuitBreaker:
+    """
+    Автомат отключения: после failures ошибок подряд запросы не выполняются
+    reset_timeout секунд (open), затем пропускается один пробный (half-open).
+    Успех пробного закрывает автомат, ошибка - снова открывает.
+
+    Args:
+        name (str): Название API для метрик и логов.
+        failures (int): Сколько ошибок подряд открывают автомат.
+        reset_timeout (float): Время до пробного запроса, в секундах.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failures: int, reset_timeout: float):
+        self.name = name
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._errors = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def _switch(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            breaker_transitions.labels(self.name, state).inc()
+            logger.warning("Автомат %s: %s", self.name, state, extra={"fields": {"upstream": self.name}})
+
+    def allow(self) -> bool:
+        """
+        Можно ли выполнить запрос. В half-open пропускает только один пробный.
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._switch(self.HALF_OPEN)
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def success(self) -> None:
+        self._errors = 0
+        self._probing = False
+        self._switch(self.CLOSED)
+
+    def failure(self) -> None:
+        self._probing = False
+        self._errors += 1
+        if self.state == self.HALF_OPEN or self._errors >= self.failures:
+            self._opened_at = time.monotonic()
+            self._switch(self.OPEN)
+
+    def release(self) -> None:
+        """
+        Запрос отменён без результата - пробный можно выполнить снова.
+        """
+        self._probing = False
+
+
+class Upstream:
+    """
+    Обёртка вызовов одного внешнего API: автомат отключения, предельное
+    время из бюджета сообщения и (по желанию) дублирующий запрос после p95
+    задержки - отвечает тот, кто успеет первым.
+    При открытом автомате, таймауте или ошибке сразу возвращается fallback.
+
+    Args:
+        name (str): Название API.
+        timeout (float): Предельное время вызова, если бюджета нет или он больше.
+        hedge (bool): Отправлять ли дублирующий запрос (только для идемпотентных).
+        breaker (CircuitBreaker): Автомат отключения.
+    """
+
+    def __init__(self, name: str, timeout: float, hedge: bool, breaker: CircuitBreaker):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.breaker = breaker
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        # Вызовы и ответы-заглушки - для доли отказов в /stats
+        self.calls = 0
+        self.fallbacks = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Через сколько секунд отправлять дублирующий запрос (None - не отправлять).
+        """
+        if not self.hedge or len(self._latencies) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return max(HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95)])
+
+    async def call(self, fetch: Callable[[], Awaitable[Any]], fallback: Any) -> Any:
+        """
+        Выполняет fetch() с защитой.
+
+        Args:
+            fetch: Корутина-функция запроса; при сбое API поднимает исключение.
+            fallback: Значение на случай отказа.
+
+        Returns:
+            Результат fetch() или fallback.
+        """
+        self.calls += 1
+        # Таймаут вызова - тоже бюджет: по нему замер отличит отмену по времени от прочих
+        with deadline(self.timeout):
+            timeout = remaining()
+            if timeout <= 0:
+                return self._fallback("deadline", fallback)
+            if not self.breaker.allow():
+                return self._fallback("open", fallback)
+
+            try:
+                result = await asyncio.wait_for(self._attempts(fetch), timeout)
+            except asyncio.TimeoutError:
+                reason = "timeout"
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                reason = "error"
+                logger.warning("Ошибка запроса к %s: %r", self.name, e, extra={"fields": {"upstream": self.name}})
+            else:
+                self.breaker.success()
+                return result
+        self.breaker.failure()
+        return self._fallback(reason, fallback)
+
+    def _fallback(self, reason: str, fallback: Any) -> Any:
+        self.fallbacks += 1
+        upstream_fallbacks.labels(self.name, reason).inc()
+        return fallback
+
+    async def _timed(self, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.perf_counter()
+        result = await fetch()
+        self._latencies.append(time.perf_counter() - started)
+        return result
+
+    async def _attempts(self, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._timed(fetch)
+
+        first = asyncio.ensure_future(self._timed(fetch))
+        second: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+            upstream_hedges.labels(self.name).inc()
+            second = asyncio.ensure_future(self._timed(fetch))
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+            raise error
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
+def _upstream(name: str) -> Upstream:
+    hedged = {item.strip() for item in HEDGE_UPSTREAMS.split(",")}
+    return Upstream(
+        name,
+        timeout=UPSTREAM_TIMEOUT,
+        hedge=name in hedged,
+        breaker=CircuitBreaker(name, BREAKER_FAILURES, BREAKER_RESET)
+    )
+
+
+weather_upstream = _upstream("openweathermap")
+food_upstream = _upstream("openfoodfacts")
+ninjas_upstream = _upstream("api_ninjas")
+translate_upstream = _upstream("google_translate")
+UPSTREAMS = (weather_upstream, food_upstream, ninjas_upstream, translate_upstream)
@@ -0,0 +1,103 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Optional
+
+from config import ROLLOVER_TICK_INTERVAL
+from models import UserProfile, SECONDS_PER_DAY
+from storage import UserRepository, users
+
+logger = logging.getLogger(__name__)
+
+
+class RolloverScheduler:
+    """
+    Ежедневное обнуление счётчиков в локальную полночь каждого пользователя.
+
+    В min-куче лежат (время полуночи, user_id) только для пользователей
+    с ненулевыми счётчиками, поэтому тик обрабатывает лишь тех, чья полночь
+    уже наступила, а не перебирает всех. Сам переход дня выполняет
+    хранилище при чтении записи (см. UserRepository.get).
+
+    Args:
+        repository (UserRepository): Хранилище пользователей.
+        tick_interval (float): Период проверки кучи, в секундах.
+        batch_size (int): Сколько пользователей обрабатывать без передачи управления циклу.
+    """
+
+    def __init__(self, repository: UserRepository, tick_interval: float = 30, batch_size: int = 1000):
+        self.repository = repository
+        self.tick_interval = tick_interval
+        self.batch_size = batch_size
+        self._heap: list[tuple[float, int]] = []
+        # Актуальное время полуночи по пользователю (устаревшие записи кучи пропускаются)
+        self._due: dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.rolled = 0
+
+    def schedule(self, user_id: int, profile: UserProfile) -> None:
+        """
+        Ставит пользователя в очередь на ближайшую полночь (повторный вызов в тот же день ничего не делает).
+        """
+        self._schedule(user_id, profile.next_rollover())
+
+    def _schedule(self, user_id: int, due: float) -> None:
+        if self._due.get(user_id) == due:
+            return
+        self._due[user_id] = due
+        heapq.heappush(self._heap, (due, user_id))
+
+    async def start(self) -> None:
+        """
+        Ставит в очередь всех пользователей со счётчиками и запускает тики.
+        Пропущенные за время простоя дни хранилище закрывает при открытии.
+        """
+        for user_id, utc_offset, day in await self.repository.active_users():
+            self._schedule(user_id, (day + 1) * SECONDS_PER_DAY - utc_offset)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """
+        Закрывает день у всех пользователей, чья полночь уже наступила.
+
+        Returns:
+            int: Количество обработанных пользователей.
+        """
+        now = time.time() if now is None else now
+        processed = 0
+        while self._heap and self._heap[0][0] <= now:
+            due, user_id = heapq.heappop(self._heap)
+            if self._due.get(user_id) != due:
+                continue
+            del self._due[user_id]
+            # Чтение записи закрывает день и сохраняет её
+            await self.repository.get(user_id)
+            processed += 1
+            if processed % self.batch_size == 0:
+                await asyncio.sleep(0)
+        self.rolled += processed
+        return processed
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.run_due()
+            except Exception:
+                logger.exception("Ошибка при смене дня")
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+
+rollover_scheduler = RolloverScheduler(users, ROLLOVER_TICK_INTERVAL)
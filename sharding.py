@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import zlib
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+
+from config import (
+    BOT_MODE,
+    FSM_DB_PATH,
+    EVENTS_DIR,
+    LOOKUP_CACHE_PATH,
+    ACTIVITIES_LEARNED_PATH,
+    WORKER_STATS_INTERVAL
+)
+from logs import setup_logging, stop_logging
+from webhook import run_webhook
+
+logger = logging.getLogger(__name__)
+
+# Максимум обновлений в очереди одного воркера (дальше - обратное давление)
+WORKER_QUEUE_SIZE = 10000
+# Long polling таймаут для getUpdates, в секундах
+POLLING_TIMEOUT = 30
+
+
+def extract_user_id(update: dict) -> int:
+    """
+    Возвращает id пользователя (или чата) из сырого обновления Telegram.
+    """
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+        chat = value.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return 0
+
+
+def shard_for_user(user_id: int, workers: int) -> int:
+    """
+    Номер воркера для пользователя.
+    """
+    return zlib.crc32(str(user_id).encode()) % workers
+
+
+def shard_for(update: dict, workers: int) -> int:
+    """
+    Номер воркера для обновления: все обновления пользователя
+    попадают в один процесс, поэтому его FSM и счётчики не делятся между процессами.
+    """
+    return shard_for_user(extract_user_id(update), workers)
+
+
+def worker_fsm_path(index: int) -> str:
+    """
+    Отдельный файл FSM на воркер: при старте воркер загружает только свои диалоги.
+    """
+    root, ext = os.path.splitext(FSM_DB_PATH)
+    return f"{root}.w{index}{ext}"
+
+
+def worker_lookup_cache_path(index: int) -> str:
+    """
+    Отдельный снимок кэша внешних API на воркер: снимки воркеров не затирают друг друга.
+    """
+    root, ext = os.path.splitext(LOOKUP_CACHE_PATH)
+    return f"{root}.w{index}{ext}"
+
+
+def worker_activities_learned_path(index: int) -> str:
+    """
+    Отдельный файл выученных активностей на воркер; общий файл служит основой.
+    """
+    root, ext = os.path.splitext(ACTIVITIES_LEARNED_PATH)
+    return f"{root}.w{index}{ext}"
+
+
+def worker_events_dir(index: int) -> str:
+    """
+    Отдельный каталог журнала событий на воркер (журнал пишет один процесс).
+    """
+    return os.path.join(EVENTS_DIR, f"w{index}")
+
+
+def worker_main(index: int, workers: int, updates: multiprocessing.Queue, stats: multiprocessing.Queue) -> None:
+    """
+    Точка входа процесса-воркера.
+    """
+    # Остановку воркеров выполняет супервизор через очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging()
+    try:
+        asyncio.run(_worker(index, workers, updates, stats))
+    finally:
+        stop_logging()
+
+
+async def _worker(index: int, workers: int, updates: multiprocessing.Queue, stats: multiprocessing.Queue) -> None:
+    # В процессе воркера бот, диспетчер и хранилища создаются заново
+    import bot as app
+    from utils import activity_table
+
+    app.fsm_storage.path = worker_fsm_path(index)
+    app.event_log.directory = worker_events_dir(index)
+    app.lookup_cache.path = worker_lookup_cache_path(index)
+    activity_table.use_learned_path(worker_activities_learned_path(index))
+    # Фоновые задачи по пользователям (смена дня) - только для своих
+    app.users.owns = lambda user_id: shard_for_user(user_id, workers) == index
+    app.reminder_scheduler.owns = app.users.owns
+    # Выгрузка всех пользователей читает и журналы остальных воркеров
+    app.exporter.peer_directories = [worker_events_dir(i) for i in range(workers) if i != index]
+    # Свой порт /metrics у каждого воркера
+    if app.metrics_server.port:
+        app.metrics_server.port += 1 + index
+    bot = app.create_bot()
+    dp = app.create_dispatcher()
+    await app.startup(bot)
+
+    loop = asyncio.get_running_loop()
+    parent_pid = os.getppid()
+    pending: set[asyncio.Task] = set()
+    processed = 0
+
+    async def process(update: dict) -> None:
+        nonlocal processed
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logger.exception(
+                "Ошибка при обработке обновления",
+                extra={"fields": {"worker": index, "update_id": update.get("update_id")}}
+            )
+        finally:
+            processed += 1
+
+    async def report() -> None:
+        reported = 0
+        started = time.monotonic()
+        while True:
+            await asyncio.sleep(WORKER_STATS_INTERVAL)
+            now = time.monotonic()
+            stats.put((index, os.getpid(), processed - reported, now - started))
+            reported, started = processed, now
+
+    reporter = asyncio.create_task(report())
+    try:
+        while True:
+            try:
+                update = await loop.run_in_executor(None, updates.get, True, 1.0)
+            except queue.Empty:
+                # Супервизор завершился, не остановив воркер
+                if os.getppid() != parent_pid:
+                    break
+                continue
+            if update is None:
+                break
+            task = asyncio.create_task(process(update))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    finally:
+        reporter.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        await app.shutdown(bot)
+
+
+class Supervisor:
+    """
+    Запускает N процессов-воркеров, распределяет по ним обновления
+    по хэшу user_id, перезапускает упавшие воркеры и собирает статистику.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queues = [self._ctx.Queue(maxsize=WORKER_QUEUE_SIZE) for _ in range(workers)]
+        self._stats = self._ctx.Queue()
+        self._procs: list[Optional[multiprocessing.Process]] = [None] * workers
+        self._stopping = False
+        self.routed = [0] * workers
+        self.restarts = [0] * workers
+
+    def _start_worker(self, index: int) -> None:
+        proc = self._ctx.Process(
+            target=worker_main,
+            args=(index, self.workers, self._queues[index], self._stats),
+            name=f"bot-worker-{index}",
+            daemon=False
+        )
+        proc.start()
+        self._procs[index] = proc
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._start_worker(index)
+
+    async def route(self, update: dict) -> None:
+        """
+        Отправляет сырое обновление воркеру, отвечающему за пользователя.
+        """
+        index = shard_for(update, self.workers)
+        try:
+            self._queues[index].put_nowait(update)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self._queues[index].put, update)
+        self.routed[index] += 1
+
+    async def monitor(self, interval: float = 1.0) -> None:
+        """
+        Перезапускает упавшие воркеры. Необработанные обновления остаются в их очередях.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for index, proc in enumerate(self._procs):
+                if self._stopping or proc is None or proc.is_alive():
+                    continue
+                self.restarts[index] += 1
+                logger.warning("Воркер %d (pid %s) завершился с кодом %s, перезапуск", index, proc.pid, proc.exitcode)
+                self._start_worker(index)
+
+    async def report(self) -> None:
+        """
+        Печатает пропускную способность каждого воркера по мере поступления статистики.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                index, pid, processed, elapsed = await loop.run_in_executor(None, self._stats.get, True, 1.0)
+            except queue.Empty:
+                continue
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            logger.info("Статистика воркера", extra={"fields": {
+                "worker": index,
+                "worker_pid": pid,
+                "updates_per_sec": round(rate, 1),
+                "routed": self.routed[index],
+                "restarts": self.restarts[index]
+            }})
+
+    async def stop(self, timeout: float = 30) -> None:
+        """
+        Останавливает воркеры: они дообрабатывают очередь и сохраняют данные.
+        """
+        self._stopping = True
+        loop = asyncio.get_running_loop()
+        for q in self._queues:
+            await loop.run_in_executor(None, q.put, None)
+        for proc in self._procs:
+            if proc is None:
+                continue
+            await loop.run_in_executor(None, proc.join, timeout)
+            if proc.is_alive():
+                proc.terminate()
+
+
+async def _poll(bot: Bot, dp: Dispatcher, supervisor: Supervisor) -> None:
+    """
+    Получает обновления через getUpdates и передаёт их супервизору.
+    """
+    offset = None
+    allowed_updates = dp.resolve_used_update_types()
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=POLLING_TIMEOUT,
+                allowed_updates=allowed_updates
+            )
+        except Exception as e:
+            logger.warning("Ошибка при получении обновлений: %r", e)
+            await asyncio.sleep(5)
+            continue
+        for update in updates:
+            await supervisor.route(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+            offset = update.update_id + 1
+
+
+async def run_supervisor(bot: Bot, dp: Dispatcher, workers: int) -> None:
+    """
+    Режим супервизора: этот процесс только принимает обновления
+    (polling или вебхук) и распределяет их по воркерам.
+    """
+    supervisor = Supervisor(workers)
+    supervisor.start()
+    background = [
+        asyncio.create_task(supervisor.monitor()),
+        asyncio.create_task(supervisor.report())
+    ]
+    logger.info("Бот запущен! Воркеров: %d", workers)
+
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot, feed=supervisor.route)
+        else:
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, stop.set)
+                except NotImplementedError:
+                    pass
+            polling = asyncio.create_task(_poll(bot, dp, supervisor))
+            await stop.wait()
+            polling.cancel()
+    finally:
+        for task in background:
+            task.cancel()
+        await supervisor.stop()
+        await bot.session.close()
@@ -0,0 +1,208 @@
+"""
+Оперативная статистика бота для администраторов (/stats).
+
+Агрегаты обновляются при записи (вода, еда, тренировки, заполнение
+профиля), а не пересчитываются обходом пользователей, поэтому /stats
+отвечает за время, не зависящее от их числа:
+
+- итоги текущего дня (по DEFAULT_UTC_OFFSET) - суммы и число записей;
+- активные за день пользователи - HyperLogLog (4 КБ, погрешность ~1.6%);
+- частые продукты и активности - Space-Saving с ограниченным числом счётчиков.
+
+Статистика - в памяти процесса: при WORKERS > 1 у каждого воркера своя.
+"""
+import heapq
+import math
+import time
+from typing import Hashable, Optional
+
+from config import DEFAULT_UTC_OFFSET, STATS_TOP_CAPACITY
+from lookup_cache import normalize_key
+from models import local_day
+from translate import ACTIVITY, FOOD, translate_offline
+
+# Точность HyperLogLog: 2 ** 12 регистров
+HLL_PRECISION = 12
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(value: int) -> int:
+    # Перемешивание splitmix64: последовательные user_id дают независимые на вид хэши
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class HyperLogLog:
+    """
+    Оценка числа различных целых (user_id) в фиксированной памяти:
+    2 ** precision однобайтовых регистров, стандартная ошибка 1.04 / sqrt(2 ** precision).
+
+    Args:
+        precision (int): Число бит хэша на номер регистра (4..16).
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self._alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add(self, value: int) -> None:
+        hashed = _mix64(value)
+        index = hashed >> (64 - self.precision)
+        rest = (hashed << self.precision) & _MASK64
+        # Позиция первой единицы в оставшихся битах
+        rank = 64 - self.precision + 1 if rest == 0 else 64 - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        """
+        Оценка числа различных значений.
+        """
+        total = 0.0
+        zeros = 0
+        for register in self.registers:
+            total += 2.0 ** -register
+            zeros += register == 0
+        estimate = self._alpha * self.size * self.size / total
+        # На малых количествах точнее линейный подсчёт по пустым регистрам
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def clear(self) -> None:
+        self.registers = bytearray(self.size)
+
+
+class SpaceSaving:
+    """
+    Частые элементы потока (алгоритм Space-Saving) в capacity счётчиках.
+
+    Новый элемент при заполненном наборе вытесняет элемент с наименьшим
+    счётом и наследует этот счёт как возможную ошибку. Любой элемент,
+    встречавшийся чаще total / capacity раз, гарантированно в наборе,
+    а его счёт завышен не больше чем на ошибку.
+
+    Args:
+        capacity (int): Максимум отслеживаемых элементов.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.total = 0
+        # Элемент -> (счёт, ошибка)
+        self._counts: dict[Hashable, tuple[float, float]] = {}
+        # Min-куча (счёт, элемент): по одной записи на элемент, счёт может отставать
+        self._heap: list[tuple[float, Hashable]] = []
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, item: Hashable, weight: float = 1) -> None:
+        self.total += weight
+        entry = self._counts.get(item)
+        if entry is not None:
+            self._counts[item] = (entry[0] + weight, entry[1])
+            return
+        if len(self._counts) < self.capacity:
+            self._counts[item] = (weight, 0)
+            heapq.heappush(self._heap, (weight, item))
+            return
+        # Вытесняем минимальный; устаревшие записи кучи обновляются по пути
+        while True:
+            count, victim = self._heap[0]
+            current = self._counts[victim][0]
+            if current == count:
+                break
+            heapq.heapreplace(self._heap, (current, victim))
+        del self._counts[victim]
+        self._counts[item] = (count + weight, count)
+        heapq.heapreplace(self._heap, (count + weight, item))
+
+    def top(self, k: int) -> list[tuple[Hashable, float, float]]:
+        """
+        k элементов с наибольшим счётом: (элемент, счёт, ошибка).
+        """
+        return [
+            (item, count, error)
+            for item, (count, error) in heapq.nlargest(k, self._counts.items(), key=lambda kv: kv[1][0])
+        ]
+
+
+class BotStats:
+    """
+    Агрегаты для /stats, обновляемые хендлерами при записи.
+
+    Args:
+        top_capacity (int): Счётчиков в Space-Saving продуктов и активностей.
+        utc_offset (int): Часовой пояс, по которому считается «сегодня», в секундах.
+    """
+
+    def __init__(self, top_capacity: int, utc_offset: int):
+        self.utc_offset = utc_offset
+        self.foods = SpaceSaving(top_capacity)
+        self.activities = SpaceSaving(top_capacity)
+        self.active = HyperLogLog()
+        self.day = 0
+        self.water = 0
+        self.eaten = 0.0
+        self.burned = 0.0
+        # Записи за день по типу и новые профили
+        self.entries = {"water": 0, "food": 0, "workout": 0, "profile": 0}
+        self.started = time.time()
+
+    def _touch(self, user_id: int, kind: str) -> None:
+        day = local_day(time.time(), self.utc_offset)
+        if day != self.day:
+            self.day = day
+            self.active.clear()
+            self.water = 0
+            self.eaten = 0.0
+            self.burned = 0.0
+            self.entries = dict.fromkeys(self.entries, 0)
+        self.active.add(user_id)
+        self.entries[kind] += 1
+
+    def record_water(self, user_id: int, amount: int) -> None:
+        self._touch(user_id, "water")
+        self.water += amount
+
+    def record_food(self, user_id: int, name: str, calories: float) -> None:
+        self._touch(user_id, "food")
+        self.eaten += calories
+        self.foods.add(_term(name, FOOD))
+
+    def record_workout(self, user_id: int, activity: str, calories: float) -> None:
+        self._touch(user_id, "workout")
+        self.burned += calories
+        self.activities.add(_term(activity, ACTIVITY))
+
+    def record_profile(self, user_id: int) -> None:
+        self._touch(user_id, "profile")
+
+    def today(self, now: Optional[float] = None) -> dict:
+        """
+        Итоги текущего дня (нули, если сегодня записей ещё не было).
+        """
+        now = time.time() if now is None else now
+        if local_day(now, self.utc_offset) != self.day:
+            return {"active": 0, "water": 0, "eaten": 0.0, "burned": 0.0, "entries": dict.fromkeys(self.entries, 0)}
+        return {
+            "active": self.active.count(),
+            "water": self.water,
+            "eaten": self.eaten,
+            "burned": self.burned,
+            "entries": dict(self.entries)
+        }
+
+
+def _term(text: str, domain: str) -> str:
+    # "бег", "бегом" и "running" считаются одним элементом
+    return translate_offline(text, domain) or normalize_key(text)
+
+
+bot_stats = BotStats(STATS_TOP_CAPACITY, DEFAULT_UTC_OFFSET)
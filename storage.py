@@ -0,0 +1,399 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from cache import TTLCache
+from models import UserProfile, SECONDS_PER_DAY
+from config import (
+    STORAGE_BACKEND,
+    USERS_DB_PATH,
+    USERS_CACHE_SIZE,
+    USERS_FLUSH_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+
+_USER_FIELDS = ", ".join(UserProfile.__slots__)
+_USERS_COLUMNS_DDL = "user_id INTEGER PRIMARY KEY, " + ", ".join(
+    f"{field} NOT NULL" for field in UserProfile.__slots__
+)
+_INSERT_USER_SQL = (
+    f"INSERT OR REPLACE INTO users (user_id, {_USER_FIELDS}) "
+    f"VALUES (?, {', '.join('?' * len(UserProfile.__slots__))})"
+)
+_INSERT_DAY_SQL = (
+    "INSERT OR REPLACE INTO daily_totals "
+    "(user_id, day, water, calories, burned, water_goal, calorie_goal) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+# Локальный сегодняшний день пользователя в SQL (параметр :now - unix-время)
+_SQL_TODAY = f"CAST((:now + utc_offset) / {SECONDS_PER_DAY} AS INTEGER)"
+# У пользователя есть что обнулять в полночь
+_SQL_HAS_COUNTERS = (
+    "(logged_water != 0 OR logged_calories != 0 OR burned_calories != 0 "
+    "OR water_goal != base_water_goal)"
+)
+# Поля профиля, от которых зависят нормы (см. goals.py)
+_GOAL_PROFILE_FIELDS = (
+    "user_id, city, weight, height, age, activity_minutes, activity_level, gender, "
+    "base_water_goal, calorie_goal"
+)
+_UPDATE_GOALS_SQL = (
+    "UPDATE users SET water_goal = water_goal + (? - base_water_goal), "
+    "base_water_goal = ?, calorie_goal = ? WHERE user_id = ?"
+)
+
+
+class UserRepository:
+    """
+    Хранилище записей пользователей. Хендлеры читают запись через get()
+    и после изменения отдают её обратно через put().
+
+    При чтении записи со вчерашними счётчиками день закрывается:
+    итоги уходят в архив (archive_day), счётчики обнуляются.
+    """
+
+    # Какие пользователи обслуживаются этим процессом (None - все)
+    owns: Optional[Callable[[int], bool]] = None
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get(self, user_id: int) -> Optional[UserProfile]:
+        """
+        Возвращает запись пользователя или None, если пользователя нет.
+        """
+        record = await self._fetch(user_id)
+        if record is not None:
+            day = record.day
+            finished = record.roll_over(time.time())
+            if finished is not None:
+                self.archive_day(user_id, finished)
+            if record.day != day:
+                self.put(user_id, record)
+        return record
+
+    async def _fetch(self, user_id: int) -> Optional[UserProfile]:
+        raise NotImplementedError
+
+    def put(self, user_id: int, record: UserProfile) -> None:
+        raise NotImplementedError
+
+    def archive_day(self, user_id: int, finished: tuple) -> None:
+        """
+        Сохраняет итоги завершённого дня (см. UserProfile.roll_over).
+        """
+        raise NotImplementedError
+
+    async def catch_up(self, now: float) -> int:
+        """
+        Закрывает пропущенные (например, во время простоя) дни всех пользователей.
+
+        Returns:
+            int: Количество пользователей, у которых был закрыт день.
+        """
+        raise NotImplementedError
+
+    async def active_users(self) -> list[tuple[int, int, int]]:
+        """
+        Пользователи с ненулевыми дневными счётчиками: (user_id, utc_offset, day).
+        """
+        raise NotImplementedError
+
+    async def goal_profiles(self) -> list[tuple]:
+        """
+        Заполненные профили для пересчёта норм:
+        (user_id, city, weight, height, age, activity_minutes, activity_level, gender,
+        base_water_goal, calorie_goal).
+        """
+        raise NotImplementedError
+
+    async def update_goals(self, updates: list[tuple[int, int, int]]) -> None:
+        """
+        Записывает пересчитанные нормы (user_id, base_water_goal, calorie_goal).
+        Добавки к норме воды за сегодняшние тренировки сохраняются.
+        """
+        raise NotImplementedError
+
+    async def flush(self) -> None:
+        pass
+
+
+def _apply_goals(record: UserProfile, base_water_goal: int, calorie_goal: int) -> None:
+    record.water_goal += base_water_goal - record.base_water_goal
+    record.base_water_goal = base_water_goal
+    record.calorie_goal = calorie_goal
+
+
+class MemoryUserRepository(UserRepository):
+    """
+    Хранилище в памяти процесса (данные теряются при перезапуске).
+    """
+
+    def __init__(self):
+        self._records: dict[int, UserProfile] = {}
+        self.daily_totals: dict[int, dict[int, tuple]] = {}
+
+    async def _fetch(self, user_id: int) -> Optional[UserProfile]:
+        return self._records.get(user_id)
+
+    def put(self, user_id: int, record: UserProfile) -> None:
+        self._records[user_id] = record
+
+    def archive_day(self, user_id: int, finished: tuple) -> None:
+        self.daily_totals.setdefault(user_id, {})[finished[0]] = finished
+
+    async def catch_up(self, now: float) -> int:
+        rolled = 0
+        for user_id, record in self._records.items():
+            day = record.day
+            finished = record.roll_over(now)
+            if finished is not None:
+                self.archive_day(user_id, finished)
+            rolled += record.day != day
+        return rolled
+
+    async def active_users(self) -> list[tuple[int, int, int]]:
+        return [
+            (user_id, record.utc_offset, record.day)
+            for user_id, record in self._records.items()
+            if record.logged_water or record.logged_calories or record.burned_calories
+            or record.water_goal != record.base_water_goal
+        ]
+
+    async def goal_profiles(self) -> list[tuple]:
+        return [
+            (user_id, r.city, r.weight, r.height, r.age, r.activity_minutes, r.activity_level, r.gender,
+             r.base_water_goal, r.calorie_goal)
+            for user_id, r in self._records.items()
+            if r.profile_ready
+        ]
+
+    async def update_goals(self, updates: list[tuple[int, int, int]]) -> None:
+        for user_id, base_water_goal, calorie_goal in updates:
+            record = self._records.get(user_id)
+            if record is not None:
+                _apply_goals(record, base_water_goal, calorie_goal)
+
+
+class SQLiteUserRepository(UserRepository):
+    """
+    Хранилище в SQLite (WAL) с отложенной записью и ограниченным кэшем.
+
+    put() только помечает запись изменённой; изменения накапливаются
+    и пишутся одной транзакцией раз в flush_interval секунд и при закрытии.
+    Чтение идёт через LRU-кэш, при промахе запись загружается из базы.
+    Все обращения к SQLite выполняются в отдельном потоке.
+
+    Args:
+        path (str): Путь к файлу базы.
+        cache_size (int): Максимум записей в кэше.
+        flush_interval (float): Период сброса изменений на диск, в секундах.
+    """
+
+    def __init__(self, path: str, cache_size: int, flush_interval: float):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._cache = TTLCache(maxsize=cache_size, ttl=float("inf"))
+        self._dirty: dict[int, UserProfile] = {}
+        self._archive: list[tuple] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS users ({_USERS_COLUMNS_DDL})")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS daily_totals ("
+            "user_id INTEGER NOT NULL, "
+            "day INTEGER NOT NULL, "
+            "water INTEGER NOT NULL, "
+            "calories REAL NOT NULL, "
+            "burned REAL NOT NULL, "
+            "water_goal INTEGER NOT NULL, "
+            "calorie_goal INTEGER NOT NULL, "
+            "PRIMARY KEY (user_id, day))"
+        )
+        # Предикат шардирования доступен в SQL как owns_user(user_id)
+        owns = self.owns
+        self._conn.create_function(
+            "owns_user", 1, (lambda user_id: owns(user_id)) if owns else (lambda user_id: True),
+            deterministic=True
+        )
+        self._conn.commit()
+
+    async def open(self) -> None:
+        # Один поток - все операции с соединением идут последовательно
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="users-db")
+        await self._run(self._connect)
+        rolled = await self.catch_up(time.time())
+        if rolled:
+            logger.info("Закрыты пропущенные дни у %d пользователей", rolled)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _load(self, user_id: int) -> Optional[UserProfile]:
+        row = self._conn.execute(
+            f"SELECT {_USER_FIELDS} FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return UserProfile.from_row(row) if row else None
+
+    async def _fetch(self, user_id: int) -> Optional[UserProfile]:
+        # Ещё не сброшенная запись могла быть вытеснена из кэша
+        record = self._dirty.get(user_id)
+        if record is not None:
+            return record
+        return await self._cache.get_or_load(user_id, lambda: self._run(self._load, user_id))
+
+    def put(self, user_id: int, record: UserProfile) -> None:
+        """
+        Сохраняет запись пользователя (запись на диск - при следующем сбросе).
+        """
+        self._cache.set(user_id, record)
+        self._dirty[user_id] = record
+
+    def archive_day(self, user_id: int, finished: tuple) -> None:
+        self._archive.append((user_id, *finished))
+
+    def _catch_up(self, now: float) -> int:
+        params = {"now": now}
+        # Пользователей без записей за прошлый день не трогаем: их день сменится при чтении
+        condition = f"day > 0 AND day < {_SQL_TODAY} AND {_SQL_HAS_COUNTERS} AND owns_user(user_id)"
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO daily_totals "
+                "(user_id, day, water, calories, burned, water_goal, calorie_goal) "
+                "SELECT user_id, day, logged_water, logged_calories, burned_calories, water_goal, calorie_goal "
+                "FROM users WHERE " + condition +
+                " AND (logged_water != 0 OR logged_calories != 0 OR burned_calories != 0)",
+                params
+            )
+            cursor = self._conn.execute(
+                "UPDATE users SET logged_water = 0, logged_calories = 0, burned_calories = 0, "
+                f"water_goal = base_water_goal, day = {_SQL_TODAY} WHERE " + condition,
+                params
+            )
+        return cursor.rowcount
+
+    async def catch_up(self, now: float) -> int:
+        """
+        Закрывает пропущенные дни одним пакетным проходом в SQL.
+        Вызывается при открытии, до того как записи попадут в кэш.
+        """
+        await self.flush()
+        return await self._run(self._catch_up, now)
+
+    def _active_users(self) -> list[tuple[int, int, int]]:
+        return self._conn.execute(
+            f"SELECT user_id, utc_offset, day FROM users WHERE {_SQL_HAS_COUNTERS} AND owns_user(user_id)"
+        ).fetchall()
+
+    async def active_users(self) -> list[tuple[int, int, int]]:
+        await self.flush()
+        return await self._run(self._active_users)
+
+    def _goal_profiles(self) -> list[tuple]:
+        return self._conn.execute(
+            f"SELECT {_GOAL_PROFILE_FIELDS} FROM users WHERE profile_ready AND owns_user(user_id)"
+        ).fetchall()
+
+    async def goal_profiles(self) -> list[tuple]:
+        await self.flush()
+        return await self._run(self._goal_profiles)
+
+    def _update_goals(self, params: list[tuple]) -> None:
+        with self._conn:
+            self._conn.executemany(_UPDATE_GOALS_SQL, params)
+
+    async def update_goals(self, updates: list[tuple[int, int, int]]) -> None:
+        """
+        Меняет нормы в загруженных записях и одним UPDATE - в базе.
+        Запись, сброшенная на диск до UPDATE, получит нормы из UPDATE,
+        сброшенная после - уже из изменённой записи в памяти.
+        """
+        for i, (user_id, base_water_goal, calorie_goal) in enumerate(updates, 1):
+            record = self._dirty.get(user_id) or self._cache.peek(user_id)
+            if record is not None:
+                _apply_goals(record, base_water_goal, calorie_goal)
+            if i % 10000 == 0:
+                await asyncio.sleep(0)
+        params = [
+            (base_water_goal, base_water_goal, calorie_goal, user_id)
+            for user_id, base_water_goal, calorie_goal in updates
+        ]
+        await self._run(self._update_goals, params)
+
+    def _write(self, rows: list[tuple], archive: list[tuple]) -> None:
+        with self._conn:
+            self._conn.executemany(_INSERT_USER_SQL, rows)
+            self._conn.executemany(_INSERT_DAY_SQL, archive)
+
+    async def flush(self) -> None:
+        """
+        Записывает все накопленные изменения одной транзакцией.
+        """
+        async with self._flush_lock:
+            if not (self._dirty or self._archive) or self._conn is None:
+                return
+            dirty, self._dirty = self._dirty, {}
+            archive, self._archive = self._archive, []
+            # Сериализуем в потоке цикла, чтобы не гоняться с изменениями хендлеров
+            rows = [(user_id, *record.to_row()) for user_id, record in dirty.items()]
+            try:
+                await self._run(self._write, rows, archive)
+            except Exception as e:
+                # Возвращаем несохранённое, если за это время не пришло более новых версий
+                for user_id, record in dirty.items():
+                    self._dirty.setdefault(user_id, record)
+                self._archive[:0] = archive
+                logger.error("Ошибка при сохранении пользователей: %r", e)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+def create_user_repository() -> UserRepository:
+    """
+    Создаёт хранилище пользователей по настройке STORAGE_BACKEND.
+    """
+    if STORAGE_BACKEND == "memory":
+        return MemoryUserRepository()
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteUserRepository(USERS_DB_PATH, USERS_CACHE_SIZE, USERS_FLUSH_INTERVAL)
+    raise ValueError(f"Неизвестный STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+users = create_user_repository()
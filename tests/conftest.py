@@ -0,0 +1,6 @@
+import os
+import sys
+
+# config.py требует токен при импорте
+os.environ.setdefault("BOT_TOKEN", "123:test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,26 @@
+import asyncio
+import json
+import os
+
+from activities import ActivityTable
+
+
+def test_fuzzy_cache_is_bounded(tmp_path):
+    table = ActivityTable(str(tmp_path / "learned.json"), fuzzy_cache_size=2)
+    for name in ("runnin", "swimmin", "cyclin"):
+        assert table.get_met(name) is not None
+    assert list(table._fuzzy_cache) == ["swimmin", "cyclin"]
+
+
+def test_learn_saves_table(tmp_path):
+    path = str(tmp_path / "learned.json")
+    table = ActivityTable(path)
+
+    async def scenario() -> None:
+        await asyncio.gather(table.learn("parkour", 500), table.learn("fencing", 400))
+
+    asyncio.run(scenario())
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["fencing", "parkour"]
+    assert os.listdir(tmp_path) == ["learned.json"]
+    assert ActivityTable(path).get_met("parkour") == table.get_met("parkour")
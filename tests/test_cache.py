@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from cache import TTLCache
+
+
+def test_cancelled_first_caller_does_not_cancel_waiters():
+    async def scenario():
+        cache = TTLCache(maxsize=10, ttl=60)
+        release = asyncio.Event()
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "value"
+
+        first = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, calls, cache.get("key")
+
+    assert asyncio.run(scenario()) == ("value", 1, "value")
+
+
+def test_failed_load_is_retried():
+    async def scenario():
+        cache = TTLCache(maxsize=10, ttl=60)
+
+        async def failing():
+            raise ValueError("upstream")
+
+        async def loader():
+            return 42
+
+        results = await asyncio.gather(
+            cache.get_or_load("key", failing), cache.get_or_load("key", failing), return_exceptions=True
+        )
+        return results, await cache.get_or_load("key", loader)
+
+    results, value = asyncio.run(scenario())
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert value == 42
+
+
+def test_set_during_load_wins():
+    async def scenario():
+        cache = TTLCache(maxsize=10, ttl=60)
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "stale"
+
+        waiter = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        cache.set("key", "fresh")
+        release.set()
+        return await waiter, cache.get("key")
+
+    assert asyncio.run(scenario()) == ("fresh", "fresh")
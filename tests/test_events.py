@@ -0,0 +1,79 @@
+import asyncio
+import os
+import shutil
+
+from events import FOOD, WATER, EventLog, _read_manifest, open_snapshot
+
+
+def _run(directory, scenario, segment_records=10, max_segments=4):
+    async def main():
+        log = EventLog(directory, segment_records, max_segments, flush_interval=60)
+        await log.open()
+        try:
+            return await scenario(log)
+        finally:
+            await log.close()
+    return asyncio.run(main())
+
+
+async def _settle(log):
+    await asyncio.sleep(0)
+    while log._maintenance is not None and not log._maintenance.done():
+        await log._maintenance
+
+
+def test_tiered_merge_keeps_every_event(tmp_path):
+    directory = str(tmp_path)
+
+    async def scenario(log):
+        for i in range(400):
+            log.append(i % 7, WATER, i, ts=1000.0 + i)
+            await _settle(log)
+        return log.query(3), [segment.records for segment in log._segments]
+
+    events, sizes = _run(directory, scenario)
+    assert [e.amount for e in events] == [float(i) for i in range(400) if i % 7 == 3]
+    # Слияния ограничены уровнями: сегментов одного уровня меньше max_segments
+    assert sizes == [160, 160, 40, 40]
+    assert sorted(_read_manifest(directory)["segments"]) == sorted(
+        int(name[4:12]) for name in os.listdir(directory) if name.endswith(".dat")
+    )
+
+
+def test_superseded_segments_are_ignored(tmp_path):
+    directory = str(tmp_path)
+
+    async def scenario(log):
+        for i in range(40):
+            log.append(1, FOOD, 1.5, ts=float(i))
+            await _settle(log)
+
+    _run(directory, scenario)
+    # Сбой после записи результата слияния, но до удаления источников:
+    # возвращаем «старые» файлы, которых нет в манифесте
+    live = _read_manifest(directory)["segments"]
+    assert len(live) == 1
+    for name in ("seg-00000099.dat", "seg-00000099.idx"):
+        shutil.copy(os.path.join(directory, f"seg-{live[0]:08d}.{name[-3:]}"), os.path.join(directory, name))
+
+    snapshot = open_snapshot(directory)
+    assert snapshot.count(1) == 40
+    snapshot.close()
+
+    async def reopen(log):
+        return log.query(1)
+
+    assert len(_run(directory, reopen)) == 40
+    assert not os.path.exists(os.path.join(directory, "seg-00000099.dat"))
+
+
+def test_amounts_keep_double_precision(tmp_path):
+    async def scenario(log):
+        for i in range(10):
+            log.append(1, FOOD, 0.1 + i, ts=float(i))
+        await _settle(log)
+        return log.query(1)
+
+    events = _run(str(tmp_path), scenario)
+    assert [e.amount for e in events] == [0.1 + i for i in range(10)]
+
@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+from food_index import FoodIndex
+
+
+def test_lookup_runs_off_loop(tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    dump.write_text("\n".join(json.dumps(record) for record in (
+        {"code": "1", "product_name": "Банан", "nutriments": {"energy-kcal_100g": 89}},
+        {"code": "2", "product_name": "Banana chips", "nutriments": {"energy-kcal_100g": 519}},
+    )), encoding="utf-8")
+    index = FoodIndex(str(tmp_path / "index.sqlite3"))
+    index.import_dump(str(dump), progress_every=0)
+    index.close()
+
+    async def scenario():
+        results = await asyncio.gather(
+            index.lookup("банан"), index.lookup("банан"), index.lookup("banana ch"), index.lookup("киви")
+        )
+        return results, index._results.stats()
+
+    try:
+        results, stats = asyncio.run(scenario())
+    finally:
+        index.close()
+    assert results == [
+        {"name": "Банан", "calories": 89.0},
+        {"name": "Банан", "calories": 89.0},
+        {"name": "Banana chips", "calories": 519.0},
+        None
+    ]
+    assert stats["coalesced"] == 1
+
+
+def test_missing_index(tmp_path):
+    index = FoodIndex(str(tmp_path / "absent.sqlite3"))
+    try:
+        assert asyncio.run(index.lookup("банан")) is None
+    finally:
+        index.close()
+    assert not (tmp_path / "absent.sqlite3").exists()
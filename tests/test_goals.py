@@ -0,0 +1,60 @@
+import itertools
+
+import numpy as np
+
+from goals import calc_daily_calories_vec, calc_daily_water_vec, compute_goals, profile_columns
+from utils import calc_daily_calories, calc_daily_water
+
+TEMPERATURES = (-5.0, 24.9, 25.0, 25.1, 27.5, 29.9, 30.0, 30.1, 36.6)
+WEIGHTS = (48.5, 57.35, 70.0, 80.29, 93.7)
+MINUTES = (0, 29, 30, 45, 90)
+LEVELS = ("light", "middle", "High")
+GENDERS = ("male", "female", "Female")
+
+
+def test_water_vec_matches_scalar():
+    grid = list(itertools.product(WEIGHTS, MINUTES, TEMPERATURES))
+    weight, minutes, temperature = (np.array(column) for column in zip(*grid))
+    minutes = minutes.astype(np.int64)
+    vector = calc_daily_water_vec(weight, minutes, temperature)
+    for i, (w, m, t) in enumerate(grid):
+        assert vector[i] == calc_daily_water(w, m, t), (w, m, t)
+        assert int(vector[i]) == int(calc_daily_water(w, m, t))
+
+
+def test_calories_vec_matches_scalar():
+    grid = list(itertools.product(WEIGHTS, (155.0, 182.5), (19, 64), MINUTES, LEVELS, GENDERS))
+    per_minute = {"light": 4, "middle": 8, "high": 12}
+    offset = {"male": 5, "female": -161}
+    vector = calc_daily_calories_vec(
+        np.array([row[0] for row in grid]),
+        np.array([row[1] for row in grid]),
+        np.array([row[2] for row in grid], dtype=np.int64),
+        np.array([row[3] for row in grid], dtype=np.int64),
+        np.array([per_minute[row[4].lower()] for row in grid], dtype=np.int64),
+        np.array([offset[row[5].lower()] for row in grid], dtype=np.int64)
+    )
+    for i, row in enumerate(grid):
+        assert vector[i] == calc_daily_calories(*row), row
+
+
+def test_compute_goals_matches_handlers():
+    cities = {f"city{i}": t for i, t in enumerate(TEMPERATURES)}
+    profiles, expected = [], {}
+    grid = itertools.product(cities, WEIGHTS, MINUTES, LEVELS + ("", "extreme"), GENDERS + ("",))
+    for user_id, (city, weight, minutes, level, gender) in enumerate(grid):
+        # Нормы заведомо отличаются от пересчитанных - в ответ попадают все корректные профили
+        profiles.append((user_id, city, weight, 170.0, 30, minutes, level, gender, -1, -1))
+        try:
+            calories = calc_daily_calories(weight, 170.0, 30, minutes, level, gender)
+        except (ValueError, UnboundLocalError):
+            # Незаполненный профиль: скалярный расчёт невозможен, пересчёт его пропускает
+            continue
+        water = calc_daily_water(weight, minutes, cities[city])
+        expected[user_id] = (int(water), int(calories))
+    # Город без погоды тоже пропускается
+    profiles.append((len(profiles), "nowhere", 70.0, 170.0, 30, 30, "light", "male", -1, -1))
+
+    result = compute_goals(profile_columns(profiles), cities)
+    assert {user_id: (water, calories) for user_id, water, calories in result} == expected
+    assert all(type(value) is int for row in result for value in row)
@@ -0,0 +1,24 @@
+import asyncio
+import os
+
+from lookup_cache import LookupCache
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "cache.bin")
+
+    async def scenario() -> int:
+        cache = LookupCache(path)
+        food = cache.namespace("food", maxsize=10, ttl=60)
+        food.set("банан", {"name": "Banana", "calories": 89})
+        food.set("пусто", None)
+        return await cache.save()
+
+    assert asyncio.run(scenario()) == 2
+    # Временные файлы не остаются рядом со снимком
+    assert os.listdir(tmp_path) == ["cache.bin"]
+
+    restored = LookupCache(path)
+    food = restored.namespace("food", maxsize=10, ttl=60)
+    assert restored.load() == 2
+    assert food.get("банан") == {"name": "Banana", "calories": 89}
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+import utils
+from http_client import close_session, open_session
+from metrics import track_upstream, upstream_requests
+from resilience import CircuitBreaker, Upstream, UpstreamError
+
+
+def test_status_kept_when_error_raised_after_response():
+    before = upstream_requests.labels("test_api", "503").value
+    with pytest.raises(UpstreamError):
+        with track_upstream("test_api") as call:
+            call.status = 503
+            raise UpstreamError("HTTP 503")
+    assert upstream_requests.labels("test_api", "503").value == before + 1
+
+
+def test_no_response_counted_as_error():
+    before = upstream_requests.labels("test_api", "error").value
+    with pytest.raises(OSError):
+        with track_upstream("test_api"):
+            raise OSError("connection refused")
+    assert upstream_requests.labels("test_api", "error").value == before + 1
+
+
+def test_success_without_status_counted_as_ok():
+    before = upstream_requests.labels("test_api", "ok").value
+    with track_upstream("test_api"):
+        pass
+    assert upstream_requests.labels("test_api", "ok").value == before + 1
+    assert upstream_requests.labels("test_api", "None").value == 0
+
+
+def test_cancelled_call_not_counted_as_error():
+    async def scenario() -> None:
+        async def call() -> None:
+            with track_upstream("test_api"):
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    before_cancelled = upstream_requests.labels("test_api", "cancelled").value
+    before_error = upstream_requests.labels("test_api", "error").value
+    asyncio.run(scenario())
+    assert upstream_requests.labels("test_api", "cancelled").value == before_cancelled + 1
+    assert upstream_requests.labels("test_api", "error").value == before_error
+
+
+def test_upstream_503_counted_under_status_label(monkeypatch):
+    async def unavailable(request: web.Request) -> web.Response:
+        return web.Response(status=503)
+
+    async def scenario() -> None:
+        app = web.Application()
+        app.router.add_get("/search", unavailable)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(utils, "FOOD_API_URL", f"http://127.0.0.1:{port}/search")
+        await open_session()
+        try:
+            with pytest.raises(UpstreamError):
+                await utils._request_food_info("banana")
+        finally:
+            await close_session()
+            await runner.cleanup()
+
+    before_503 = upstream_requests.labels("openfoodfacts", "503").value
+    before_error = upstream_requests.labels("openfoodfacts", "error").value
+    asyncio.run(scenario())
+    assert upstream_requests.labels("openfoodfacts", "503").value == before_503 + 1
+    assert upstream_requests.labels("openfoodfacts", "error").value == before_error
+
+
+def test_budget_cancellation_counted_as_timeout():
+    async def scenario() -> None:
+        async def slow() -> None:
+            with track_upstream("test_slow"):
+                await asyncio.sleep(10)
+
+        async def fast() -> str:
+            with track_upstream("test_slow"):
+                await asyncio.sleep(0.01)
+            return "done"
+
+        upstream = Upstream("test_slow", timeout=0.05, hedge=False, breaker=CircuitBreaker("test_slow", 5, 30))
+        assert await upstream.call(slow, "fallback") == "fallback"
+        assert await upstream.call(fast, "fallback") == "done"
+
+    before = {status: upstream_requests.labels("test_slow", status).value for status in ("timeout", "cancelled", "ok")}
+    asyncio.run(scenario())
+    assert upstream_requests.labels("test_slow", "timeout").value == before["timeout"] + 1
+    assert upstream_requests.labels("test_slow", "cancelled").value == before["cancelled"]
+    assert upstream_requests.labels("test_slow", "ok").value == before["ok"] + 1
@@ -0,0 +1,25 @@
+from models import SECONDS_PER_DAY, UserProfile, local_day
+
+
+def test_day_not_fixed_before_city_is_known():
+    # 23:00 UTC: в UTC-5 ещё 18:00 того же дня, в UTC+3 - уже следующий день
+    now = 20000 * SECONDS_PER_DAY + 23 * 3600
+    profile = UserProfile(weight=70)
+    assert profile.roll_over(now) is None
+    assert profile.day == 0
+
+    profile.city = "New York"
+    profile.utc_offset = -5 * 3600
+    profile.day = local_day(now, profile.utc_offset)
+    assert profile.day == 20000
+
+
+def test_rollover_at_local_midnight_for_negative_offset():
+    utc_offset = -5 * 3600
+    profile = UserProfile(city="New York", utc_offset=utc_offset, day=20000, logged_water=500, base_water_goal=2000)
+    # Полночь по Нью-Йорку - 05:00 UTC следующего дня
+    midnight = 20001 * SECONDS_PER_DAY - utc_offset
+    assert profile.roll_over(midnight - 1) is None
+    finished = profile.roll_over(midnight)
+    assert finished[0] == 20000 and finished[1] == 500
+    assert profile.day == 20001 and profile.logged_water == 0
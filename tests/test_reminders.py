@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+
+import reminders
+from models import UserProfile
+from outbox import Outbox
+from reminders import Reminder, ReminderScheduler
+
+
+class SlowRepository:
+    """
+    Профиль читается, пока тест не разрешит ответ.
+    """
+
+    def __init__(self):
+        self.reading = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def get(self, user_id):
+        self.reading.set()
+        await self.release.wait()
+        return None
+
+
+def test_disable_during_remind(tmp_path):
+    async def scenario():
+        repository = SlowRepository()
+        scheduler = ReminderScheduler(str(tmp_path / "reminders.db"), repository, tick_interval=3600)
+        await scheduler.start(None)
+        try:
+            due = await scheduler.set(1, Reminder(30, 0, 24 * 60, 0))
+            run = asyncio.create_task(scheduler.run_due(due))
+            await repository.reading.wait()
+            await scheduler.set(1, None)
+            repository.release.set()
+            await run
+            rows = await scheduler._run(lambda: scheduler._conn.execute("SELECT * FROM reminders").fetchall())
+            # Следующий тик не падает на удалённом пользователе
+            return rows, scheduler._due, await scheduler.run_due(due + 3600)
+        finally:
+            await scheduler.stop()
+
+    rows, due, processed = asyncio.run(scenario())
+    assert rows == []
+    assert due == {}
+    assert processed == 0
+
+
+class FlakySession(BaseSession):
+    """
+    Bot API, который на первый запрос отвечает 429.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        if len(self.requests) == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class ReadyRepository:
+    async def get(self, user_id):
+        return UserProfile(water_goal=2000, logged_water=500, profile_ready=True)
+
+
+def test_reminder_is_resent_after_429(tmp_path, monkeypatch):
+    async def scenario():
+        session = FlakySession()
+        bot = Bot("42:TEST", session=session)
+        queue = Outbox(4, global_rate=100, chat_rate=100, group_rate=100, chat_burst=10, max_retries=2)
+        monkeypatch.setattr(reminders, "outbox", queue)
+        await queue.start()
+        scheduler = ReminderScheduler(str(tmp_path / "reminders.db"), ReadyRepository(), tick_interval=3600)
+        await scheduler.start(bot)
+        try:
+            await scheduler.set(7, Reminder(30, 0, 24 * 60, 0))
+            await scheduler.run_due(time.time() + 24 * 3600)
+            assert await queue.join(5)
+        finally:
+            await scheduler.stop()
+            await queue.stop()
+        return session.requests
+
+    requests = asyncio.run(scenario())
+    assert len(requests) == 2
+    assert {method.chat_id for method in requests} == {7}
+    assert "500 из 2000" in requests[1].text
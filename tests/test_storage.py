@@ -0,0 +1,36 @@
+import asyncio
+import threading
+
+from models import UserProfile
+from storage import SQLiteUserRepository
+
+
+def test_put_during_load_is_not_overwritten(tmp_path):
+    async def scenario():
+        repository = SQLiteUserRepository(str(tmp_path / "users.db"), cache_size=1, flush_interval=3600)
+        await repository.open()
+        try:
+            repository.put(1, UserProfile(weight=70.0, logged_water=250))
+            repository.put(2, UserProfile(weight=80.0))
+            await repository.flush()
+
+            # Запись 1 вытеснена из кэша: чтение загружает её из базы, а поток загрузки ждёт
+            started, release = threading.Event(), threading.Event()
+            load = repository._load
+
+            def slow_load(user_id):
+                started.set()
+                release.wait(5)
+                return load(user_id)
+
+            repository._load = slow_load
+            reading = asyncio.create_task(repository.get(1))
+            await asyncio.to_thread(started.wait, 5)
+            repository.put(1, UserProfile(weight=70.0, logged_water=750))
+            release.set()
+            read = await reading
+            return read.logged_water, (await repository.get(1)).logged_water
+        finally:
+            await repository.close()
+
+    assert asyncio.run(scenario()) == (750, 750)
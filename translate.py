@@ -0,0 +1,304 @@
+"""
+Перевод названий активностей и продуктов с русского на английский
+для API Ninjas и OpenFoodFacts.
+
+Сначала - встроенный словарь: слова приводятся к основе (отбрасываются
+падежные окончания), так что "бегом", "овсянку" и "яблоки" находятся
+по "бег", "овсянка" и "яблоко". Если словарь не помог, по желанию
+(TRANSLATE_REMOTE) используется googletrans с ограничением частоты.
+Результаты кэшируются по термину.
+"""
+import logging
+import re
+import time
+from typing import Optional
+
+from activities import ACTIVITIES
+from cache import TTLCache
+from outbox import TokenBucket
+from resilience import Upstream
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY = "activity"
+FOOD = "food"
+
+# Продукты: русское название -> английское для поиска в OpenFoodFacts
+FOOD_TERMS = {
+    "банан": "banana",
+    "яблоко": "apple",
+    "груша": "pear",
+    "апельсин": "orange",
+    "мандарин": "mandarin",
+    "лимон": "lemon",
+    "виноград": "grapes",
+    "персик": "peach",
+    "абрикос": "apricot",
+    "слива": "plum",
+    "вишня": "cherry",
+    "клубника": "strawberry",
+    "малина": "raspberry",
+    "черника": "blueberry",
+    "арбуз": "watermelon",
+    "дыня": "melon",
+    "ананас": "pineapple",
+    "киви": "kiwi",
+    "авокадо": "avocado",
+    "картофель": "potato",
+    "картошка": "potato",
+    "морковь": "carrot",
+    "капуста": "cabbage",
+    "огурец": "cucumber",
+    "помидор": "tomato",
+    "томат": "tomato",
+    "лук": "onion",
+    "чеснок": "garlic",
+    "перец": "pepper",
+    "брокколи": "broccoli",
+    "кабачок": "zucchini",
+    "свекла": "beetroot",
+    "тыква": "pumpkin",
+    "горох": "peas",
+    "фасоль": "beans",
+    "чечевица": "lentils",
+    "кукуруза": "corn",
+    "гриб": "mushrooms",
+    "рис": "rice",
+    "гречка": "buckwheat",
+    "овсянка": "oatmeal",
+    "овсяные хлопья": "oat flakes",
+    "мюсли": "muesli",
+    "пшено": "millet",
+    "булгур": "bulgur",
+    "киноа": "quinoa",
+    "макароны": "pasta",
+    "спагетти": "spaghetti",
+    "хлеб": "bread",
+    "батон": "white bread",
+    "лаваш": "lavash",
+    "блин": "pancakes",
+    "молоко": "milk",
+    "кефир": "kefir",
+    "йогурт": "yogurt",
+    "творог": "cottage cheese",
+    "сметана": "sour cream",
+    "сливки": "cream",
+    "сыр": "cheese",
+    "масло": "butter",
+    "сливочное масло": "butter",
+    "оливковое масло": "olive oil",
+    "подсолнечное масло": "sunflower oil",
+    "яйцо": "egg",
+    "курица": "chicken",
+    "куриная грудка": "chicken breast",
+    "индейка": "turkey",
+    "говядина": "beef",
+    "свинина": "pork",
+    "баранина": "lamb",
+    "колбаса": "sausage",
+    "сосиска": "sausages",
+    "ветчина": "ham",
+    "бекон": "bacon",
+    "рыба": "fish",
+    "лосось": "salmon",
+    "семга": "salmon",
+    "тунец": "tuna",
+    "треска": "cod",
+    "креветка": "shrimp",
+    "орех": "nuts",
+    "грецкий орех": "walnuts",
+    "миндаль": "almonds",
+    "арахис": "peanuts",
+    "арахисовая паста": "peanut butter",
+    "мед": "honey",
+    "сахар": "sugar",
+    "шоколад": "chocolate",
+    "печенье": "cookies",
+    "торт": "cake",
+    "мороженое": "ice cream",
+    "сок": "juice",
+    "апельсиновый сок": "orange juice",
+    "кофе": "coffee",
+    "чай": "tea",
+    "пицца": "pizza",
+    "суп": "soup",
+    "борщ": "borscht",
+    "пельмени": "dumplings",
+    "салат": "salad",
+}
+
+# Активности сверх русских псевдонимов из activities.ACTIVITIES
+ACTIVITY_TERMS = {
+    "бег трусцой": "jogging",
+    "спортивная ходьба": "brisk walking",
+    "скандинавская ходьба": "brisk walking",
+    "велопрогулка": "cycling",
+    "велосипедная прогулка": "cycling",
+    "тренажерный зал": "weight lifting",
+    "качалка": "weight lifting",
+    "штанга": "weight lifting",
+    "гантели": "weight lifting",
+    "подтягивания": "bodyweight training",
+    "отжимания": "bodyweight training",
+    "приседания": "bodyweight training",
+    "кардио": "aerobics",
+    "фитнес": "aerobics",
+    "степ": "aerobics",
+    "танец": "dancing",
+    "каратэ": "martial arts",
+    "карате": "martial arts",
+    "дзюдо": "martial arts",
+    "тхэквондо": "martial arts",
+    "кикбоксинг": "boxing",
+    "катание на коньках": "ice skating",
+    "катание на роликах": "roller skating",
+    "горные лыжи": "skiing",
+    "лыжная прогулка": "cross country skiing",
+    "гребля на байдарке": "canoeing",
+    "скалодром": "climbing",
+    "прыжки на скакалке": "jumping rope",
+    "плавание в бассейне": "swimming",
+    "бассейн": "swimming",
+    "уборка дома": "housework",
+    "работа в саду": "gardening",
+}
+
+# Окончания существительных и прилагательных, от длинных к коротким
+_ENDINGS = tuple(sorted({
+    "иями", "ями", "ами", "ием", "иях", "ией", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам", "ом", "ах", "ях",
+    "ию", "ью", "ия", "ья", "ее", "ые", "ое", "ым", "им", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я",
+}, key=len, reverse=True))
+# Основа короче не бывает - иначе "сок" и "сыр" теряли бы корень
+_MIN_STEM = 3
+
+_WORD_RE = re.compile(r"[а-яa-z0-9]+")
+
+
+def stem(word: str) -> str:
+    """
+    Основа русского слова: отбрасывает одно падежное окончание.
+    """
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def _words(text: str) -> list[str]:
+    return _WORD_RE.findall(text.casefold().replace("ё", "е"))
+
+
+def _phrase_key(text: str) -> str:
+    return " ".join(stem(word) for word in _words(text))
+
+
+def _build_dictionary(terms: dict[str, str]) -> dict[str, str]:
+    return {_phrase_key(russian): english for russian, english in terms.items()}
+
+
+def _activity_terms() -> dict[str, str]:
+    terms = {}
+    for name, (_, aliases) in ACTIVITIES.items():
+        for alias in aliases:
+            if re.search(r"[а-яё]", alias):
+                terms[alias] = name
+    terms.update(ACTIVITY_TERMS)
+    return terms
+
+
+_DICTIONARIES = {
+    ACTIVITY: _build_dictionary(_activity_terms()),
+    FOOD: _build_dictionary(FOOD_TERMS),
+}
+
+
+def translate_offline(text: str, domain: str) -> Optional[str]:
+    """
+    Перевод по встроенному словарю: сначала фраза целиком, затем по словам.
+
+    Returns:
+        str: Английский вариант, текст без кириллицы - как есть;
+             None, если перевести все русские слова не удалось.
+    """
+    words = _words(text)
+    if not any("а" <= ch <= "я" for word in words for ch in word):
+        return " ".join(words) or None
+
+    dictionary = _DICTIONARIES[domain]
+    stems = [stem(word) for word in words]
+    phrase = dictionary.get(" ".join(stems))
+    if phrase is not None:
+        return phrase
+
+    translated = []
+    for word, word_stem in zip(words, stems):
+        if word.isascii():
+            translated.append(word)
+            continue
+        english = dictionary.get(word_stem)
+        if english is None:
+            return None
+        translated.append(english)
+    return " ".join(translated)
+
+
+class Translator:
+    """
+    Перевод терминов с кэшем по (область, термин). Удалённый перевод
+    (googletrans) - только если словарь не справился, не чаще remote_rate
+    запросов в секунду; при превышении возвращается исходный текст.
+
+    Args:
+        cache (TTLCache): Кэш переводов.
+        upstream (Upstream): Обёртка удалённого перевода (таймаут, автомат отключения).
+        remote (bool): Разрешён ли удалённый перевод.
+        remote_rate (float): Лимит удалённых запросов в секунду.
+    """
+
+    def __init__(self, cache: TTLCache, upstream: Upstream, remote: bool, remote_rate: float):
+        self.cache = cache
+        self.upstream = upstream
+        self.remote = remote
+        self._bucket = TokenBucket(remote_rate, max(1.0, remote_rate))
+        self._client = None
+
+    async def translate(self, text: str, domain: str) -> str:
+        """
+        Английский вариант термина (или исходный текст, если перевести не удалось).
+        """
+        key = f"{domain}:{' '.join(_words(text))}"
+        english = await self.cache.get_or_load(key, lambda: self._translate(text, domain), ttl_for=self._ttl)
+        return english or text
+
+    def _ttl(self, result: Optional[str]) -> Optional[float]:
+        # Неудачу не запоминаем: удалённый перевод может стать доступен
+        return self.cache.ttl if result else None
+
+    async def _translate(self, text: str, domain: str) -> Optional[str]:
+        english = translate_offline(text, domain)
+        if english is not None or not self.remote:
+            return english
+        # Без ожидания: лимит исчерпан - обходимся без перевода
+        if self._bucket.delay(time.monotonic()) > 0:
+            return None
+        self._bucket.take(time.monotonic())
+        return await self.upstream.call(lambda: self._translate_remote(text), None)
+
+    async def _translate_remote(self, text: str) -> Optional[str]:
+        if self._client is None:
+            try:
+                from googletrans import Translator as RemoteTranslator
+            except ImportError:
+                logger.warning("googletrans не установлен, удалённый перевод выключен")
+                self.remote = False
+                return None
+            self._client = RemoteTranslator(raise_exception=True)
+        result = await self._client.translate(text, src="ru", dest="en")
+        return result.text.casefold().strip() or None
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.client.aclose()
+            self._client = None
@@ -1,9 +1,102 @@
-import requests
-from config import API_KEY_TRAIN
+import asyncio
+import logging
+import re
+
+from config import (
+    API_KEY_TRAIN,
+    ACTIVITIES_LEARNED_PATH,
+    ACTIVITY_CACHE_SIZE,
+    ACTIVITY_CACHE_TTL,
+    ACTIVITY_NEGATIVE_TTL,
+    DEFAULT_UTC_OFFSET,
+    FOOD_CACHE_SIZE,
+    FOOD_CACHE_TTL,
+    FOOD_NEGATIVE_TTL,
+    FOOD_INDEX_PATH,
+    FOOD_LOOKUP_CONCURRENCY,
+    FOOD_API_URL,
+    LOOKUP_CACHE_PATH,
+    LOOKUP_SNAPSHOT_INTERVAL,
+    NINJAS_API_URL,
+    TRANSLATE_CACHE_SIZE,
+    TRANSLATE_CACHE_TTL,
+    TRANSLATE_REMOTE,
+    TRANSLATE_REMOTE_RATE,
+    WEATHER_CACHE_SIZE,
+    WEATHER_API_URL,
+    WEATHER_CACHE_TTL,
+    WEATHER_NEGATIVE_TTL
+)
+from activities import ActivityTable
+from food_index import FoodIndex
+from http_client import get_session
+from lookup_cache import LookupCache, normalize_key
+from metrics import track_upstream
+from resilience import UpstreamError, food_upstream, ninjas_upstream, translate_upstream, weather_upstream
+from translate import ACTIVITY, FOOD, Translator
+
+logger = logging.getLogger(__name__)
+
+# Ответы внешних API по нормализованному запросу, сохраняются между перезапусками
+lookup_cache = LookupCache(LOOKUP_CACHE_PATH, LOOKUP_SNAPSHOT_INTERVAL)
+# Погода (температура и часовой пояс) по названию города
+weather_cache = lookup_cache.namespace("openweathermap", WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL)
+# Продукты OpenFoodFacts, не найденные в локальном индексе
+food_cache = lookup_cache.namespace("openfoodfacts", FOOD_CACHE_SIZE, FOOD_CACHE_TTL)
+# calories_per_hour API Ninjas по названию активности
+activity_cache = lookup_cache.namespace("api_ninjas", ACTIVITY_CACHE_SIZE, ACTIVITY_CACHE_TTL)
+
+# Переводы названий на английский для API Ninjas и OpenFoodFacts
+translation_cache = lookup_cache.namespace("translate", TRANSLATE_CACHE_SIZE, TRANSLATE_CACHE_TTL)
+translator = Translator(translation_cache, translate_upstream, TRANSLATE_REMOTE, TRANSLATE_REMOTE_RATE)
+
+# Ответ-заглушка при сбое API: не кэшируется, в отличие от "не найдено"
+_UNAVAILABLE = object()
+
+# Локальный индекс продуктов, сеть используется только при промахе
+food_index = FoodIndex(FOOD_INDEX_PATH)
+
+# Локальная MET-таблица, API Ninjas - только для неизвестных активностей
+activity_table = ActivityTable(ACTIVITIES_LEARNED_PATH)
+
+
+def normalize_city(city: str) -> str:
+    """
+    Приводит название города к ключу кэша (см. lookup_cache.normalize_key).
+    """
+    return normalize_key(city)
+
+
+def _weather_ttl(result) -> float | None:
+    """
+    TTL для ответа OpenWeatherMap: погода кэшируется на WEATHER_CACHE_TTL,
+    неизвестный город - на WEATHER_NEGATIVE_TTL, остальные ошибки не кэшируются.
+    """
+    if "temp" in result:
+        return WEATHER_CACHE_TTL
+    if result.get("cod") == "404":
+        return WEATHER_NEGATIVE_TTL
+    return None
+
+
+async def get_city_weather(city: str, api_key_current: str) -> dict:
+    """
+    Погода в городе с кэшированием.
+    Одновременные запросы одного города объединяются в один вызов API.
 
-def get_current_temperature(city: str, api_key_current: str) -> dict[str, str]:
+    Returns:
+        dict: {"temp": ..., "utc_offset": ...} или словарь с ключом "error"/"cod" при ошибке.
     """
-    Получение текущей температуры для города через API OpenWeatherMap.
+    return await weather_cache.get_or_load(
+        normalize_city(city),
+        lambda: _fetch_city_weather(city, api_key_current),
+        ttl_for=_weather_ttl
+    )
+
+
+async def get_current_temperature(city: str, api_key_current: str) -> dict[str, str]:
+    """
+    Получение текущей температуры для города.
 
     Args:
         city (str): Название города.
@@ -11,33 +104,72 @@ def get_current_temperature(city: str, api_key_current: str) -> dict[str, str]:
 
     Returns:
         float: Температура в градусах Цельсия, если запрос успешен.
-        dict: Словарь с ключом "error", если произошла ошибка.
+        dict: Словарь с ключом "error" или "cod", если произошла ошибка.
+    """
+    weather = await get_city_weather(city, api_key_current)
+    if "temp" in weather:
+        return weather["temp"]
+    return weather
+
+
+async def _fetch_city_weather(city: str, api_key_current: str) -> dict:
+    """
+    Погода через OpenWeatherMap с защитой от сбоев API (resilience.py).
+
+    Returns:
+        dict: {"temp": ..., "utc_offset": ...} или словарь с ключом "error"/"cod" при ошибке.
+    """
+    return await weather_upstream.call(
+        lambda: _request_city_weather(city, api_key_current),
+        {"error": "Weather service is unavailable."}
+    )
+
+
+async def _request_city_weather(city: str, api_key_current: str) -> dict:
+    """
+    Получение текущей температуры и часового пояса города через API OpenWeatherMap.
+
+    Args:
+        city (str): Название города.
+        api_key_current (str): API ключ для доступа к OpenWeatherMap.
+
+    Returns:
+        dict: {"temp": ..., "utc_offset": ...}, если запрос успешен.
+        dict: Словарь с ключом "error" или "cod", если город не найден или ключ неверный.
+
+    Raises:
+        UpstreamError: Если API ответил ошибкой на своей стороне.
     """
-    base_url = "http://api.openweathermap.org/data/2.5/weather"
     params = {
         "q": city,
         "appid": api_key_current,
         "units": "metric"
     }
 
-    try:
-        response = requests.get(base_url, params=params)
-        data = response.json()
-
-        if response.status_code == 401:
-            return {
-                "cod": "401",
-                "message": (
-                    "Invalid API key. Please see "
-                    "https://openweathermap.org/faq#error401 for more info."
-                )
-            }
-
-        if response.status_code == 200:
-            return data['main']['temp']
-
-    except Exception as e:
-        return {"error": str(e)}
+    with track_upstream("openweathermap") as call:
+        async with get_session().get(WEATHER_API_URL, params=params) as response:
+            call.status = response.status
+            if response.status >= 500 or response.status == 429:
+                raise UpstreamError(f"OpenWeatherMap: HTTP {response.status}")
+            data = await response.json(content_type=None)
+
+    if response.status == 401:
+        return {
+            "cod": "401",
+            "message": (
+                "Invalid API key. Please see "
+                "https://openweathermap.org/faq#error401 for more info."
+            )
+        }
+
+    if response.status == 404:
+        return {"cod": "404", "message": data.get("message", "city not found")}
+
+    if response.status == 200:
+        return {
+            "temp": data['main']['temp'],
+            "utc_offset": int(data.get('timezone', DEFAULT_UTC_OFFSET))
+        }
 
     return {"error": "Unexpected error occurred."}
 
@@ -121,50 +253,196 @@ def calc_daily_calories(weight_kg: float, height_cm: float, age: int, activity_m
     return total_calories
 
 
-def get_food_info(product_name):
-    url = f"https://world.openfoodfacts.org/cgi/search.pl?action=process&search_terms={product_name}&json=true"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        products = data.get('products', [])
-        if products:
-            first_product = products[0]
-            return {
-                'name': first_product.get('product_name'),
-                'calories': first_product.get('nutriments', {}).get('energy-kcal_100g')
-            }
+async def get_food_info(product_name):
+    """
+    Поиск продукта: сначала в локальном индексе, при промахе - в OpenFoodFacts.
+    Русское название переводится на английский (см. translate.py),
+    в OpenFoodFacts ищется английский вариант.
+
+    Returns:
+        dict: {'name': ..., 'calories': ...} для первого найденного продукта.
+        None: Если продукт не найден или произошла ошибка.
+    """
+    info = await food_index.lookup(product_name)
+    if info is not None:
+        return info
+    english = await translator.translate(product_name, FOOD)
+    if english != product_name:
+        info = await food_index.lookup(english)
+        if info is not None:
+            return info
+    return await _fetch_food_info(english)
+
+
+# Позиция списка продуктов: "название количество", единицы (г, мл) необязательны
+_FOOD_ITEM_RE = re.compile(r"^(?P<name>.+?)\s+(?P<grams>\d+(?:[.,]\d+)?)\s*(?:г|гр|g|мл|ml)?\.?$", re.IGNORECASE)
+
+
+def parse_food_items(text: str) -> tuple[list[tuple[str, float]], list[str]]:
+    """
+    Разбирает список продуктов вида "банан 120, овсянка 60 г; молоко 200 мл".
+
+    Returns:
+        tuple: ([(название, граммы), ...], позиции без количества).
+    """
+    items, invalid = [], []
+    # Запятая перед цифрой - десятичная ("2,5 г"), остальные разделяют позиции
+    for part in re.split(r"[;\n]|,(?!\d)", text):
+        part = part.strip()
+        if not part:
+            continue
+        match = _FOOD_ITEM_RE.match(part)
+        if match is None:
+            invalid.append(part)
+            continue
+        grams = float(match.group("grams").replace(",", "."))
+        if grams <= 0:
+            invalid.append(part)
+            continue
+        items.append((match.group("name").strip(), grams))
+    return items, invalid
+
+
+async def get_food_infos(product_names: list[str]) -> dict[str, dict | None]:
+    """
+    Поиск нескольких продуктов одновременно (не больше FOOD_LOOKUP_CONCURRENCY запросов сразу).
+
+    Returns:
+        dict: Название -> результат get_food_info (None, если не найден).
+    """
+    semaphore = asyncio.Semaphore(FOOD_LOOKUP_CONCURRENCY)
+
+    async def lookup(name: str):
+        async with semaphore:
+            return await get_food_info(name)
+
+    names = list(dict.fromkeys(product_names))
+    results = await asyncio.gather(*(lookup(name) for name in names))
+    return dict(zip(names, results))
+
+
+def _food_ttl(result) -> float | None:
+    if result is _UNAVAILABLE:
         return None
-    print(f"Ошибка: {response.status_code}")
-    return None
+    return FOOD_CACHE_TTL if result is not None else FOOD_NEGATIVE_TTL
 
 
-def get_calories_burned_ninjas(activity: str, user_time_min: int, user_weight_kg: float) -> float:
+async def _fetch_food_info(product_name):
     """
-    Запрос в API Ninjas по названию активности (англ.).
+    Поиск продукта через API OpenFoodFacts с кэшированием и защитой от сбоев API (None при отказе).
     """
-    url = "https://api.api-ninjas.com/v1/caloriesburned"
-    headers = {"X-Api-Key": API_KEY_TRAIN}
-    params = {"activity": activity}
+    result = await food_cache.get_or_load(
+        normalize_key(product_name),
+        lambda: food_upstream.call(lambda: _request_food_info(product_name), _UNAVAILABLE),
+        ttl_for=_food_ttl
+    )
+    return None if result is _UNAVAILABLE else result
 
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        data = response.json()
 
-        if response.status_code != 200 or not isinstance(data, list) or len(data) == 0:
-            return 0.0
+async def _request_food_info(product_name):
+    """
+    Поиск продукта через API OpenFoodFacts.
+
+    Raises:
+        UpstreamError: Если API ответил ошибкой на своей стороне.
+    """
+    params = {
+        "action": "process",
+        "search_terms": product_name,
+        "json": "true"
+    }
 
-        item = data[0]
-        cph = item.get("calories_per_hour", 0)
-        if cph <= 0:
-            return 0.0
+    with track_upstream("openfoodfacts") as call:
+        async with get_session().get(FOOD_API_URL, params=params) as response:
+            call.status = response.status
+            if response.status >= 500 or response.status == 429:
+                raise UpstreamError(f"OpenFoodFacts: HTTP {response.status}")
+            if response.status != 200:
+                logger.warning("OpenFoodFacts: HTTP %s", response.status)
+                return None
+            data = await response.json(content_type=None)
+
+    products = data.get('products', [])
+    if products:
+        first_product = products[0]
+        return {
+            'name': first_product.get('product_name'),
+            'calories': first_product.get('nutriments', {}).get('energy-kcal_100g')
+        }
+    return None
 
-        # Преобразуем вес в фунты
-        user_weight_lbs = user_weight_kg * 2.2
 
-        # Расход для данного веса
-        burned = (user_weight_lbs / 160.0) * (user_time_min / 60.0) * cph
+async def get_calories_burned_ninjas(activity: str, user_time_min: int, user_weight_kg: float) -> float:
+    """
+    Расход калорий на тренировку: сначала по локальной MET-таблице,
+    для неизвестных активностей - через API Ninjas (ответ запоминается в таблице).
+    Русское название переводится на английский (см. translate.py).
+    """
+    burned = activity_table.calories_burned(activity, user_time_min, user_weight_kg)
+    if burned is not None:
         return burned
 
-    except Exception as e:
-        print(f"Ошибка при запросе к API Ninjas: {e}")
+    english = await translator.translate(activity, ACTIVITY)
+    if english != activity:
+        activity = english
+        burned = activity_table.calories_burned(activity, user_time_min, user_weight_kg)
+        if burned is not None:
+            return burned
+
+    cph = await _fetch_calories_per_hour(activity)
+    if cph <= 0:
         return 0.0
+
+    await activity_table.learn(activity, cph)
+
+    # Преобразуем вес в фунты
+    user_weight_lbs = user_weight_kg * 2.2
+
+    # Расход для данного веса
+    burned = (user_weight_lbs / 160.0) * (user_time_min / 60.0) * cph
+    return burned
+
+
+def _activity_ttl(result) -> float | None:
+    if result is _UNAVAILABLE:
+        return None
+    return ACTIVITY_CACHE_TTL if result > 0 else ACTIVITY_NEGATIVE_TTL
+
+
+async def _fetch_calories_per_hour(activity: str) -> float:
+    """
+    Запрос в API Ninjas с кэшированием и защитой от сбоев API (0.0 при отказе).
+    """
+    result = await activity_cache.get_or_load(
+        normalize_key(activity),
+        lambda: ninjas_upstream.call(lambda: _request_calories_per_hour(activity), _UNAVAILABLE),
+        ttl_for=_activity_ttl
+    )
+    return 0.0 if result is _UNAVAILABLE else result
+
+
+async def _request_calories_per_hour(activity: str) -> float:
+    """
+    Запрос в API Ninjas по названию активности (англ.).
+
+    Returns:
+        float: calories_per_hour для веса 160 фунтов или 0.0, если активность не найдена.
+
+    Raises:
+        UpstreamError: Если API ответил ошибкой на своей стороне.
+    """
+    headers = {"X-Api-Key": API_KEY_TRAIN}
+    params = {"activity": activity}
+
+    with track_upstream("api_ninjas") as call:
+        async with get_session().get(NINJAS_API_URL, headers=headers, params=params) as response:
+            call.status = response.status
+            if response.status >= 500 or response.status == 429:
+                raise UpstreamError(f"API Ninjas: HTTP {response.status}")
+            data = await response.json(content_type=None)
+
+    if response.status != 200 or not isinstance(data, list) or len(data) == 0:
+        return 0.0
+
+    item = data[0]
+    return float(item.get("calories_per_hour", 0) or 0)
@@ -0,0 +1,122 @@
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Awaitable, Callable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать обработки уже принятых обновлений при остановке, в секундах
+SHUTDOWN_TIMEOUT = 30
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+async def _process_update(dp: Dispatcher, bot: Bot, update: dict) -> None:
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception:
+        logger.exception("Ошибка при обработке обновления", extra={"fields": {"update_id": update.get("update_id")}})
+
+
+async def handle_update(request: web.Request) -> web.Response:
+    """
+    Принимает обновление от Telegram и сразу отвечает 200,
+    а обработка идёт в отдельной задаче вне запроса.
+    """
+    app = request.app
+    if app["secret"] and not hmac.compare_digest(
+        request.headers.get(SECRET_HEADER, ""), app["secret"]
+    ):
+        return web.Response(status=401)
+
+    try:
+        update = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+
+    task = asyncio.create_task(app["feed"](update))
+    app["pending"].add(task)
+    task.add_done_callback(app["pending"].discard)
+    return web.Response()
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok", "pending": len(request.app["pending"])})
+
+
+def create_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    secret: str = WEBHOOK_SECRET,
+    feed: Optional[Callable[[dict], Awaitable[None]]] = None
+) -> web.Application:
+    """
+    Создаёт aiohttp-приложение с эндпоинтами вебхука и проверки здоровья.
+
+    Args:
+        feed: Обработчик сырого обновления; по умолчанию - передача в диспетчер.
+    """
+    app = web.Application()
+    app["secret"] = secret
+    app["feed"] = feed or (lambda update: _process_update(dp, bot, update))
+    app["pending"] = set()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+async def drain(app: web.Application, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+    """
+    Дожидается обработки принятых обновлений.
+    """
+    pending = set(app["pending"])
+    if pending:
+        await asyncio.wait(pending, timeout=timeout)
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    feed: Optional[Callable[[dict], Awaitable[None]]] = None
+) -> None:
+    """
+    Запускает приём обновлений через вебхук до SIGINT/SIGTERM.
+    Если WEBHOOK_URL не задан, вебхук в Telegram не регистрируется
+    (удобно для локальной проверки POST-запросами).
+    """
+    app = create_webhook_app(dp, bot, feed=feed)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        await dp.emit_startup(bot=bot, **dp.workflow_data)
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+        logger.info("Вебхук слушает %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать запросы, затем дожидаемся принятых
+        await site.stop()
+        await drain(app)
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)